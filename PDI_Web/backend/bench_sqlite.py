@@ -0,0 +1,99 @@
+"""
+Reader/writer concurrency benchmark for the SQLite connection settings.
+
+Runs mechanics-style writers (one checklist response INSERT + COMMIT per op)
+next to admin-style readers (a monthly report aggregation) on a temporary copy
+of the database, once with SQLite defaults and once with the tuned settings
+from database.SQLITE_PRAGMAS, and prints the throughput of both.
+
+Usage: python bench_sqlite.py [--seconds 5] [--readers 4] [--writers 2]
+"""
+import sys
+import os
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+import database
+import models
+
+BASELINE_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+READ_SQL = text(
+    "SELECT arac_tipi, substr(tarih_saat, 4, 7), COUNT(DISTINCT sasi_no), COUNT(id) "
+    "FROM pdi_kayitlari GROUP BY 1, 2"
+)
+WRITE_SQL = text(
+    "INSERT INTO pdi_responses (session_id, item_no, durum, kaydeden) VALUES (:s, :i, 'tamam', 'bench')"
+)
+
+
+def run(label, db_path, pragmas, seconds, readers, writers):
+    engine = database.make_engine(f"sqlite:///{db_path}", pragmas=pragmas)
+    models.Base.metadata.create_all(bind=engine)
+    counts = {"read": 0, "write": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def reader():
+        while time.perf_counter() < stop:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(READ_SQL).all()
+                key = "read"
+            except OperationalError:
+                key = "locked"
+            with lock:
+                counts[key] += 1
+
+    def writer(n):
+        i = 0
+        while time.perf_counter() < stop:
+            i += 1
+            try:
+                with engine.begin() as conn:
+                    conn.execute(WRITE_SQL, {"s": 900000 + n, "i": f"{n}.{i}"})
+                key = "write"
+            except OperationalError:
+                key = "locked"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    print(
+        f"{label:<10} reads/s: {counts['read'] / seconds:8.1f}   "
+        f"writes/s: {counts['write'] / seconds:8.1f}   locked errors: {counts['locked']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--db", default=database.DB_PATH, help="kaynak veritabanı (kopyası kullanılır)")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="pdi_bench_")
+    try:
+        for label, pragmas in (("default", BASELINE_PRAGMAS), ("tuned", None)):
+            db_path = os.path.join(work, f"{label}.db")
+            shutil.copyfile(args.db, db_path)
+            run(label, db_path, pragmas, args.seconds, args.readers, args.writers)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
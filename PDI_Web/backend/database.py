@@ -1,16 +1,62 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 
 DB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database"))
 if not os.path.exists(DB_DIR):
     os.makedirs(DB_DIR)
 
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(DB_DIR, 'pdi_veritabani.db')}"
+DB_PATH = os.environ.get("PDI_DB_PATH", os.path.join(DB_DIR, "pdi_veritabani.db"))
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# SQLite connection tuning, overridable via environment variables.
+# WAL lets report reads run while mechanics are writing; it needs a local disk,
+# so set PDI_SQLITE_JOURNAL_MODE=DELETE if the DB lives on a network share.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("PDI_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("PDI_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": os.environ.get("PDI_SQLITE_CACHE_SIZE", "-65536"),      # KiB when negative (64 MB)
+    "mmap_size": os.environ.get("PDI_SQLITE_MMAP_SIZE", "268435456"),     # 256 MB
+    "temp_store": os.environ.get("PDI_SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": os.environ.get("PDI_SQLITE_BUSY_TIMEOUT", "5000"),    # ms
+}
+POOL_SIZE = int(os.environ.get("PDI_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.environ.get("PDI_DB_MAX_OVERFLOW", "10"))
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas=None):
+    """Run the tuning PRAGMAs on a raw sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in (SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+            if value not in (None, ""):
+                cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, pragmas=None):
+    """
+    SQLite engine with a QueuePool of long-lived connections (pragmas are
+    applied once per connection, the page cache and mmap survive between requests).
+    """
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return engine
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -0,0 +1,118 @@
+"""
+Date helpers for the derived, indexable pdi_date columns (ISO YYYY-MM-DD).
+
+Source dates are free text: DD-MM-YYYY (desktop/mechanic/form) or YYYY-MM-DD
+(imalat, some Excel imports), optionally followed by a time. Month/year filters
+compare pdi_date against ISO bounds so that SQLite can use the index.
+
+The ORM fills pdi_date on every web write (@validates in models.py). Other
+clients of the same database file, the desktop app above all, write with raw
+SQL, so TRIGGERS derive pdi_date in SQL (sql_iso_date, the twin of iso_date)
+whenever a row is inserted without one or its source date changes alone.
+"""
+from typing import Optional, Tuple
+
+
+def iso_date(value) -> Optional[str]:
+    """DD-MM-YYYY[ ...] or YYYY-MM-DD[ ...] -> 'YYYY-MM-DD', None if unparseable."""
+    if not value:
+        return None
+    s = str(value).strip()
+    for y, m, d in ((s[6:10], s[3:5], s[0:2]), (s[0:4], s[5:7], s[8:10])):
+        if len(y) == 4 and len(m) == 2 and len(d) == 2 and (y + m + d).isdigit():
+            if 1 <= int(m) <= 12 and 1 <= int(d) <= 31:
+                return f"{y}-{m}-{d}"
+    return None
+
+
+def sql_iso_date(expr: str) -> str:
+    """SQL expression equivalent to iso_date(expr): 'YYYY-MM-DD' or NULL."""
+    s = f"trim({expr})"
+
+    def parts_ok(y, m, d):
+        return (
+            f"({y} || {m} || {d}) GLOB '[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]' "
+            f"AND CAST({m} AS INTEGER) BETWEEN 1 AND 12 AND CAST({d} AS INTEGER) BETWEEN 1 AND 31"
+        )
+
+    dmy = (f"substr({s}, 7, 4)", f"substr({s}, 4, 2)", f"substr({s}, 1, 2)")
+    ymd = (f"substr({s}, 1, 4)", f"substr({s}, 6, 2)", f"substr({s}, 9, 2)")
+    return (
+        f"CASE WHEN {parts_ok(*dmy)} THEN {dmy[0]} || '-' || {dmy[1]} || '-' || {dmy[2]} "
+        f"WHEN {parts_ok(*ymd)} THEN {ymd[0]} || '-' || {ymd[1]} || '-' || {ymd[2]} END"
+    )
+
+
+# Tables with a derived pdi_date -> the free-text column it comes from
+SOURCES = {
+    "pdi_kayitlari": "tarih_saat",
+    "imalat_kayitlari": "tarih",
+    "pdi_sessions": "tarih",
+}
+
+
+def _triggers(table: str, source: str):
+    derived = sql_iso_date(f"NEW.{source}")
+    update = f"BEGIN UPDATE {table} SET pdi_date = {derived} WHERE id = NEW.id; END"
+    return (
+        (f"trg_{table}_pdi_date_ai",
+         f"AFTER INSERT ON {table} WHEN NEW.pdi_date IS NULL AND ({derived}) IS NOT NULL {update}"),
+        (f"trg_{table}_pdi_date_au",
+         f"AFTER UPDATE OF {source} ON {table} WHEN NEW.{source} IS NOT OLD.{source} "
+         f"AND NEW.pdi_date IS OLD.pdi_date AND NEW.pdi_date IS NOT ({derived}) {update}"),
+    )
+
+
+# A writer that sets pdi_date itself (the ORM) wins; the triggers only fill in
+# rows inserted without one and rows whose source date changed without it, and
+# only when that changes the value.
+TRIGGERS = {name: body for table, source in SOURCES.items() for name, body in _triggers(table, source)}
+
+
+def create_triggers(conn):
+    """pdi_date triggers (idempotent); conn is a SQLAlchemy Connection."""
+    for name, body in TRIGGERS.items():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+
+
+def backfill(conn):
+    """Set pdi_date from the source column wherever it is missing or stale."""
+    for table, source in SOURCES.items():
+        derived = sql_iso_date(source)
+        conn.exec_driver_sql(f"UPDATE {table} SET pdi_date = {derived} WHERE pdi_date IS NOT ({derived})")
+
+
+def year_month(pdi_date: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(year, month) of an ISO pdi_date."""
+    if not pdi_date:
+        return None
+    return int(pdi_date[0:4]), int(pdi_date[5:7])
+
+
+def month_bounds(year: int, month: int) -> Tuple[str, str]:
+    """[start, end) ISO bounds of a calendar month."""
+    next_y, next_m = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}-01", f"{next_y:04d}-{next_m:02d}-01"
+
+
+def period_bounds(start: Tuple[int, int], end: Tuple[int, int]) -> Tuple[str, str]:
+    """[start, end) ISO bounds covering the months start..end (inclusive)."""
+    return month_bounds(*start)[0], month_bounds(*end)[1]
+
+
+def year_bounds(year: int) -> Tuple[str, str]:
+    """[start, end) ISO bounds of a calendar year."""
+    return f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+
+
+def in_month(column, year: int, month: int):
+    """Sargable 'column is in month' predicate."""
+    start, end = month_bounds(year, month)
+    return (column >= start) & (column < end)
+
+
+def in_year(column, year: int):
+    """Sargable 'column is in year' predicate."""
+    start, end = year_bounds(year)
+    return (column >= start) & (column < end)
@@ -0,0 +1,237 @@
+"""
+Background jobs for long-running imports and exports.
+
+Work runs on a small thread pool with its own DB session, so the request that
+submits a job returns immediately with a job id. Status transitions, the result
+summary and the result file are recorded in background_jobs. Progress is kept
+in memory and written to the row every PDI_JOB_PROGRESS_SECONDS, so other
+workers see it too; that write never waits (a job's own write transaction must
+not wait on a progress UPDATE from the same thread) and is skipped while the
+database is locked. Result files live under database/jobs/ and are pruned
+after PDI_JOB_RETENTION_HOURS.
+
+Every job row records the process that queued it ('host:pid'). On startup
+recover() fails only the queued/running jobs whose process is gone, so
+restarting one worker does not touch the jobs of the others.
+"""
+import json
+import os
+import socket
+import sqlite3
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+
+from database import SessionLocal, DB_DIR, SQLITE_PRAGMAS, apply_sqlite_pragmas, engine
+import models
+
+JOB_DIR = os.path.join(DB_DIR, "jobs")
+os.makedirs(JOB_DIR, exist_ok=True)
+
+MAX_WORKERS = int(os.environ.get("PDI_JOB_WORKERS", "2"))
+RETENTION_HOURS = float(os.environ.get("PDI_JOB_RETENTION_HOURS", "24"))
+PROGRESS_SECONDS = float(os.environ.get("PDI_JOB_PROGRESS_SECONDS", "2"))
+
+HOST = socket.gethostname()
+WORKER = f"{HOST}:{os.getpid()}"
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="pdi-job")
+_live = {}      # job_id -> (progress, message) while running in this process
+
+
+def _now_str():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class JobContext:
+    """Passed to the job function: progress reporting and the result file."""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.result_path = None
+        self.result_name = None
+        self._saved = 0.0
+
+    def progress(self, percent, message: str = None):
+        _live[self.job_id] = (max(0, min(int(percent), 100)), message)
+        now = time.monotonic()
+        if now - self._saved >= PROGRESS_SECONDS:
+            self._saved = now
+            _save_progress(self.job_id, *_live[self.job_id])
+
+    def result_file(self, suffix: str, download_name: str) -> str:
+        """Path to write the downloadable result to."""
+        self.result_path = os.path.join(JOB_DIR, f"job_{self.job_id}{suffix}")
+        self.result_name = download_name
+        return self.result_path
+
+
+def _update(job_id: int, **fields):
+    db = SessionLocal()
+    try:
+        db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _save_progress(job_id: int, progress: int, message):
+    """Write a running job's progress without waiting for the write lock."""
+    conn = engine.raw_connection()
+    try:
+        apply_sqlite_pragmas(conn, {"busy_timeout": 0})
+        try:
+            conn.cursor().execute(
+                "UPDATE background_jobs SET progress = ?, message = ? WHERE id = ? AND status = 'running'",
+                (progress, message, job_id),
+            )
+            conn.commit()
+        except sqlite3.OperationalError:
+            conn.rollback()      # locked, most likely by the job itself; next call retries
+        finally:
+            apply_sqlite_pragmas(conn, {"busy_timeout": SQLITE_PRAGMAS["busy_timeout"]})
+    finally:
+        conn.close()
+
+
+def _run(job_id: int, func):
+    ctx = JobContext(job_id)
+    _update(job_id, status="running", started_at=_now_str())
+    ctx.progress(0, "Başladı")
+    db = SessionLocal()
+    try:
+        result = func(ctx, db)
+    except Exception as e:
+        db.rollback()
+        message = e.detail if isinstance(e, HTTPException) else str(e)
+        if not isinstance(e, HTTPException):
+            traceback.print_exc()
+        _update(job_id, status="failed", message=message, finished_at=_now_str())
+    else:
+        _update(
+            job_id, status="done", progress=100, message="Tamamlandı",
+            result=json.dumps(result, ensure_ascii=False, default=str),
+            result_path=ctx.result_path, result_name=ctx.result_name,
+            finished_at=_now_str(),
+        )
+    finally:
+        db.close()
+        _live.pop(job_id, None)
+
+
+def submit(kind: str, func, params: dict = None) -> int:
+    """
+    Queue func(ctx, db) -> dict on the worker pool and return the job id.
+    The function owns its transaction (commit before returning).
+    """
+    prune()
+    db = SessionLocal()
+    try:
+        job = models.BackgroundJob(
+            kind=kind, status="queued", progress=0,
+            params=json.dumps(params or {}, ensure_ascii=False, default=str),
+            created_at=_now_str(), worker=WORKER,
+        )
+        db.add(job)
+        db.commit()
+        job_id = job.id
+    finally:
+        db.close()
+    _executor.submit(_run, job_id, func)
+    return job_id
+
+
+def to_dict(job: models.BackgroundJob) -> dict:
+    progress, message = job.progress, job.message
+    if job.status == "running" and job.id in _live:
+        progress, message = _live[job.id]
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": progress,
+        "message": message,
+        "params": json.loads(job.params) if job.params else {},
+        "result": json.loads(job.result) if job.result else None,
+        "download": bool(job.result_path and os.path.exists(job.result_path)),
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)     # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _orphaned(worker) -> bool:
+    """
+    True when the process that queued a job is gone: a process of this host
+    that no longer runs, or no owner recorded (jobs from before the worker
+    column). A job under our own pid at startup is from an earlier run that
+    got the same pid (containers). Jobs of other hosts are left to their own
+    restart.
+    """
+    if not worker:
+        return True
+    host, _, pid = worker.rpartition(":")
+    if host != HOST or not pid.isdigit():
+        return False
+    return int(pid) == os.getpid() or not _pid_alive(int(pid))
+
+
+def recover(bind):
+    """Startup: queued/running jobs of processes that no longer run are lost."""
+    with bind.begin() as conn:
+        t = models.BackgroundJob.__table__
+        rows = conn.execute(t.select().with_only_columns(t.c.id, t.c.worker).where(
+            t.c.status.in_(["queued", "running"])
+        )).all()
+        lost = [job_id for job_id, worker in rows if _orphaned(worker)]
+        if lost:
+            conn.execute(
+                t.update().where(t.c.id.in_(lost))
+                .values(status="failed", message="Sunucu yeniden başlatıldı.", finished_at=_now_str())
+            )
+
+
+def prune():
+    """Delete result files of jobs finished more than RETENTION_HOURS ago."""
+    cutoff = (datetime.now() - timedelta(hours=RETENTION_HOURS)).strftime("%Y-%m-%d %H:%M:%S")
+    db = SessionLocal()
+    try:
+        old = db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.result_path.isnot(None),
+            models.BackgroundJob.finished_at < cutoff,
+        ).all()
+        for job in old:
+            if os.path.exists(job.result_path):
+                try:
+                    os.remove(job.result_path)
+                except OSError:
+                    continue
+            job.result_path = None
+        if old:
+            db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,207 @@
+"""
+Report overrides (report_manual_data) as read by the report builders.
+
+Overrides are stored one value per (report_type, context_key, data_key), where
+context_key is a month 'YYYY-MM', a top error of a month 'YYYY-MM_<hata>' or a
+free key such as 'donuts'. Builders ask only for the context keys of the period
+they render; those are loaded with one IN query and kept in memory per
+report_type, so repeated reports over the same months do not touch the table.
+
+Writes go through save(): one upsert for all values and the derived
+error_rate once per context, in the caller's transaction. On commit the cached
+contexts of the touched report_types are dropped (ORM changes are tracked by
+the listeners below as well), together with the affected report responses.
+Writes made outside this process are not seen, so a report_type's cache also
+expires after PDI_REPORT_CACHE_TTL seconds, like the report cache.
+"""
+import threading
+import time
+
+from sqlalchemy import event, inspect, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import SessionLocal
+import models
+import report_cache
+from report_cache import TTL_SECONDS
+
+# Session.info key collecting the report_types touched by a transaction
+_PENDING = "manual_data_types"
+
+# error_rate of a context is derived from these two values
+RATE_INPUTS = ("vehicle_count", "error_count")
+
+
+class _TypeCache:
+    __slots__ = ("contexts", "created", "generation")
+
+    def __init__(self, generation: int):
+        self.contexts = {}      # context_key -> {data_key: data_value}
+        self.created = time.monotonic()
+        self.generation = generation
+
+
+class OverrideCache:
+    """{report_type: {context_key: {data_key: data_value}}}, filled on demand."""
+
+    def __init__(self, ttl: float = TTL_SECONDS):
+        self.ttl = ttl
+        self._types = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _type(self, report_type: str) -> _TypeCache:
+        entry = self._types.get(report_type)
+        if entry is None or time.monotonic() - entry.created > self.ttl:
+            entry = self._types[report_type] = _TypeCache(self._generations.get(report_type, 0))
+        return entry
+
+    def lookup(self, report_type: str, context_keys):
+        """(cached {context_key: values}, missing context keys, generation for store())."""
+        with self._lock:
+            entry = self._type(report_type)
+            found = {k: entry.contexts[k] for k in context_keys if k in entry.contexts}
+            missing = [k for k in context_keys if k not in found]
+            self.hits += len(found)
+            self.misses += len(missing)
+            return found, missing, entry.generation
+
+    def store(self, report_type: str, loaded: dict, generation: int):
+        """Keep values read from the database, unless the type was invalidated meanwhile."""
+        with self._lock:
+            entry = self._type(report_type)
+            if entry.generation == generation:
+                entry.contexts.update(loaded)
+
+    def invalidate(self, report_types):
+        with self._lock:
+            for report_type in report_types:
+                self._generations[report_type] = self._generations.get(report_type, 0) + 1
+                self._types.pop(report_type, None)
+
+    def clear(self):
+        self.invalidate(list(self._types))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "report_types": {t: len(e.contexts) for t, e in self._types.items()},
+            }
+
+
+cache = OverrideCache()
+
+
+def month_key(year: int, month: int) -> str:
+    return f"{year}-{month:02d}"
+
+
+def overrides(db, report_type: str, context_keys) -> dict:
+    """
+    {'<context_key>_<data_key>': data_value} for the given context keys of
+    report_type, the flat shape the report builders and the edit modals use.
+    """
+    context_keys = list(dict.fromkeys(context_keys))
+    found, missing, generation = cache.lookup(report_type, context_keys)
+    if missing:
+        loaded = {k: {} for k in missing}
+        M = models.ReportManualData
+        rows = db.query(M.context_key, M.data_key, M.data_value).filter(
+            M.report_type == report_type, M.context_key.in_(missing)
+        ).all()
+        for context_key, data_key, data_value in rows:
+            loaded[context_key][data_key] = data_value
+        cache.store(report_type, loaded, generation)
+        found.update(loaded)
+    return {
+        f"{context_key}_{data_key}": value
+        for context_key in context_keys
+        for data_key, value in found[context_key].items()
+    }
+
+
+def _upsert():
+    """INSERT ... ON CONFLICT (report_type, context_key, data_key) DO UPDATE."""
+    t = models.ReportManualData.__table__
+    stmt = sqlite_insert(t)
+    return stmt.on_conflict_do_update(
+        index_elements=[t.c.report_type, t.c.context_key, t.c.data_key],
+        set_={"data_value": stmt.excluded.data_value},
+    )
+
+
+def _error_rate(vehicle_count, error_count):
+    try:
+        v = float(vehicle_count or 0)
+        e = float(error_count)
+    except (TypeError, ValueError):
+        return None
+    return str(round(e / v, 4)) if v > 0 else None
+
+
+def save(db, items) -> int:
+    """
+    Upsert {report_type, context_key, data_key, data_value} items (the last one
+    wins for a repeated key), then recompute error_rate = error_count /
+    vehicle_count once for every context whose inputs were written. Nothing is
+    committed here; caches are invalidated when the caller commits. Returns the
+    number of values written, derived rates included.
+    """
+    rows = list({(i["report_type"], i["context_key"], i["data_key"]): i for i in items}.values())
+    if not rows:
+        return 0
+    db.execute(_upsert(), rows)
+
+    contexts = {(r["report_type"], r["context_key"]) for r in rows if r["data_key"] in RATE_INPUTS}
+    rates = []
+    if contexts:
+        M = models.ReportManualData
+        stored = {}
+        for report_type, context_key, data_key, value in db.query(
+            M.report_type, M.context_key, M.data_key, M.data_value
+        ).filter(tuple_(M.report_type, M.context_key).in_(contexts), M.data_key.in_(RATE_INPUTS)):
+            stored.setdefault((report_type, context_key), {})[data_key] = value
+        for (report_type, context_key), values in stored.items():
+            if len(values) < len(RATE_INPUTS):
+                continue
+            rate = _error_rate(values["vehicle_count"], values["error_count"])
+            if rate is not None:
+                rates.append({
+                    "report_type": report_type, "context_key": context_key,
+                    "data_key": "error_rate", "data_value": rate,
+                })
+        if rates:
+            db.execute(_upsert(), rates)
+
+    db.info.setdefault(_PENDING, set()).update(r["report_type"] for r in rows)
+    report_cache.invalidate_contexts(db, {r["context_key"] for r in rows})
+    return len(rows) + len(rates)
+
+
+# ─── Write tracking ───────────────────────────────────────────────────────────
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_types(session, flush_context):
+    types = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, models.ReportManualData):
+            hist = inspect(obj).attrs.report_type.history
+            types.update(hist.added or (), hist.unchanged or (), hist.deleted or ())
+    if types:
+        session.info.setdefault(_PENDING, set()).update(types)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_committed(session):
+    types = session.info.pop(_PENDING, None)
+    if types:
+        cache.invalidate(types)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_pending(session, previous_transaction):
+    session.info.pop(_PENDING, None)
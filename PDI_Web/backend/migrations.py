@@ -0,0 +1,211 @@
+"""
+Versioned schema migrations of the web backend.
+
+Each step runs once, in its own transaction, and the applied version is kept in
+the schema_version table under the 'web' component (schema_version.py, shared
+with the desktop app). Databases from before schema_version kept it in PRAGMA
+user_version, which is taken over on the first run. Steps must be safe on
+databases created by the desktop app as well as on fresh ones built by
+Base.metadata.create_all.
+"""
+from sqlalchemy import text
+import dates
+from dates import iso_date
+import schema_version
+import rollup
+import search
+import vehicles
+
+COMPONENT = "web"
+
+# Columns added after the first releases; older databases (and ones created by
+# the desktop app) get them in step 1, before anything that depends on them
+LEGACY_COLUMNS = {
+    "pdi_responses": [
+        ("item_label", "TEXT"), ("durum", "TEXT"), ("ariza_tanimi", "TEXT"), ("top_hata", "TEXT"),
+        ("alt_grup", "TEXT"), ("fotograf_yolu", "TEXT"), ("olcum_ilk", "TEXT"), ("olcum_sonra", "TEXT"),
+        ("kaydeden", "TEXT"), ("hata_nerede_item", "TEXT"),
+    ],
+    "pdi_sessions": [
+        ("imalat_no", "TEXT"), ("wa_no", "TEXT"), ("aku_uretim_tarihi", "TEXT"), ("yangin_tupu_tarihi", "TEXT"),
+        ("genel_aciklamalar", "TEXT"), ("guncelleme_tarihi", "TEXT"), ("synced", "INTEGER DEFAULT 1"),
+    ],
+    "pdi_kayitlari": [
+        ("pdi_session_id", "INTEGER"),
+    ],
+}
+
+
+def _columns(conn, table: str):
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _add_column(conn, table: str, column: str, ddl: str):
+    if column not in _columns(conn, table):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def _backfill_iso_date(conn, table: str, source: str):
+    rows = conn.exec_driver_sql(f"SELECT id, {source} FROM {table}").fetchall()
+    params = [{"id": row_id, "d": iso_date(raw)} for row_id, raw in rows]
+    if params:
+        conn.execute(text(f"UPDATE {table} SET pdi_date = :d WHERE id = :id"), params)
+
+
+def _m001_pdi_date(conn):
+    """Legacy columns, then the derived ISO pdi_date on records, imalat entries and form sessions."""
+    for table, columns in LEGACY_COLUMNS.items():
+        for column, ddl in columns:
+            _add_column(conn, table, column, ddl)
+    for table, source in (
+        ("pdi_kayitlari", "tarih_saat"),
+        ("imalat_kayitlari", "tarih"),
+        ("pdi_sessions", "tarih"),
+    ):
+        _add_column(conn, table, "pdi_date", "VARCHAR")
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{table}_pdi_date ON {table} (pdi_date)")
+        _backfill_iso_date(conn, table, source)
+
+
+def _m002_response_unique_keys(conn):
+    """
+    One row per (session, item) for checklist and dynamic responses. Duplicates
+    are dropped keeping the oldest row, which is the one later writes updated.
+    """
+    for table, item_col in (
+        ("pdi_responses", "item_no"),
+        ("pdi_dynamic_responses", "dynamic_item_id"),
+    ):
+        conn.exec_driver_sql(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM {table} GROUP BY session_id, {item_col})"
+        )
+        conn.exec_driver_sql(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{table}_session_item ON {table} (session_id, {item_col})"
+        )
+
+
+def _m003_record_search(conn):
+    """FTS5 index over record findings (search.py); skipped where SQLite lacks FTS5."""
+    if search.available(conn):
+        search.create(conn)
+        search.rebuild(conn)
+
+
+def _m004_vehicle_search(conn):
+    """Trigram index over sasi_no / bb_no (search.py); needs SQLite 3.34+."""
+    if search.available(conn, "trigram"):
+        search.create_vehicle_index(conn)
+        search.rebuild_vehicle_index(conn)
+
+
+def _m005_vehicles(conn):
+    """Vehicle dimension table and its triggers (vehicles.py), backfilled from the records."""
+    vehicles.create(conn)
+    vehicles.rebuild(conn)
+
+
+def _has_unique_key(conn, table: str, columns) -> bool:
+    for index in conn.exec_driver_sql(f"PRAGMA index_list({table})").fetchall():
+        if index[2] and [r[2] for r in conn.exec_driver_sql(f"PRAGMA index_info({index[1]})")] == list(columns):
+            return True
+    return False
+
+
+def _m006_manual_data_unique_key(conn):
+    """
+    One value per (report_type, context_key, data_key) in report_manual_data.
+    Duplicates are dropped keeping the newest row, the one reports and the edit
+    modals showed (they built their dicts in id order, so the last row won).
+    Tables created by the desktop app already have the key as a UNIQUE constraint.
+    """
+    if _has_unique_key(conn, "report_manual_data", ("report_type", "context_key", "data_key")):
+        return
+    conn.exec_driver_sql(
+        "DELETE FROM report_manual_data WHERE id NOT IN "
+        "(SELECT MAX(id) FROM report_manual_data GROUP BY report_type, context_key, data_key)"
+    )
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_report_manual_data_key "
+        "ON report_manual_data (report_type, context_key, data_key)"
+    )
+
+
+def _m007_hata_nerede_date_index(conn):
+    """(hata_nerede, pdi_date) for the İmalat reports' date-range reads."""
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_pdi_kayitlari_hata_nerede_date ON pdi_kayitlari (hata_nerede, pdi_date)"
+    )
+
+
+def _m008_pdi_date_triggers(conn):
+    """
+    pdi_date for raw SQL writers (dates.py triggers), then re-derive it for
+    rows the desktop app wrote or re-dated since step 1, and recompute what
+    depends on it: the vehicle table (whose triggers now skip key-neutral
+    updates) and the rollup.
+    """
+    dates.create_triggers(conn)
+    dates.backfill(conn)
+    vehicles.create(conn)
+    vehicles.rebuild(conn)
+    rollup.rebuild(conn)
+
+
+def _m009_rollup_pending(conn):
+    """Triggers queueing the rollup months touched by raw SQL writers (rollup.py)."""
+    rollup.create_triggers(conn)
+
+
+def _m010_job_worker(conn):
+    """Owning process of background jobs, so a restart recovers only its own (jobs.recover)."""
+    _add_column(conn, "background_jobs", "worker", "VARCHAR")
+
+
+def _m011_search_queue(conn):
+    """
+    Search triggers that only queue record ids (search.py): the direct ones
+    failed every write of clients whose SQLite lacks FTS5.
+    """
+    if search.exists(conn, search.TABLE):
+        search.create_triggers(conn)
+
+
+def _m012_vehicle_search_queue(conn):
+    """The same for vehicle_search, whose triggers failed where SQLite lacks trigram (< 3.34)."""
+    if search.exists(conn, search.TABLE) or search.exists(conn, search.VEHICLE_TABLE):
+        search.create_triggers(conn)
+
+
+def _m013_vehicle_prefix_indexes(conn):
+    """NOCASE indexes for the prefix fallback of the chassis / BB autocomplete."""
+    for column in ("sasi_no", "bb_no"):
+        conn.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_pdi_kayitlari_{column}_nocase ON pdi_kayitlari ({column} COLLATE NOCASE)"
+        )
+
+
+MIGRATIONS = [
+    (1, _m001_pdi_date),
+    (2, _m002_response_unique_keys),
+    (3, _m003_record_search),
+    (4, _m004_vehicle_search),
+    (5, _m005_vehicles),
+    (6, _m006_manual_data_unique_key),
+    (7, _m007_hata_nerede_date_index),
+    (8, _m008_pdi_date_triggers),
+    (9, _m009_rollup_pending),
+    (10, _m010_job_worker),
+    (11, _m011_search_queue),
+    (12, _m012_vehicle_search_queue),
+    (13, _m013_vehicle_prefix_indexes),
+]
+
+
+def _user_version(conn):
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def run(bind):
+    """Apply every migration newer than the database's recorded 'web' version."""
+    return schema_version.apply(schema_version.engine_begin(bind), COMPONENT, MIGRATIONS, legacy_version=_user_version)
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Index, text
+from sqlalchemy.orm import validates
 from database import Base
+from dates import iso_date
 
 class PDIKayit(Base):
     __tablename__ = "pdi_kayitlari"
@@ -31,6 +33,56 @@ class PDIKayit(Base):
     top_hata = Column(String, index=True, nullable=True)
     hata_nerede = Column(String, nullable=True) # Options: 'TUM' (PDI), 'İmalat'
     pdi_session_id = Column(Integer, nullable=True, index=True)  # PDI form'undan geldiyse session ID
+    pdi_date = Column(String, index=True, nullable=True)  # tarih_saat'ten türetilir: YYYY-MM-DD
+
+    @validates("tarih_saat")
+    def _sync_pdi_date(self, key, value):
+        self.pdi_date = iso_date(value)
+        return value
+
+    __table_args__ = (
+        Index("ix_pdi_kayitlari_hata_nerede_date", "hata_nerede", "pdi_date"),
+        # Prefix autocomplete without the trigram index: LIKE 'q%' is an index range only on NOCASE
+        Index("ix_pdi_kayitlari_sasi_no_nocase", text("sasi_no COLLATE NOCASE")),
+        Index("ix_pdi_kayitlari_bb_no_nocase", text("bb_no COLLATE NOCASE")),
+    )
+
+class PDIMonthlyRollup(Base):
+    """Aylık rapor özeti: (yıl, ay, araç tipi, top hata, hata nerede) başına araç/hata sayısı"""
+    __tablename__ = "pdi_monthly_rollup"
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    arac_tipi = Column(String, primary_key=True)    # '' : tip yok
+    top_hata = Column(String, primary_key=True)     # '*' : tüm hatalar
+    hata_nerede = Column(String, primary_key=True)  # '*' : tüm yerler
+    vehicle_count = Column(Integer, default=0)      # COUNT(DISTINCT sasi_no)
+    error_count = Column(Integer, default=0)        # COUNT(id)
+
+class PDIRollupPending(Base):
+    """Rollup'ta yenilenmesi gereken aylar: pdi_kayitlari tetikleyicileri yazar (rollup.py)"""
+    __tablename__ = "pdi_rollup_pending"
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+
+class PDISearchPending(Base):
+    """Arama indeksinde yenilenmesi gereken kayıtlar: pdi_kayitlari / pdi_responses tetikleyicileri yazar (search.py)"""
+    __tablename__ = "pdi_search_pending"
+    id = Column(Integer, primary_key=True)          # pdi_kayitlari.id
+
+class Vehicle(Base):
+    """Araç boyut tablosu: (şasi no, araç tipi, PDI tarihi) başına bir satır, tetikleyicilerle güncel (vehicles.py)"""
+    __tablename__ = "vehicles"
+    id = Column(Integer, primary_key=True)
+    sasi_no = Column(String, nullable=False)
+    arac_tipi = Column(String, nullable=False, default="")   # '' : tip yok
+    pdi_date = Column(String, nullable=False, default="")    # YYYY-MM-DD, '' : tarih yok
+    kayit_sayisi = Column(Integer, default=0)                # Bu anahtara düşen pdi_kayitlari satırı
+
+    __table_args__ = (
+        Index("ux_vehicles_key", "sasi_no", "arac_tipi", "pdi_date", unique=True),
+        Index("ix_vehicles_date", "pdi_date", "arac_tipi", "sasi_no"),
+        Index("ix_vehicles_type", "arac_tipi", "sasi_no"),
+    )
 
 class TopHata(Base):
     __tablename__ = "top_hatalar"
@@ -46,6 +98,10 @@ class ReportManualData(Base):
     data_key = Column(String, index=True)    # e.g., 'prev_year_rate'
     data_value = Column(String)
 
+    __table_args__ = (
+        Index("ux_report_manual_data_key", "report_type", "context_key", "data_key", unique=True),
+    )
+
 class ImalatKayit(Base):
     __tablename__ = "imalat_kayitlari"
     id = Column(Integer, primary_key=True, index=True)
@@ -56,6 +112,12 @@ class ImalatKayit(Base):
     hata_metni = Column(String)
     kullanici = Column(String)
     olusturma_tarihi = Column(String)
+    pdi_date = Column(String, index=True, nullable=True)  # tarih'ten türetilir: YYYY-MM-DD
+
+    @validates("tarih")
+    def _sync_pdi_date(self, key, value):
+        self.pdi_date = iso_date(value)
+        return value
 
 # Lookup tables for dynamic dropdowns
 class AracTipiLookUp(Base):
@@ -99,6 +161,50 @@ class PDIDetay(Base):
     aciklama = Column(String, nullable=True)
     fotograf_yolu = Column(String, nullable=True)
 
+class PhotoFile(Base):
+    """Yüklenen fotoğraflar ve küçültülmüş kopyaları (photos.py)"""
+    __tablename__ = "photo_files"
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String, unique=True, index=True)  # static/ altına göre, 'photos/objects/ab/<sha256>.jpg'
+    content_type = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    thumb_path = Column(String, nullable=True)
+    thumb_bytes = Column(Integer, nullable=True)
+    preview_path = Column(String, nullable=True)
+    preview_bytes = Column(Integer, nullable=True)
+    created_at = Column(String, nullable=True)
+
+class PhotoRef(Base):
+    """Hangi satırın hangi fotoğrafı kullandığı (aynı dosyayı birden çok satır paylaşabilir)"""
+    __tablename__ = "photo_refs"
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String, index=True)               # photo_files.path
+    owner_table = Column(String)                    # 'pdi_kayitlari', 'pdi_detaylari', 'pdi_responses', ...
+    owner_id = Column(Integer)
+
+    __table_args__ = (
+        Index("ux_photo_refs_owner", "owner_table", "owner_id", unique=True),
+    )
+
+class BackgroundJob(Base):
+    """Arka planda çalışan içe/dışa aktarma işleri (jobs.py)"""
+    __tablename__ = "background_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, index=True)               # 'import' | 'export'
+    status = Column(String, index=True, default="queued")  # 'queued' | 'running' | 'done' | 'failed'
+    progress = Column(Integer, default=0)           # 0-100
+    message = Column(String, nullable=True)         # Son durum / hata mesajı
+    params = Column(String, nullable=True)          # JSON
+    result = Column(String, nullable=True)          # JSON özet
+    result_path = Column(String, nullable=True)     # İndirilebilir sonuç dosyası
+    result_name = Column(String, nullable=True)     # İndirme dosya adı
+    worker = Column(String, nullable=True)          # 'host:pid' - işi kuyruğa alan süreç
+    created_at = Column(String)
+    started_at = Column(String, nullable=True)
+    finished_at = Column(String, nullable=True)
+
 # ─── PDI Form (Dijital Checklist) ─────────────────────────────────────────────
 
 class PDISession(Base):
@@ -121,6 +227,12 @@ class PDISession(Base):
     olusturma_tarihi = Column(String)
     guncelleme_tarihi = Column(String, nullable=True)
     synced = Column(Integer, default=1)             # 0: offline pending
+    pdi_date = Column(String, index=True, nullable=True)  # tarih'ten türetilir: YYYY-MM-DD
+
+    @validates("tarih")
+    def _sync_pdi_date(self, key, value):
+        self.pdi_date = iso_date(value)
+        return value
 
 class PDIResponse(Base):
     """Her checklist maddesinin cevabı"""
@@ -139,6 +251,10 @@ class PDIResponse(Base):
     kaydeden = Column(String, nullable=True)        # Bu maddeyi kaydeden ustanın adı
     hata_nerede_item = Column(String, nullable=True)  # Giderildi seçilince: TUM/İmalat/Diğer
 
+    __table_args__ = (
+        Index("ux_pdi_responses_session_item", "session_id", "item_no", unique=True),
+    )
+
 class PDIVehiclePin(Base):
     """Araç diyagramı üzerine konulan hata pinleri"""
     __tablename__ = "pdi_vehicle_pins"
@@ -170,3 +286,7 @@ class PDIDynamicResponse(Base):
     kontrol_edildi = Column(Integer, default=0)     # 0 | 1
     aciklama = Column(String, nullable=True)
     fotograf_yolu = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ux_pdi_dynamic_responses_session_item", "session_id", "dynamic_item_id", unique=True),
+    )
@@ -0,0 +1,355 @@
+"""
+Shared photo handling for every upload endpoint.
+
+Uploads are copied in fixed-size chunks (the endpoints are plain `def`, so
+FastAPI runs them in its threadpool, off the event loop) with an upper size
+limit and stored content-addressed: the file name is the SHA-256 of the bytes
+(static/photos/objects/ab/abcd….jpg), written to a temporary file and renamed
+into place, so identical uploads share one file and names never collide.
+Every file is registered in photo_files; photo_refs links it to the rows whose
+fotograf_yolu points at it (pdi_kayitlari, pdi_detaylari, pdi_responses,
+pdi_vehicle_pins, pdi_dynamic_responses). Deleting a row never deletes the
+file, since other rows may share it; `python photos.py gc` removes what is no
+longer referenced.
+
+Downscaled thumbnail and preview variants are produced by a small worker pool;
+once ready, their paths, byte sizes and the original's dimensions are filled
+into the photo_files row, and list endpoints hand out thumb_url / preview_url
+instead of the full photo.
+
+Usage: python photos.py              (registers existing photos, builds missing variants)
+       python photos.py gc [--dry-run]   (removes unreferenced photos and variants)
+"""
+import sys
+import os
+import hashlib
+import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi import HTTPException
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import SessionLocal, DB_DIR
+import models
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:     # variants are skipped, originals are still stored
+    Image = None
+
+log = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.abspath(os.path.join(DB_DIR, "..", "backend", "static"))
+PHOTO_DIR = os.path.join(STATIC_DIR, "photos")
+OBJECT_DIR = os.path.join(PHOTO_DIR, "objects")
+VARIANT_DIR = os.path.join(PHOTO_DIR, "_variants")
+os.makedirs(OBJECT_DIR, exist_ok=True)
+os.makedirs(VARIANT_DIR, exist_ok=True)
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_MB = float(os.environ.get("PDI_PHOTO_MAX_MB", "20"))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+VARIANTS = {"thumb": 320, "preview": 1280}      # longest edge in px
+if Image is not None:
+    VARIANT_FORMAT = os.environ.get("PDI_PHOTO_FORMAT", "webp" if features.check("webp") else "jpeg").lower()
+else:
+    VARIANT_FORMAT = "jpeg"
+VARIANT_EXT = ".webp" if VARIANT_FORMAT == "webp" else ".jpg"
+VARIANT_QUALITY = 80
+GC_GRACE_SECONDS = float(os.environ.get("PDI_PHOTO_GC_GRACE_HOURS", "1")) * 3600
+
+# Tables with a fotograf_yolu column, i.e. the possible photo_refs owners
+OWNER_MODELS = {
+    m.__tablename__: m
+    for m in (models.PDIKayit, models.PDIDetay, models.PDIResponse, models.PDIVehiclePin, models.PDIDynamicResponse)
+}
+
+NO_PHOTO = {"photo_url": None, "thumb_url": None, "preview_url": None}
+
+_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("PDI_PHOTO_WORKERS", "2")), thread_name_prefix="pdi-photo")
+
+
+def relative_path(stored) -> str:
+    """
+    Path relative to static/ for a stored fotograf_yolu value: absolute paths
+    under static/ (also from a checkout that has since moved) and bare file
+    names (photos/ root) are understood, anything else (e.g. desktop network
+    paths) gives None.
+    """
+    if not stored:
+        return None
+    stored = str(stored)
+    if not os.path.isabs(stored) and "\\" not in stored and ":" not in stored:
+        return f"photos/{stored}"
+    full = os.path.abspath(stored)
+    if full.startswith(STATIC_DIR + os.sep):
+        return os.path.relpath(full, STATIC_DIR).replace(os.sep, "/")
+    marker = "/static/photos/"
+    norm = stored.replace("\\", "/")
+    if marker in norm:
+        return "photos/" + norm.rsplit(marker, 1)[1]
+    return None
+
+
+def static_url(rel: str) -> str:
+    return f"/static/{rel}" if rel else None
+
+
+def _upsert(values: dict, update_cols):
+    t = models.PhotoFile.__table__
+    stmt = sqlite_insert(t).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=[t.c.path], set_={c: stmt.excluded[c] for c in update_cols}
+    )
+
+
+def _normalized_ext(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower() or ".jpg"
+    return ".jpg" if ext == ".jpeg" else ext
+
+
+def save_upload(db, upload) -> str:
+    """
+    Stream an UploadFile into the content-addressed store and register it.
+    Returns the absolute file path (the value stored in fotograf_yolu columns);
+    an identical earlier upload is reused. Raises 413 above PDI_PHOTO_MAX_MB.
+    """
+    fd, tmp = tempfile.mkstemp(dir=OBJECT_DIR, suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = upload.file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413, detail=f"Fotoğraf çok büyük (en fazla {MAX_UPLOAD_MB:g} MB)."
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        sha = digest.hexdigest()
+        dest_dir = os.path.join(OBJECT_DIR, sha[:2])
+        os.makedirs(dest_dir, exist_ok=True)
+        path = os.path.join(dest_dir, sha + _normalized_ext(upload.filename))
+        created = not os.path.exists(path)
+        if created:
+            os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    rel = relative_path(path)
+    t = models.PhotoFile.__table__
+    db.execute(sqlite_insert(t).values(
+        path=rel, size_bytes=size, content_type=upload.content_type,
+        created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    ).on_conflict_do_nothing(index_elements=[t.c.path]))
+    if created:
+        _pool.submit(make_variants, rel)
+    return path
+
+
+def link(db, owner_table: str, owner_id: int, stored):
+    """Point the photo_refs entry of one row at its (new) fotograf_yolu, or drop it."""
+    _link_rel(db, owner_table, owner_id, relative_path(stored))
+
+
+def _link_rel(db, owner_table: str, owner_id: int, rel: str):
+    t = models.PhotoRef.__table__
+    if not rel:
+        db.execute(t.delete().where(t.c.owner_table == owner_table, t.c.owner_id == owner_id))
+        return
+    stmt = sqlite_insert(t).values(path=rel, owner_table=owner_table, owner_id=owner_id)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[t.c.owner_table, t.c.owner_id], set_={"path": stmt.excluded.path}
+    ))
+
+
+def _variant_rel(rel: str, name: str) -> str:
+    stem = os.path.splitext(rel[len("photos/"):] if rel.startswith("photos/") else rel)[0]
+    return f"photos/_variants/{stem.replace('/', '__')}_{name}{VARIANT_EXT}"
+
+
+def make_variants(rel: str):
+    """Build thumbnail/preview files for one photo and record their sizes (worker pool)."""
+    if Image is None:
+        return
+    src = os.path.join(STATIC_DIR, rel)
+    values = {"path": rel}
+    try:
+        with Image.open(src) as im:
+            im = ImageOps.exif_transpose(im)
+            values["width"], values["height"] = im.size
+            if VARIANT_FORMAT == "jpeg" and im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            for name, edge in VARIANTS.items():
+                variant = im.copy()
+                variant.thumbnail((edge, edge))
+                vrel = _variant_rel(rel, name)
+                variant.save(os.path.join(STATIC_DIR, vrel), VARIANT_FORMAT.upper(), quality=VARIANT_QUALITY)
+                values[f"{name}_path"] = vrel
+                values[f"{name}_bytes"] = os.path.getsize(os.path.join(STATIC_DIR, vrel))
+    except Exception as e:
+        log.warning("Fotoğraf varyantı üretilemedi (%s): %s", rel, e)
+        return
+    values["size_bytes"] = os.path.getsize(src)
+    db = SessionLocal()
+    try:
+        db.execute(_upsert(values, [k for k in values if k != "path"]))
+        db.commit()
+    except SQLAlchemyError:
+        # runs on the pool, where an exception would vanish with the future;
+        # the photo is served without variants until backfill() retries it
+        db.rollback()
+        log.exception("Fotoğraf varyantları kaydedilemedi (%s)", rel)
+    finally:
+        db.close()
+
+
+def urls_for(db, stored_values) -> dict:
+    """{stored fotograf_yolu: {"photo_url", "thumb_url", "preview_url"}} in one query."""
+    rels = {s: relative_path(s) for s in set(stored_values) if s}
+    known = {}
+    wanted = [r for r in rels.values() if r]
+    if wanted:
+        for p in db.query(models.PhotoFile).filter(models.PhotoFile.path.in_(wanted)):
+            known[p.path] = p
+    result = {}
+    for stored, rel in rels.items():
+        p = known.get(rel)
+        result[stored] = {
+            "photo_url": static_url(rel),
+            "thumb_url": static_url(p.thumb_path) if p and p.thumb_path else static_url(rel),
+            "preview_url": static_url(p.preview_path) if p and p.preview_path else static_url(rel),
+        }
+    return result
+
+
+def photo_urls(db, stored) -> dict:
+    """urls_for() for a single value; all None when there is no photo."""
+    return urls_for(db, [stored]).get(stored) or NO_PHOTO
+
+
+def _remove(rel: str):
+    full = os.path.join(STATIC_DIR, rel)
+    try:
+        os.remove(full)
+    except OSError:
+        pass
+
+
+def sync_refs(db) -> int:
+    """
+    Reconcile photo_refs with the fotograf_yolu columns (rows deleted or edited
+    without link(), desktop writes). Returns the number of changed refs.
+    """
+    t = models.PhotoRef.__table__
+    actual = set()
+    for table, model in OWNER_MODELS.items():
+        rows = db.query(model.id, model.fotograf_yolu).filter(
+            model.fotograf_yolu.isnot(None), model.fotograf_yolu != ""
+        )
+        actual |= {(table, oid, rel) for oid, rel in ((oid, relative_path(v)) for oid, v in rows) if rel}
+    known = {(r.owner_table, r.owner_id, r.path) for r in db.execute(t.select())}
+    stale = known - actual
+    for owner_table, owner_id, _ in stale:
+        db.execute(t.delete().where(t.c.owner_table == owner_table, t.c.owner_id == owner_id))
+    for owner_table, owner_id, rel in actual - known:
+        _link_rel(db, owner_table, owner_id, rel)
+    return len(stale) + len(actual - known)
+
+
+def collect_garbage(dry_run: bool = False) -> dict:
+    """
+    Delete photos (and their variants) that no row references any more, e.g.
+    after delete_record / delete_session. Files younger than
+    PDI_PHOTO_GC_GRACE_HOURS are kept: their upload may not be linked yet.
+    """
+    cutoff = time.time() - GC_GRACE_SECONDS
+    db = SessionLocal()
+    try:
+        changed = sync_refs(db)
+        live = {r[0] for r in db.query(models.PhotoRef.path).distinct()}
+        rows = {p.path: p for p in db.query(models.PhotoFile)}
+        on_disk = set()
+        for root, dirs, files in os.walk(PHOTO_DIR):
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != VARIANT_DIR]
+            on_disk |= {relative_path(os.path.join(root, f)) for f in files}
+
+        def old_enough(rel):
+            try:
+                return os.path.getmtime(os.path.join(STATIC_DIR, rel)) < cutoff
+            except OSError:
+                return True
+
+        garbage = sorted(rel for rel in (on_disk | set(rows)) - live if old_enough(rel))
+        keep_variants = set()
+        for rel, p in rows.items():
+            if rel not in garbage:
+                keep_variants.update(v for v in (p.thumb_path, p.preview_path) if v)
+        stray_variants = [
+            rel for rel in (relative_path(os.path.join(VARIANT_DIR, f)) for f in os.listdir(VARIANT_DIR))
+            if rel not in keep_variants and old_enough(rel)
+        ]
+        freed = 0
+        for rel in garbage + stray_variants:
+            full = os.path.join(STATIC_DIR, rel)
+            freed += os.path.getsize(full) if os.path.exists(full) else 0
+        if not dry_run:
+            for rel in garbage + stray_variants:
+                _remove(rel)
+            t = models.PhotoFile.__table__
+            if garbage:
+                db.execute(t.delete().where(t.c.path.in_(garbage)))
+            db.commit()
+        else:
+            db.rollback()
+        return {
+            "refs_synced": changed,
+            "photos_removed": len(garbage),
+            "variants_removed": len(stray_variants),
+            "bytes_freed": freed,
+            "dry_run": dry_run,
+        }
+    finally:
+        db.close()
+
+
+def backfill():
+    """Register photos already on disk and build their missing variants."""
+    db = SessionLocal()
+    try:
+        known = {p.path: p for p in db.query(models.PhotoFile)}
+    finally:
+        db.close()
+    todo = []
+    for root, dirs, files in os.walk(PHOTO_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != VARIANT_DIR]
+        for f in files:
+            if f.endswith(".part"):
+                continue
+            rel = relative_path(os.path.join(root, f))
+            if rel not in known or not known[rel].thumb_path:
+                todo.append(rel)
+    for _ in _pool.map(make_variants, todo):
+        pass
+    return len(todo)
+
+
+if __name__ == "__main__":
+    from database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    if sys.argv[1:2] == ["gc"]:
+        print(collect_garbage(dry_run="--dry-run" in sys.argv))
+    else:
+        print(f"{backfill()} fotoğraf işlendi.")
@@ -0,0 +1,245 @@
+"""
+In-process cache for report responses.
+
+Entries are keyed by endpoint + parameters and remember the (year, month)
+periods they were computed from. Committed changes to PDIKayit, ImalatKayit or
+ReportManualData drop only the entries that read one of the touched months;
+TopHata changes clear everything. Responses carry an ETag so that browsers can
+revalidate with If-None-Match and get a 304. A body whose months were
+invalidated while it was being computed is served once but not stored.
+
+Record writes made outside this process (desktop app, other workers) reach
+the cache through the rollup's pending-month queue: every lookup first lets
+rollup.sync_pending() recompute those months and drops the entries that read
+them. Other outside writes are not seen, so entries also expire after
+PDI_REPORT_CACHE_TTL seconds.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, inspect
+
+from database import SessionLocal, engine
+import dates
+import models
+import rollup
+
+MAX_ENTRIES = int(os.environ.get("PDI_REPORT_CACHE_SIZE", "256"))
+TTL_SECONDS = float(os.environ.get("PDI_REPORT_CACHE_TTL", "600"))
+CACHE_CONTROL = "private, no-cache"     # always revalidate, the ETag makes it cheap
+
+# Session.info key collecting the months touched by a transaction
+_PENDING = "report_cache_months"
+# Marker in the pending set meaning "clear the whole cache"
+_EVERYTHING = "*"
+
+
+class _Entry:
+    __slots__ = ("body", "etag", "periods", "created")
+
+    def __init__(self, body: bytes, periods):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.periods = frozenset(periods)
+        self.created = time.monotonic()
+
+
+class ReportCache:
+    """LRU of rendered JSON bodies with a (year, month) -> keys index for invalidation."""
+
+    def __init__(self, maxsize: int = MAX_ENTRIES, ttl: float = TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._by_period = {}
+        self._generations = {}      # period -> invalidation count, see generation()
+        self._clears = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for period in entry.periods:
+            keys = self._by_period.get(period)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_period[period]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def generation(self, periods):
+        """
+        Token to take before computing a body for put(): it changes when one of
+        the periods is invalidated (or the cache cleared) in the meantime.
+        """
+        with self._lock:
+            return self._clears, sum(self._generations.get(p, 0) for p in periods)
+
+    def put(self, key, body: bytes, periods, generation=None):
+        """
+        Store a computed body. With the generation() taken before computing, a
+        body that may predate a concurrent commit is returned but not kept.
+        """
+        entry = _Entry(body, periods)
+        with self._lock:
+            if generation is not None and generation != (
+                self._clears, sum(self._generations.get(p, 0) for p in entry.periods)
+            ):
+                return entry
+            self._drop(key)
+            self._entries[key] = entry
+            for period in entry.periods:
+                self._by_period.setdefault(period, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, periods):
+        """Drop every entry computed from one of the given (year, month) periods or tags."""
+        with self._lock:
+            for period in periods:
+                self._generations[period] = self._generations.get(period, 0) + 1
+            keys = set(chain.from_iterable(self._by_period.get(p, ()) for p in periods))
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._clears += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_period.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+cache = ReportCache()
+
+
+def year_periods(*years):
+    """All (year, month) periods of the given years."""
+    return {(y, m) for y in years for m in range(1, 13)}
+
+
+def cached_response(request: Request, key, periods, compute) -> Response:
+    """
+    Serve compute() through the cache. periods are the (year, month) buckets the
+    result depends on; a matching If-None-Match gets a 304 without a body.
+    """
+    outside = rollup.sync_pending(engine)
+    if outside:
+        cache.invalidate(outside)
+    entry = cache.get(key)
+    status = "HIT"
+    if entry is None:
+        generation = cache.generation(periods)
+        body = json.dumps(
+            jsonable_encoder(compute()), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+        entry = cache.put(key, body, periods, generation)
+        status = "MISS"
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL, "X-Cache": status}
+    if entry.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def invalidate_months(session, months):
+    """Queue an invalidation for writes that bypass the ORM (bulk Core statements)."""
+    session.info.setdefault(_PENDING, set()).update(months)
+
+
+def invalidate_contexts(session, context_keys):
+    """invalidate_months() for report_manual_data context keys written through Core."""
+    invalidate_months(session, {_context_month(k) for k in context_keys})
+
+
+# ─── Write tracking ───────────────────────────────────────────────────────────
+
+def _history_months(obj, attr: str):
+    hist = inspect(obj).attrs[attr].history
+    return {
+        ym for ym in (dates.year_month(v) for v in chain(hist.added or (), hist.unchanged or (), hist.deleted or ()))
+        if ym
+    }
+
+
+def _context_month(context_key):
+    """Report overrides are keyed 'YYYY-MM' or 'YYYY-MM_<hata>'; anything else clears all."""
+    return dates.year_month(dates.iso_date(f"{(context_key or '')[:7]}-01")) or _EVERYTHING
+
+
+def _manual_data_months(obj):
+    hist = inspect(obj).attrs.context_key.history
+    return {_context_month(v) for v in chain(hist.added or (), hist.unchanged or (), hist.deleted or ())}
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_months(session, flush_context):
+    months = set()
+    for objs, check_changes in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+        for obj in objs:
+            if isinstance(obj, models.PDIKayit):
+                months |= rollup.touched_months(obj, check_changes)
+            elif isinstance(obj, models.ImalatKayit):
+                months |= _history_months(obj, "pdi_date")
+            elif isinstance(obj, models.ReportManualData):
+                months |= _manual_data_months(obj)
+            elif isinstance(obj, models.TopHata):
+                months.add(_EVERYTHING)
+    if months:
+        session.info.setdefault(_PENDING, set()).update(months)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_committed(session):
+    months = session.info.pop(_PENDING, None)
+    if not months:
+        return
+    if _EVERYTHING in months:
+        cache.clear()
+    else:
+        cache.invalidate(months)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_pending(session, previous_transaction):
+    session.info.pop(_PENDING, None)
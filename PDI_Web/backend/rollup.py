@@ -0,0 +1,219 @@
+"""
+Monthly report rollup (pdi_monthly_rollup).
+
+Report endpoints read vehicle/error counts from this table instead of scanning
+pdi_kayitlari. Rows are kept in sync from the ORM: every flush that creates,
+edits or deletes a PDIKayit recomputes the (year, month) buckets it touched.
+
+Writers outside the ORM (the desktop app, raw SQL) are covered by triggers on
+pdi_kayitlari that queue the touched months in pdi_rollup_pending. Distinct
+vehicle counts cannot be adjusted row by row, so the months are recomputed by
+the next reader: query_rollup() and the report cache call sync_pending() first.
+refresh_months() clears the queue for the months it recomputes, so web writes
+leave nothing behind.
+
+Usage: python rollup.py   (rebuilds the whole table, e.g. after desktop writes)
+"""
+import sys
+import os
+from itertools import chain
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import event, inspect, tuple_
+from database import SessionLocal, engine, Base
+import dates
+import models
+import vehicles
+
+# Sentinel for "all values" buckets, so that distinct vehicle counts can be read
+# per month/type without summing over top_hata / hata_nerede (not additive).
+ALL = "*"
+
+# Columns whose change moves a record between rollup buckets
+ROLLUP_COLUMNS = ("sasi_no", "arac_tipi", "top_hata", "hata_nerede", "pdi_date")
+
+
+def _aggregate(y: int, m: int, rows):
+    buckets = {}
+    for sasi_no, arac_tipi, top_hata, hata_nerede in rows:
+        arac_tipi = arac_tipi or ""
+        top_hata = top_hata or ""
+        hata_nerede = hata_nerede or ""
+        # a set: a stored '*' must not land twice in the same totals bucket
+        for key in {
+            (arac_tipi, top_hata, hata_nerede),
+            (arac_tipi, top_hata, ALL),
+            (arac_tipi, ALL, hata_nerede),
+            (arac_tipi, ALL, ALL),
+        }:
+            bucket = buckets.setdefault(key, [set(), 0])
+            if sasi_no is not None:
+                bucket[0].add(sasi_no)
+            bucket[1] += 1
+    return [
+        {
+            "year": y, "month": m, "arac_tipi": arac_tipi, "top_hata": top_hata,
+            "hata_nerede": hata_nerede, "vehicle_count": len(vehicles), "error_count": errors,
+        }
+        for (arac_tipi, top_hata, hata_nerede), (vehicles, errors) in buckets.items()
+    ]
+
+
+PENDING = models.PDIRollupPending.__tablename__
+
+
+def _queue(rec: str) -> str:
+    d = vehicles.date_key(rec)
+    return (
+        f"INSERT OR IGNORE INTO {PENDING}(year, month) "
+        f"SELECT CAST(substr(d, 1, 4) AS INTEGER), CAST(substr(d, 6, 2) AS INTEGER) FROM (SELECT {d} AS d) WHERE d <> '';"
+    )
+
+
+TRIGGERS = {
+    "trg_rollup_pending_ai": f"AFTER INSERT ON pdi_kayitlari BEGIN {_queue('NEW')} END",
+    "trg_rollup_pending_ad": f"AFTER DELETE ON pdi_kayitlari BEGIN {_queue('OLD')} END",
+    "trg_rollup_pending_au": (
+        f"AFTER UPDATE OF {', '.join(ROLLUP_COLUMNS)} ON pdi_kayitlari BEGIN "
+        f"{_queue('OLD')} {_queue('NEW')} END"
+    ),
+}
+
+
+def create_triggers(conn):
+    """Pending-month triggers (idempotent); the table comes from models.PDIRollupPending."""
+    models.PDIRollupPending.__table__.create(conn, checkfirst=True)
+    for name, body in TRIGGERS.items():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+
+
+def refresh_months(conn, months):
+    """Recompute the rollup rows of the given (year, month) buckets."""
+    kayit = models.PDIKayit.__table__
+    rollup = models.PDIMonthlyRollup.__table__
+    pending = models.PDIRollupPending.__table__
+    for y, m in sorted(months):
+        conn.execute(pending.delete().where(pending.c.year == y, pending.c.month == m))
+        rows = conn.execute(
+            kayit.select()
+            .with_only_columns(kayit.c.sasi_no, kayit.c.arac_tipi, kayit.c.top_hata, kayit.c.hata_nerede)
+            .where(dates.in_month(kayit.c.pdi_date, y, m))
+        ).all()
+        conn.execute(rollup.delete().where(rollup.c.year == y, rollup.c.month == m))
+        values = _aggregate(y, m, rows)
+        if values:
+            conn.execute(rollup.insert(), values)
+
+
+def rebuild(conn):
+    """Recompute the whole rollup from pdi_kayitlari."""
+    kayit = models.PDIKayit.__table__
+    rollup = models.PDIMonthlyRollup.__table__
+    by_month = {}
+    for sasi_no, arac_tipi, top_hata, hata_nerede, pdi_date in conn.execute(
+        kayit.select().with_only_columns(
+            kayit.c.sasi_no, kayit.c.arac_tipi, kayit.c.top_hata, kayit.c.hata_nerede, kayit.c.pdi_date
+        )
+    ):
+        ym = dates.year_month(pdi_date)
+        if ym:
+            by_month.setdefault(ym, []).append((sasi_no, arac_tipi, top_hata, hata_nerede))
+    conn.execute(rollup.delete())
+    conn.execute(models.PDIRollupPending.__table__.delete())
+    values = list(chain.from_iterable(_aggregate(y, m, rows) for (y, m), rows in by_month.items()))
+    if values:
+        conn.execute(rollup.insert(), values)
+
+
+def ensure_populated(bind):
+    """First start after upgrade: fill the rollup if it is empty but records exist."""
+    with bind.begin() as conn:
+        has_rollup = conn.execute(models.PDIMonthlyRollup.__table__.select().limit(1)).first()
+        has_records = conn.execute(models.PDIKayit.__table__.select().limit(1)).first()
+        if has_records and not has_rollup:
+            rebuild(conn)
+
+
+def sync_pending(bind):
+    """
+    Recompute the months queued by the triggers (writes from outside this
+    process) and return them; a single read of an empty table otherwise.
+    """
+    pending = models.PDIRollupPending.__table__
+    with bind.connect() as conn:
+        if conn.execute(pending.select().limit(1)).first() is None:
+            return set()
+    with bind.begin() as conn:
+        # IMMEDIATE: no writer can queue a month between reading and clearing the queue
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        months = {(y, m) for y, m in conn.execute(pending.select())}
+        refresh_months(conn, months)
+    return months
+
+
+def touched_months(obj, check_changes: bool):
+    state = inspect(obj)
+    if check_changes and not any(state.attrs[c].history.has_changes() for c in ROLLUP_COLUMNS):
+        return set()
+    hist = state.attrs.pdi_date.history
+    values = chain(hist.added or (), hist.unchanged or (), hist.deleted or ())
+    return {ym for ym in (dates.year_month(v) for v in values) if ym}
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _sync_rollup(session, flush_context):
+    months = set()
+    for objs, check_changes in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+        for obj in objs:
+            if isinstance(obj, models.PDIKayit):
+                months |= touched_months(obj, check_changes)
+    if months:
+        refresh_months(session.connection(), months)
+
+
+def query_rollup(db, start, end, arac_tipleri=None, top_hata=ALL, hata_nerede=ALL):
+    """
+    Rollup rows for the (year, month) range start..end (inclusive).
+    top_hata / hata_nerede accept a single value or a list; ALL selects the totals.
+    """
+    sync_pending(db.get_bind())
+    R = models.PDIMonthlyRollup
+    q = db.query(
+        R.year, R.month, R.arac_tipi, R.top_hata, R.hata_nerede, R.vehicle_count, R.error_count
+    ).filter(
+        tuple_(R.year, R.month) >= tuple_(*start),
+        tuple_(R.year, R.month) <= tuple_(*end),
+    )
+    if arac_tipleri is not None:
+        q = q.filter(R.arac_tipi.in_(arac_tipleri))
+    for col, value in ((R.top_hata, top_hata), (R.hata_nerede, hata_nerede)):
+        if isinstance(value, (list, tuple, set)):
+            q = q.filter(col.in_(list(value)))
+        elif value is not None:
+            q = q.filter(col == value)
+    return q.all()
+
+
+def monthly_totals(db, start, end, arac_tipleri=None):
+    """
+    {(year, month): (vehicles, errors)} over the given vehicle types. Errors add
+    up across types, distinct vehicles do not (a chassis recorded under two
+    types of the group in one month is one vehicle), so for more than one type
+    the vehicles come from the vehicle table.
+    """
+    rows = query_rollup(db, start, end, arac_tipleri)
+    errors = {}
+    for r in rows:
+        errors[(r.year, r.month)] = errors.get((r.year, r.month), 0) + r.error_count
+    if arac_tipleri is not None and len(set(arac_tipleri)) == 1:
+        counts = {(r.year, r.month): r.vehicle_count for r in rows}
+    else:
+        counts = vehicles.monthly_counts(db, start, end, arac_tipleri)
+    return {ym: (counts.get(ym, 0), errors.get(ym, 0)) for ym in errors.keys() | counts.keys()}
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as _conn:
+        rebuild(_conn)
+    print("pdi_monthly_rollup yeniden oluşturuldu.")
@@ -1,31 +1,43 @@
 from datetime import datetime
+import csv
 import io
 import os
-import shutil
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
+import tempfile
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import case, func, select
 from typing import List, Optional
-from database import get_db, DB_DIR
+from database import get_db, SessionLocal
+import dates
+import jobs
+import manual_data
 import models
+import photos
+import report_cache
+import rollup
 import schemas
+import search
+import vehicles
 
 router = APIRouter()
 
-PHOTO_DIR = os.path.join(DB_DIR, "..", "backend", "static", "photos")
-os.makedirs(PHOTO_DIR, exist_ok=True)
+def _with_photo_urls(db: Session, rows, schema):
+    """Rows as `schema` dicts plus photo/thumb/preview URLs (one photo_files lookup)."""
+    urls = photos.urls_for(db, [r.fotograf_yolu for r in rows])
+    return [
+        {**schema.model_validate(r).model_dump(), **urls.get(r.fotograf_yolu, photos.NO_PHOTO)}
+        for r in rows
+    ]
 
 @router.get("/stats")
 def get_dashboard_stats(db: Session = Depends(get_db)):
-    total_vehicles = db.query(func.count(func.distinct(models.PDIKayit.sasi_no))).scalar() or 0
+    total_vehicles = vehicles.total(db)
     total_errors = db.query(func.count(models.PDIKayit.id)).scalar() or 0
     
-    # Simple breakdown by type
-    type_counts = db.query(models.PDIKayit.arac_tipi, func.count(func.distinct(models.PDIKayit.sasi_no)))\
-        .group_by(models.PDIKayit.arac_tipi).all()
-    
-    breakdown = {t: c for t, c in type_counts if t}
+    # Simple breakdown by type (vehicle table, '' = no type)
+    breakdown = {t: c for t, c in vehicles.by_type(db).items() if t}
     
     return {
         "total_vehicles": total_vehicles,
@@ -33,45 +45,97 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
         "breakdown": breakdown
     }
 
-@router.get("/kayitlar", response_model=List[schemas.PDIKayitDetail])
-def get_records(
-    limit: int = 500,
-    offset: int = 0,
-    arac_tipi: Optional[str] = None,
-    sasi_no: Optional[str] = None,
-    alt_grup: Optional[str] = None,
-    ay: Optional[int] = None,
-    yil: Optional[int] = None,
-    hata_nerede: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    query = db.query(models.PDIKayit)
+def _filter_records(query, arac_tipi=None, sasi_no=None, alt_grup=None, ay=None, yil=None, hata_nerede=None):
+    """Record list filters; works on both Query and select() statements."""
     if arac_tipi:
         query = query.filter(models.PDIKayit.arac_tipi == arac_tipi)
     if sasi_no:
-        query = query.filter(models.PDIKayit.sasi_no.contains(sasi_no))
+        ids = search.vehicle_ids(sasi_no, columns=("sasi_no",))
+        query = query.filter(models.PDIKayit.sasi_no.contains(sasi_no) if ids is None else models.PDIKayit.id.in_(ids))
     if alt_grup:
         query = query.filter(models.PDIKayit.alt_grup == alt_grup)
     if hata_nerede:
         query = query.filter(models.PDIKayit.hata_nerede == hata_nerede)
     if ay and yil:
-        m_str = f"{ay:02d}"
-        y_str = str(yil)
-        query = query.filter(or_(
-            (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-            (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-        ))
+        query = query.filter(dates.in_month(models.PDIKayit.pdi_date, yil, ay))
     elif yil:
-        y_str = str(yil)
-        query = query.filter(or_(
-            func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str,
-            func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str
-        ))
+        query = query.filter(dates.in_year(models.PDIKayit.pdi_date, yil))
+    return query
+
+# Columns of the record list table (fields=list): no free-text or customer columns
+LIST_COLUMNS = (
+    models.PDIKayit.id, models.PDIKayit.bb_no, models.PDIKayit.sasi_no, models.PDIKayit.arac_tipi,
+    models.PDIKayit.tarih_saat, models.PDIKayit.alt_grup, models.PDIKayit.hata_konumu,
+    models.PDIKayit.top_hata, models.PDIKayit.hata_nerede, models.PDIKayit.kullanici,
+)
+
+def _search_records(db: Session, query, q: str):
+    """
+    Restrict to records whose findings match q (search.py), best matches first.
+    Without the FTS5 index (SQLite built without it) falls back to LIKE.
+    """
+    expression = search.match_expression(q)
+    if expression is None:
+        return query
+    if search.TABLE in search.ENABLED:
+        search.sync_pending(db.get_bind())
+        # Materialized so that the MATCH runs once even when SQLite prefers
+        # to drive the join from an index on the other filters
+        hits = select(search.fts.c.rowid.label("id"), search.fts.c.rank.label("rank"))\
+            .where(search.match(expression)).cte("search_hits").prefix_with("MATERIALIZED")
+        return query.join(hits, hits.c.id == models.PDIKayit.id).order_by(hits.c.rank)
+    pattern = f"%{q.strip()}%"
+    return query.filter(
+        models.PDIKayit.tespitler.like(pattern) | models.PDIKayit.hata_konumu.like(pattern)
+        | models.PDIKayit.hata_tanimi.like(pattern)
+    )
 
-    return query.order_by(models.PDIKayit.id.desc()).offset(offset).limit(limit).all()
+def _rollup_countable(filters: dict) -> bool:
+    """True when the rollup buckets select exactly the rows _filter_records() does."""
+    if filters.get("sasi_no") or filters.get("alt_grup"):
+        return False
+    if filters.get("hata_nerede") == rollup.ALL:      # the totals marker, not a value
+        return False
+    ay = filters.get("ay")
+    return not (ay and filters.get("yil") and not 1 <= ay <= 12)
+
+
+def _count_records(db: Session, filters: dict) -> int:
+    """
+    Matching record count. Type / period / hata_nerede filters are answered from
+    the monthly rollup (plus the few records without a parseable date when no
+    period is given); any other filter gets a COUNT over the _filter_records()
+    query itself.
+    """
+    if not _rollup_countable(filters):
+        return _filter_records(db.query(func.count(models.PDIKayit.id)), **filters).scalar() or 0
+    rollup.sync_pending(db.get_bind())
+    R = models.PDIMonthlyRollup
+    q = db.query(func.coalesce(func.sum(R.error_count), 0)).filter(
+        R.top_hata == rollup.ALL, R.hata_nerede == (filters.get("hata_nerede") or rollup.ALL)
+    )
+    if filters.get("arac_tipi"):
+        q = q.filter(R.arac_tipi == filters["arac_tipi"])
+    ay, yil = filters.get("ay"), filters.get("yil")
+    if yil:
+        q = q.filter(R.year == yil)
+        if ay:
+            q = q.filter(R.month == ay)
+        return q.scalar()
+    undated = _filter_records(
+        db.query(func.count(models.PDIKayit.id)).filter(models.PDIKayit.pdi_date.is_(None)), **filters
+    ).scalar()
+    return q.scalar() + undated
 
-@router.get("/kayitlar/export")
-def export_records_excel(
+@router.get("/kayitlar", response_model=List[schemas.PDIKayitDetail])
+def get_records(
+    response: Response,
+    limit: int = 500,
+    offset: int = 0,
+    before_id: Optional[int] = None,
+    fields: str = Query("full", pattern="^(full|list)$"),
+    with_total: bool = False,
+    q: Optional[str] = None,
     arac_tipi: Optional[str] = None,
     sasi_no: Optional[str] = None,
     alt_grup: Optional[str] = None,
@@ -80,76 +144,230 @@ def export_records_excel(
     hata_nerede: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
+    """
+    Newest records first. Page with before_id (the X-Next-Cursor header of the
+    previous page) instead of offset: `id < before_id` walks the primary key, so
+    every page costs the same. fields=list returns only the list table columns,
+    with_total=1 adds X-Total-Count. q searches tespitler / hata_konumu /
+    hata_tanimi / ariza_tanimi and orders by relevance (paged with offset).
+    """
+    filters = dict(arac_tipi=arac_tipi, sasi_no=sasi_no, alt_grup=alt_grup, ay=ay, yil=yil, hata_nerede=hata_nerede)
+    headers = {}
+    if with_total:
+        if q:
+            count = _search_records(db, db.query(func.count(models.PDIKayit.id)), q).order_by(None)
+            headers["X-Total-Count"] = str(_filter_records(count, **filters).scalar() or 0)
+        else:
+            headers["X-Total-Count"] = str(_count_records(db, filters))
+
+    if fields == "list":
+        query = _filter_records(db.query(*LIST_COLUMNS), **filters)
+    else:
+        query = _filter_records(db.query(models.PDIKayit), **filters)
+    if q:
+        query = _search_records(db, query, q)
+        before_id = None
+    if before_id is not None:
+        query = query.filter(models.PDIKayit.id < before_id)
+    elif offset:
+        query = query.offset(offset)
+    rows = query.order_by(models.PDIKayit.id.desc()).limit(limit).all()
+    if len(rows) == limit and rows and not q:
+        headers["X-Next-Cursor"] = str(rows[-1].id)
+
+    if fields == "list":
+        return JSONResponse([dict(r._mapping) for r in rows], headers=headers)
+    response.headers.update(headers)
+    return _with_photo_urls(db, rows, schemas.PDIKayitDetail)
+
+@router.get("/kayit/{record_id}", response_model=schemas.PDIKayitDetail)
+def get_record(record_id: int, db: Session = Depends(get_db)):
+    db_obj = db.query(models.PDIKayit).filter(models.PDIKayit.id == record_id).first()
+    if not db_obj:
+        raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
+    return _with_photo_urls(db, [db_obj], schemas.PDIKayitDetail)[0]
+
+@router.get("/vehicles/suggest", response_model=List[schemas.VehicleSuggestion])
+def suggest_vehicles(q: str = "", limit: int = Query(10, ge=1, le=50), db: Session = Depends(get_db)):
+    """
+    Chassis / BB number autocomplete: vehicles whose sasi_no or bb_no contains q
+    (trigram index, search.py), numbers starting with q first, then the most
+    recently inspected.
+    """
+    q = q.strip()
+    if not q:
+        return []
+    K = models.PDIKayit
+    query = db.query(
+        K.sasi_no, K.bb_no, K.arac_tipi,
+        func.count(K.id).label("kayit_sayisi"), func.max(K.pdi_date).label("son_tarih"),
+    ).filter(K.sasi_no.isnot(None), K.sasi_no != "")
+    # One bound pattern (not q || '%'), so that SQLite turns the LIKE into a
+    # range on the NOCASE indexes when the trigram index cannot be used
+    pattern = q.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+    starts = K.sasi_no.like(pattern, escape="/") | K.bb_no.like(pattern, escape="/")
+    ids = search.vehicle_ids(q)
+    query = query.filter(starts if ids is None else K.id.in_(ids))
+    prefix = case((starts, 0), else_=1)
+    rows = query.group_by(K.sasi_no, K.bb_no, K.arac_tipi)\
+        .order_by(func.min(prefix), func.max(K.pdi_date).desc(), K.sasi_no).limit(limit).all()
+    return [dict(r._mapping) for r in rows]
+
+# Export columns: (header, column). Rows are read as plain tuples, never as ORM objects.
+EXPORT_COLUMNS = [
+    ("ID", models.PDIKayit.id),
+    ("BB No", models.PDIKayit.bb_no),
+    ("Şasi No", models.PDIKayit.sasi_no),
+    ("Araç", models.PDIKayit.arac_tipi),
+    ("Tarih", models.PDIKayit.tarih_saat),
+    ("Alt Grup", models.PDIKayit.alt_grup),
+    ("Hata", models.PDIKayit.hata_konumu),
+    ("Top Hata", models.PDIKayit.top_hata),
+    ("Hata Nerede Giderildi", models.PDIKayit.hata_nerede),
+    ("Ekleyen", models.PDIKayit.kullanici),
+]
+EXPORT_BATCH = 2000
+EXPORT_CHUNK = 64 * 1024
+
+def _export_rows(db: Session, filters: dict, on_rows=None):
+    """Matching records as row batches, fetched incrementally from the cursor."""
+    stmt = _filter_records(select(*[c for _, c in EXPORT_COLUMNS]), **filters).order_by(models.PDIKayit.id.desc())
+    for batch in db.execute(stmt.execution_options(yield_per=EXPORT_BATCH)).partitions():
+        yield [tuple("" if v is None else v for v in row) for row in batch]
+        if on_rows:
+            on_rows(len(batch))
+
+def _csv_chunks(db: Session, filters: dict, on_rows=None):
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";")     # Türkçe Excel ayraç olarak ';' bekler
+    writer.writerow([h for h, _ in EXPORT_COLUMNS])
+    yield ("\ufeff" + buf.getvalue()).encode("utf-8")
+    for batch in _export_rows(db, filters, on_rows):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(batch)
+        yield buf.getvalue().encode("utf-8")
+
+def _iter_export_csv(filters: dict):
+    # Own session: the response body is produced after the request dependencies have exited.
+    db = SessionLocal()
+    try:
+        yield from _csv_chunks(db, filters)
+    finally:
+        db.close()
+
+def _write_export_xlsx(db: Session, filters: dict, output, on_rows=None):
     try:
         import openpyxl
+        from openpyxl.cell import WriteOnlyCell
         from openpyxl.styles import Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
     except ImportError:
         raise HTTPException(status_code=500, detail="openpyxl not installed")
 
-    query = db.query(models.PDIKayit)
-    if arac_tipi:
-        query = query.filter(models.PDIKayit.arac_tipi == arac_tipi)
-    if sasi_no:
-        query = query.filter(models.PDIKayit.sasi_no.contains(sasi_no))
-    if alt_grup:
-        query = query.filter(models.PDIKayit.alt_grup == alt_grup)
-    if hata_nerede:
-        query = query.filter(models.PDIKayit.hata_nerede == hata_nerede)
-    if ay and yil:
-        m_str = f"{ay:02d}"
-        y_str = str(yil)
-        query = query.filter(or_(
-            (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-            (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-        ))
-    elif yil:
-        y_str = str(yil)
-        query = query.filter(or_(
-            func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str,
-            func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str
-        ))
-    records = query.order_by(models.PDIKayit.id.desc()).all()
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "PDI Kayıtları"
-
-    headers = ["ID", "BB No", "Şasi No", "Araç", "Tarih", "Alt Grup", "Hata", "Top Hata", "Hata Nerede Giderildi", "Ekleyen"]
+    headers = [h for h, _ in EXPORT_COLUMNS]
+
+    # Write-only sheets emit <cols> before the first row, so the widths come from
+    # one aggregate query instead of a second pass over the cells.
+    max_lens = _filter_records(
+        db.query(*[func.max(func.length(func.coalesce(c, ""))) for _, c in EXPORT_COLUMNS]), **filters
+    ).one()
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("PDI Kayıtları")
+    for col, (header, max_len) in enumerate(zip(headers, max_lens), 1):
+        ws.column_dimensions[get_column_letter(col)].width = min(max(len(header), max_len or 0) + 4, 40)
+
     header_fill = PatternFill(start_color="1E293B", end_color="1E293B", fill_type="solid")
     header_font = Font(color="FFFFFF", bold=True)
-
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
         cell.fill = header_fill
         cell.font = header_font
         cell.alignment = Alignment(horizontal="center")
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for batch in _export_rows(db, filters, on_rows):
+        for row in batch:
+            ws.append(row)
 
-    for row, r in enumerate(records, 2):
-        ws.cell(row=row, column=1, value=r.id)
-        ws.cell(row=row, column=2, value=r.bb_no or "")
-        ws.cell(row=row, column=3, value=r.sasi_no or "")
-        ws.cell(row=row, column=4, value=r.arac_tipi or "")
-        ws.cell(row=row, column=5, value=r.tarih_saat or "")
-        ws.cell(row=row, column=6, value=r.alt_grup or "")
-        ws.cell(row=row, column=7, value=r.hata_konumu or "")
-        ws.cell(row=row, column=8, value=r.top_hata or "")
-        ws.cell(row=row, column=9, value=r.hata_nerede or "")
-        ws.cell(row=row, column=10, value=r.kullanici or "")
-
-    for col in ws.columns:
-        max_len = max((len(str(cell.value or "")) for cell in col), default=10)
-        ws.column_dimensions[col[0].column_letter].width = min(max_len + 4, 40)
-
-    output = io.BytesIO()
     wb.save(output)
+
+def _iter_file(f):
+    try:
+        while True:
+            chunk = f.read(EXPORT_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+@router.get("/kayitlar/export")
+def export_records_excel(
+    arac_tipi: Optional[str] = None,
+    sasi_no: Optional[str] = None,
+    alt_grup: Optional[str] = None,
+    ay: Optional[int] = None,
+    yil: Optional[int] = None,
+    hata_nerede: Optional[str] = None,
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
+    db: Session = Depends(get_db)
+):
+    filters = dict(arac_tipi=arac_tipi, sasi_no=sasi_no, alt_grup=alt_grup, ay=ay, yil=yil, hata_nerede=hata_nerede)
+
+    if fmt == "csv":
+        return StreamingResponse(
+            _iter_export_csv(filters),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": "attachment; filename=pdi_kayitlari.csv"}
+        )
+
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    _write_export_xlsx(db, filters, output)
     output.seek(0)
 
     return StreamingResponse(
-        output,
+        _iter_file(output),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": "attachment; filename=pdi_kayitlari.xlsx"}
     )
 
+@router.post("/kayitlar/export/job")
+def export_records_job(
+    arac_tipi: Optional[str] = None,
+    sasi_no: Optional[str] = None,
+    alt_grup: Optional[str] = None,
+    ay: Optional[int] = None,
+    yil: Optional[int] = None,
+    hata_nerede: Optional[str] = None,
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
+):
+    """Same export as /kayitlar/export, produced by a background job (see /api/jobs/{id})."""
+    filters = dict(arac_tipi=arac_tipi, sasi_no=sasi_no, alt_grup=alt_grup, ay=ay, yil=yil, hata_nerede=hata_nerede)
+
+    def work(ctx, db):
+        total = _filter_records(db.query(func.count(models.PDIKayit.id)), **filters).scalar() or 0
+        done = 0
+
+        def on_rows(n):
+            nonlocal done
+            done += n
+            ctx.progress(done * 95 // total if total else 95, f"{done}/{total} kayıt yazıldı")
+
+        path = ctx.result_file(f".{fmt}", f"pdi_kayitlari.{fmt}")
+        with open(path, "wb") as f:
+            if fmt == "csv":
+                for chunk in _csv_chunks(db, filters, on_rows):
+                    f.write(chunk)
+            else:
+                _write_export_xlsx(db, filters, f, on_rows)
+        return {"rows": done, "format": fmt}
+
+    return {"job_id": jobs.submit("export", work, {**filters, "format": fmt})}
+
 @router.put("/kayit/{record_id}", response_model=schemas.PDIKayitDetail)
 def update_record(record_id: int, obj_in: schemas.PDIKayitUpdate, db: Session = Depends(get_db)):
     db_obj = db.query(models.PDIKayit).filter(models.PDIKayit.id == record_id).first()
@@ -165,6 +383,59 @@ def update_record(record_id: int, obj_in: schemas.PDIKayitUpdate, db: Session =
     db.refresh(db_obj)
     return db_obj
 
+DELETE_BATCH = 500
+
+@router.delete("/kayitlar")
+def delete_records(
+    arac_tipi: Optional[str] = None,
+    sasi_no: Optional[str] = None,
+    alt_grup: Optional[str] = None,
+    ay: Optional[int] = None,
+    yil: Optional[int] = None,
+    hata_nerede: Optional[str] = None,
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Delete every record matching the /kayitlar filters, with their pdi_detaylari,
+    in one transaction. dry_run=1 only reports how many rows would go.
+    """
+    filters = dict(arac_tipi=arac_tipi, sasi_no=sasi_no, alt_grup=alt_grup, ay=ay, yil=yil, hata_nerede=hata_nerede)
+    if not any(filters.values()):
+        raise HTTPException(status_code=400, detail="Toplu silme için en az bir filtre seçiniz.")
+
+    matched = db.execute(
+        _filter_records(select(models.PDIKayit.id, models.PDIKayit.pdi_date), **filters)
+    ).all()
+    ids = [r.id for r in matched]
+    kayit = models.PDIKayit.__table__
+    detay = models.PDIDetay.__table__
+    refs = models.PhotoRef.__table__
+
+    if dry_run:
+        detay_count = 0
+        for i in range(0, len(ids), DELETE_BATCH):
+            chunk = ids[i:i + DELETE_BATCH]
+            detay_count += db.execute(select(func.count()).where(detay.c.pdi_id.in_(chunk))).scalar()
+        return {"dry_run": True, "deleted": len(ids), "detaylar": detay_count}
+
+    detay_count = 0
+    for i in range(0, len(ids), DELETE_BATCH):
+        chunk = ids[i:i + DELETE_BATCH]
+        detay_ids = select(detay.c.id).where(detay.c.pdi_id.in_(chunk))
+        db.execute(refs.delete().where(refs.c.owner_table == "pdi_detaylari", refs.c.owner_id.in_(detay_ids)))
+        detay_count += db.execute(detay.delete().where(detay.c.pdi_id.in_(chunk))).rowcount
+        db.execute(refs.delete().where(refs.c.owner_table == "pdi_kayitlari", refs.c.owner_id.in_(chunk)))
+        db.execute(kayit.delete().where(kayit.c.id.in_(chunk)))
+
+    # Core deletes bypass the ORM hooks: refresh rollup / report cache explicitly
+    months = {ym for ym in (dates.year_month(r.pdi_date) for r in matched) if ym}
+    if months:
+        rollup.refresh_months(db.connection(), months)
+        report_cache.invalidate_months(db, months)
+    db.commit()
+    return {"dry_run": False, "deleted": len(ids), "detaylar": detay_count, "message": f"{len(ids)} kayıt silindi."}
+
 @router.delete("/kayit/{record_id}")
 def delete_record(record_id: int, db: Session = Depends(get_db)):
     db_obj = db.query(models.PDIKayit).filter(models.PDIKayit.id == record_id).first()
@@ -180,14 +451,9 @@ def update_record_photo(record_id: int, photo: UploadFile = File(...), db: Sessi
     if not db_obj:
         raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
     
-    ext = os.path.splitext(photo.filename)[1] or ".jpg"
-    filename = f"edit_{record_id}_{datetime.now().strftime('%Y%H%M%S')}{ext}"
-    filepath = os.path.join(PHOTO_DIR, filename)
-    
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(photo.file, buffer)
-    
+    filepath = photos.save_upload(db, photo)
     db_obj.fotograf_yolu = filepath
+    photos.link(db, "pdi_kayitlari", record_id, filepath)
     db.commit()
     db.refresh(db_obj)
     
@@ -199,56 +465,21 @@ def get_top_hatalar(db: Session = Depends(get_db)):
 
 @router.post("/manual-data")
 def update_manual_data(data: schemas.ManualDataUpdate, db: Session = Depends(get_db)):
-    db_obj = db.query(models.ReportManualData).filter(
-        models.ReportManualData.report_type == data.report_type,
-        models.ReportManualData.context_key == data.context_key,
-        models.ReportManualData.data_key == data.data_key
-    ).first()
-    
-    if db_obj:
-        db_obj.data_value = data.data_value
-    else:
-        db_obj = models.ReportManualData(**data.model_dump())
-        db.add(db_obj)
-    
+    # error_rate is recalculated when vehicle_count or error_count is updated
+    manual_data.save(db, [data.model_dump()])
     db.commit()
-
-    # Auto-calculate rate if vehicle_count or error_count is updated
-    if data.data_key in ["vehicle_count", "error_count"]:
-        v_obj = db.query(models.ReportManualData).filter(
-            models.ReportManualData.report_type == data.report_type,
-            models.ReportManualData.context_key == data.context_key,
-            models.ReportManualData.data_key == "vehicle_count"
-        ).first()
-        e_obj = db.query(models.ReportManualData).filter(
-            models.ReportManualData.report_type == data.report_type,
-            models.ReportManualData.context_key == data.context_key,
-            models.ReportManualData.data_key == "error_count"
-        ).first()
-
-        if v_obj and e_obj and float(v_obj.data_value or 0) > 0:
-            rate = float(e_obj.data_value) / float(v_obj.data_value)
-            
-            r_obj = db.query(models.ReportManualData).filter(
-                models.ReportManualData.report_type == data.report_type,
-                models.ReportManualData.context_key == data.context_key,
-                models.ReportManualData.data_key == "error_rate"
-            ).first()
-            
-            if r_obj:
-                r_obj.data_value = str(round(rate, 4))
-            else:
-                new_rate = models.ReportManualData(
-                    report_type=data.report_type,
-                    context_key=data.context_key,
-                    data_key="error_rate",
-                    data_value=str(round(rate, 4))
-                )
-                db.add(new_rate)
-            db.commit()
-
     return {"message": "Veri güncellendi"}
 
+@router.post("/manual-data/batch")
+def update_manual_data_batch(payload: schemas.ManualDataBatch, db: Session = Depends(get_db)):
+    """
+    Bir düzenleme penceresinin tüm alanları tek istekte ve tek transaction'da.
+    Hata oranı (error_rate) her bağlam için bir kez hesaplanır.
+    """
+    written = manual_data.save(db, [i.model_dump() for i in payload.items])
+    db.commit()
+    return {"message": "Veriler güncellendi", "updated": written}
+
 # --- Lookup Management ---
 
 LOOKUP_MODELS = {
@@ -339,7 +570,8 @@ def delete_manuel_cozulen(item_id: int, db: Session = Depends(get_db)):
 
 @router.get("/kayit/{record_id}/detaylar", response_model=List[schemas.PDIDetaySchema])
 def get_record_detaylar(record_id: int, db: Session = Depends(get_db)):
-    return db.query(models.PDIDetay).filter(models.PDIDetay.pdi_id == record_id).all()
+    rows = db.query(models.PDIDetay).filter(models.PDIDetay.pdi_id == record_id).all()
+    return _with_photo_urls(db, rows, schemas.PDIDetaySchema)
 
 @router.post("/kayit/{record_id}/detay", response_model=schemas.PDIDetaySchema)
 def add_record_detay(record_id: int, obj_in: schemas.PDIDetayCreate, db: Session = Depends(get_db)):
@@ -363,12 +595,10 @@ def upload_detay_photo(detay_id: int, photo: UploadFile = File(...), db: Session
     db_obj = db.query(models.PDIDetay).filter(models.PDIDetay.id == detay_id).first()
     if not db_obj:
         raise HTTPException(status_code=404, detail="Detay bulunamadı")
-    ext = os.path.splitext(photo.filename)[1] or ".jpg"
-    filename = f"detay_{detay_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}{ext}"
-    filepath = os.path.join(PHOTO_DIR, filename)
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(photo.file, buffer)
+    # Detaylar static/photos altına göre göreli yol saklar
+    filename = photos.relative_path(photos.save_upload(db, photo))[len("photos/"):]
     db_obj.fotograf_yolu = filename
+    photos.link(db, "pdi_detaylari", detay_id, filename)
     db.commit()
     db.refresh(db_obj)
     return {"photo_path": filename, "message": "Fotoğraf yüklendi"}
@@ -384,46 +614,79 @@ def get_manual_data(report_type: str, db: Session = Depends(get_db)):
         key = f"{item.context_key}_{item.data_key}"
         result[key] = item.data_value
     return result
-@router.post("/kayitlar/import")
-async def import_records_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    try:
-        import pandas as pd
-    except ImportError:
-        raise HTTPException(status_code=500, detail="pandas not installed")
+def _str_norm(s):
+    if not s: return ""
+    s = str(s).lower()
+    mapping = {'ç':'c','ğ':'g','ı':'i','ö':'o','ş':'s','ü':'u','â':'a','î':'i','û':'u'}
+    for k, v in mapping.items():
+        s = s.replace(k, v)
+    return "".join(c for c in s if 'a' <= c <= 'z' or '0' <= c <= '9').upper()
+
+IMPORT_COLUMNS = {
+    "bb_no": ["BB No", "BB NO", "BBNO"],
+    "sasi_no": ["Şasi No", "ŞASİ NO", "SASİ NO", "Sasi No", "SASI NO", "SASI", "CHASSIS"],
+    "arac_tipi": ["Araç Tipi", "ARAÇ TİPİ", "ARAC TIPI", "TİP", "ARAC", "TIP", "MODEL"],
+    "is_emri_no": ["İş Emri No", "İŞ EMRİ NO", "IS EMRI NO", "İŞ EMRİ", "IS EMRI", "IS EMRE", "ISEMRI"],
+    "tarih_saat": ["PDI Tarihi", "PDI TARİHİ", "PDI Yapılış Tarihi", "Tarih", "TARİH", "YAPILIŞ TARİHİ", "PDI DATE", "DATE"],
+    "tespitler": ["Tespitler", "TESPİTLER", "TESPITLER", "HATA", "TESPİT", "FINDINGS", "DESCRIPTION"],
+    "hata_konumu": ["Hata Konumu", "HATA KONUMU", "KONUM", "HATA YERİ", "LOCATION"],
+    "alt_grup": ["Alt Grup", "ALT GRUP", "GRUP", "SUBGROUP"]
+}
 
-    contents = await file.read()
-    df = pd.read_excel(io.BytesIO(contents), dtype=str)
-    df.columns = [str(c).strip() for c in df.columns]
+IMPORT_TYPE_MAP = {
+    "TOU": "Tourismo", "TRV": "Travego", "CON": "Conecto",
+    "TOURISMO": "Tourismo", "TRAVEGO": "Travego", "CONNECTO": "Conecto",
+    "TOURİSMO": "Tourismo", "CONECTO": "Conecto"
+}
 
-    def str_norm(s):
-        if not s: return ""
-        s = str(s).lower()
-        mapping = {'ç':'c','ğ':'g','ı':'i','ö':'o','ş':'s','ü':'u','â':'a','î':'i','û':'u'}
-        for k, v in mapping.items():
-            s = s.replace(k, v)
-        return "".join(c for c in s if 'a' <= c <= 'z' or '0' <= c <= '9').upper()
-
-    cols_map = {
-        "bb_no": ["BB No", "BB NO", "BBNO"],
-        "sasi_no": ["Şasi No", "ŞASİ NO", "SASİ NO", "Sasi No", "SASI NO", "SASI", "CHASSIS"],
-        "arac_tipi": ["Araç Tipi", "ARAÇ TİPİ", "ARAC TIPI", "TİP", "ARAC", "TIP", "MODEL"],
-        "is_emri_no": ["İş Emri No", "İŞ EMRİ NO", "IS EMRI NO", "İŞ EMRİ", "IS EMRI", "IS EMRE", "ISEMRI"],
-        "tarih_saat": ["PDI Tarihi", "PDI TARİHİ", "PDI Yapılış Tarihi", "Tarih", "TARİH", "YAPILIŞ TARİHİ", "PDI DATE", "DATE"],
-        "tespitler": ["Tespitler", "TESPİTLER", "TESPITLER", "HATA", "TESPİT", "FINDINGS", "DESCRIPTION"],
-        "hata_konumu": ["Hata Konumu", "HATA KONUMU", "KONUM", "HATA YERİ", "LOCATION"],
-        "alt_grup": ["Alt Grup", "ALT GRUP", "GRUP", "SUBGROUP"]
-    }
+def _existing_import_keys(db: Session, frame):
+    """
+    Positions of frame rows whose (sasi_no, tarih_saat, tespitler) already exist,
+    found with one join against a temp table of the incoming keys.
+    """
+    conn = db.connection()
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS _import_keys (pos INTEGER, sasi_no TEXT, tarih_saat TEXT, tespitler TEXT)")
+    conn.exec_driver_sql("DELETE FROM _import_keys")
+    conn.exec_driver_sql(
+        "INSERT INTO _import_keys VALUES (?, ?, ?, ?)",
+        list(zip(frame.index.tolist(), frame["sasi_no"], frame["tarih_saat"], frame["tespitler"])),
+    )
+    rows = conn.exec_driver_sql(
+        "SELECT DISTINCT k.pos FROM _import_keys k JOIN pdi_kayitlari p "
+        "ON p.sasi_no = k.sasi_no AND p.tarih_saat = k.tarih_saat AND p.tespitler = k.tespitler"
+    ).fetchall()
+    conn.exec_driver_sql("DELETE FROM _import_keys")
+    return {r[0] for r in rows}
+
+def run_records_import(contents: bytes, db: Session, progress=None) -> dict:
+    """
+    Set-based Excel import: normalize with pandas column ops, drop rows whose
+    (sasi_no, tarih_saat, tespitler) already exists, bulk insert the rest.
+    Returns counts plus per-stage timings; progress(percent, message) is
+    called after each stage when given (background jobs).
+    """
+    import pandas as pd
+
+    timings = {}
+    t0 = stage = time.perf_counter()
+
+    def lap(name, percent, message):
+        nonlocal stage
+        now = time.perf_counter()
+        timings[name] = round((now - stage) * 1000, 1)
+        stage = now
+        if progress:
+            progress(percent, message)
 
-    type_map = {
-        "TOU": "Tourismo", "TRV": "Travego", "CON": "Conecto",
-        "TOURISMO": "Tourismo", "TRAVEGO": "Travego", "CONNECTO": "Conecto",
-        "TOURİSMO": "Tourismo", "CONECTO": "Conecto"
-    }
+    df = pd.read_excel(io.BytesIO(contents), dtype=str)
+    df.columns = [str(c).strip() for c in df.columns]
+    total_rows = len(df)
+    lap("read_ms", 40, "Excel okundu")
 
     found_indices = {}
-    df_cols_norm = [str_norm(c) for c in df.columns]
-    for key, variations in cols_map.items():
-        norm_vars = [str_norm(v) for v in variations]
+    df_cols_norm = [_str_norm(c) for c in df.columns]
+    for key, variations in IMPORT_COLUMNS.items():
+        norm_vars = [_str_norm(v) for v in variations]
         for idx, norm_col_name in enumerate(df_cols_norm):
             if norm_col_name in norm_vars:
                 found_indices[key] = idx
@@ -433,68 +696,95 @@ async def import_records_excel(file: UploadFile = File(...), db: Session = Depen
     if "sasi_no" not in found_indices: critical_missing.append("Şasi No")
     if "arac_tipi" not in found_indices: critical_missing.append("Araç Tipi")
     if "tarih_saat" not in found_indices: critical_missing.append("Tarih")
-    
+
     if critical_missing:
         raise HTTPException(status_code=400, detail=f"Excel'de şu kritik sütunlar bulunamadı: {', '.join(critical_missing)}")
 
-    def get_val(row_vals, key, default=""):
+    # Column values as stripped strings, "" for empty / NaN cells
+    frame = pd.DataFrame(index=df.index)
+    for key in IMPORT_COLUMNS:
         idx = found_indices.get(key)
-        if idx is not None and idx < len(row_vals):
-            v = row_vals[idx]
-            return str(v).strip() if pd.notna(v) and str(v).lower() != 'nan' else default
-        return default
-
-    success_count = 0
-    duplicate_count = 0
-    
-    for idx, row in df.iterrows():
-        row_vals = row.values
-        sasi_no = get_val(row_vals, "sasi_no")
-        if not sasi_no: continue
-
-        raw_type = get_val(row_vals, "arac_tipi")
-        arac_tipi = type_map.get(raw_type.upper(), raw_type)
-        if arac_tipi not in ["Tourismo", "Travego", "Conecto"]:
+        if idx is None:
+            frame[key] = ""
             continue
+        col = df.iloc[:, idx]
+        text_col = col.astype(str)
+        frame[key] = text_col.str.strip().where(col.notna() & (text_col.str.lower() != "nan"), "")
+
+    frame = frame[frame["sasi_no"] != ""]
+
+    raw_type = frame["arac_tipi"]
+    frame["arac_tipi"] = raw_type.str.upper().map(IMPORT_TYPE_MAP).fillna(raw_type)
+    frame = frame[frame["arac_tipi"].isin(["Tourismo", "Travego", "Conecto"])]
+
+    # Normalize date to DD-MM-YYYY (D.M.YYYY, D/M/YYYY and YYYY-MM-DD accepted)
+    new_date = frame["tarih_saat"].str.replace("/", "-", regex=False).str.replace(".", "-", regex=False)
+    three = new_date.str.count("-") == 2
+    if three.any():
+        parts = new_date[three].str.split("-", n=2, expand=True)
+        year_first = parts[0].str.len() == 4
+        new_date[three] = (
+            parts[2].where(year_first, parts[0]).str.zfill(2) + "-" + parts[1].str.zfill(2) + "-"
+            + parts[0].where(year_first, parts[2])
+        )
+    frame["tarih_saat"] = new_date
+    lap("normalize_ms", 55, "Sütunlar normalize edildi")
+
+    duplicates = _existing_import_keys(db, frame) if len(frame) else set()
+    new_rows = frame[~frame.index.isin(list(duplicates))]
+    lap("dedupe_ms", 65, "Mükerrer kayıtlar ayıklandı")
+
+    iso_by_date = {d: dates.iso_date(d) for d in new_rows["tarih_saat"].unique()}
+    new_rows = new_rows.assign(pdi_date=new_rows["tarih_saat"].map(iso_by_date), kullanici="Excel Import")
+    records = new_rows.to_dict("records")
+    if records:
+        db.execute(models.PDIKayit.__table__.insert(), records)
+    lap("insert_ms", 90, "Kayıtlar eklendi")
+
+    # Core inserts bypass the ORM hooks: refresh rollup / report cache explicitly
+    months = {dates.year_month(d) for d in iso_by_date.values() if d}
+    if months:
+        rollup.refresh_months(db.connection(), months)
+        report_cache.invalidate_months(db, months)
+    db.commit()
+    lap("rollup_commit_ms", 100, "Rapor özetleri güncellendi")
 
-        raw_date = get_val(row_vals, "tarih_saat")
-        # Normalize date to DD-MM-YYYY
-        new_date = raw_date.replace("/", "-").replace(".", "-")
-        parts = new_date.split("-")
-        try:
-            if len(parts) == 3:
-                if len(parts[0]) == 4: # YYYY-MM-DD
-                    new_date = f"{parts[2].zfill(2)}-{parts[1].zfill(2)}-{parts[0]}"
-                else: # D-M-YYYY
-                    new_date = f"{parts[0].zfill(2)}-{parts[1].zfill(2)}-{parts[2]}"
-        except: pass
-
-        tespitler = get_val(row_vals, "tespitler")
-        
-        # Check duplicate
-        existing = db.query(models.PDIKayit).filter(
-            models.PDIKayit.sasi_no == sasi_no,
-            models.PDIKayit.tarih_saat == new_date,
-            models.PDIKayit.tespitler == tespitler
-        ).first()
-
-        if existing:
-            duplicate_count += 1
-            continue
+    elapsed = time.perf_counter() - t0
+    success_count = len(records)
+    duplicate_count = len(duplicates)
+    return {
+        "message": f"{success_count} kayıt eklendi. {duplicate_count} mükerrer kayıt atlandı.",
+        "inserted": success_count,
+        "duplicates": duplicate_count,
+        "skipped": total_rows - success_count - duplicate_count,
+        "rows": total_rows,
+        "timings_ms": timings,
+        "total_ms": round(elapsed * 1000, 1),
+        "rows_per_second": round(total_rows / elapsed, 1) if elapsed > 0 else None,
+    }
 
-        new_record = models.PDIKayit(
-            bb_no=get_val(row_vals, "bb_no"),
-            sasi_no=sasi_no,
-            arac_tipi=arac_tipi,
-            is_emri_no=get_val(row_vals, "is_emri_no"),
-            alt_grup=get_val(row_vals, "alt_grup"),
-            tespitler=tespitler,
-            hata_konumu=get_val(row_vals, "hata_konumu"),
-            tarih_saat=new_date,
-            kullanici="Excel Import"
-        )
-        db.add(new_record)
-        success_count += 1
+@router.post("/kayitlar/import")
+async def import_records_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=500, detail="pandas not installed")
 
-    db.commit()
-    return {"message": f"{success_count} kayıt eklendi. {duplicate_count} mükerrer kayıt atlandı."}
+    contents = await file.read()
+    return run_records_import(contents, db)
+
+@router.post("/kayitlar/import/job")
+async def import_records_job(file: UploadFile = File(...)):
+    """Same import as /kayitlar/import, run by a background job (see /api/jobs/{id})."""
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=500, detail="pandas not installed")
+
+    contents = await file.read()
+    job_id = jobs.submit(
+        "import",
+        lambda ctx, db: run_records_import(contents, db, progress=ctx.progress),
+        {"filename": file.filename},
+    )
+    return {"job_id": job_id}
@@ -1,18 +1,16 @@
-import os
-import shutil
 from datetime import datetime
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import Optional, List
-from database import get_db, DB_DIR
+from database import get_db
 import models
+import photos
+import schemas
 
 router = APIRouter()
 
-PHOTO_DIR = os.path.join(DB_DIR, "..", "backend", "static", "photos", "form")
-os.makedirs(PHOTO_DIR, exist_ok=True)
-
 
 def _now_str():
     return datetime.now().strftime("%d-%m-%Y %H:%M")
@@ -22,6 +20,43 @@ def _today_str():
     return datetime.now().strftime("%d-%m-%Y")
 
 
+def _response_upsert():
+    """
+    INSERT ... ON CONFLICT (session_id, item_no) DO UPDATE for checklist answers.
+    item_label / alt_grup / kaydeden keep their stored value when sent empty.
+    """
+    t = models.PDIResponse.__table__
+    stmt = sqlite_insert(t)
+    ex = stmt.excluded
+
+    def keep(col):
+        return func.coalesce(func.nullif(ex[col], ""), t.c[col])
+
+    return stmt.on_conflict_do_update(
+        index_elements=[t.c.session_id, t.c.item_no],
+        set_={
+            "durum": ex.durum,
+            "ariza_tanimi": ex.ariza_tanimi,
+            "hata_nerede_item": ex.hata_nerede_item,
+            "olcum_ilk": ex.olcum_ilk,
+            "olcum_sonra": ex.olcum_sonra,
+            "item_label": keep("item_label"),
+            "alt_grup": keep("alt_grup"),
+            "kaydeden": keep("kaydeden"),
+        },
+    )
+
+
+def _dynamic_response_upsert():
+    """INSERT ... ON CONFLICT (session_id, dynamic_item_id) DO UPDATE."""
+    t = models.PDIDynamicResponse.__table__
+    stmt = sqlite_insert(t)
+    return stmt.on_conflict_do_update(
+        index_elements=[t.c.session_id, t.c.dynamic_item_id],
+        set_={"kontrol_edildi": stmt.excluded.kontrol_edildi, "aciklama": stmt.excluded.aciklama},
+    )
+
+
 # ─── Sessions ─────────────────────────────────────────────────────────────────
 
 @router.post("/sessions")
@@ -110,6 +145,7 @@ def get_session(session_id: int, db: Session = Depends(get_db)):
     responses = db.query(models.PDIResponse).filter(models.PDIResponse.session_id == session_id).all()
     pins = db.query(models.PDIVehiclePin).filter(models.PDIVehiclePin.session_id == session_id).all()
     dynamic_responses = db.query(models.PDIDynamicResponse).filter(models.PDIDynamicResponse.session_id == session_id).all()
+    urls = photos.urls_for(db, [x.fotograf_yolu for x in (*responses, *pins, *dynamic_responses)])
     return {
         "session": {
             "id": s.id, "sasi_no": s.sasi_no, "arac_tipi": s.arac_tipi,
@@ -126,6 +162,7 @@ def get_session(session_id: int, db: Session = Depends(get_db)):
                 "olcum_ilk": r.olcum_ilk, "olcum_sonra": r.olcum_sonra,
                 "hata_nerede_item": r.hata_nerede_item,
                 "kaydeden": r.kaydeden,
+                **urls.get(r.fotograf_yolu, photos.NO_PHOTO),
             }
             for r in responses
         ],
@@ -134,6 +171,7 @@ def get_session(session_id: int, db: Session = Depends(get_db)):
                 "id": p.id, "view": p.view, "x_percent": p.x_percent,
                 "y_percent": p.y_percent, "aciklama": p.aciklama,
                 "fotograf_yolu": p.fotograf_yolu,
+                **urls.get(p.fotograf_yolu, photos.NO_PHOTO),
             }
             for p in pins
         ],
@@ -142,6 +180,7 @@ def get_session(session_id: int, db: Session = Depends(get_db)):
                 "id": dr.id, "dynamic_item_id": dr.dynamic_item_id,
                 "kontrol_edildi": dr.kontrol_edildi, "aciklama": dr.aciklama,
                 "fotograf_yolu": dr.fotograf_yolu,
+                **urls.get(dr.fotograf_yolu, photos.NO_PHOTO),
             }
             for dr in dynamic_responses
         ],
@@ -240,6 +279,7 @@ def complete_session(
             )
             db.add(kayit)
             db.flush()
+            photos.link(db, "pdi_kayitlari", kayit.id, kayit.fotograf_yolu)
             created_ids.append(kayit.id)
     else:
         # Hata yoksa yine de özet bir kayıt oluştur (araç sayısı için)
@@ -295,36 +335,23 @@ def save_response(
     kaydeden: str = Form(None),
     db: Session = Depends(get_db)
 ):
-    existing = db.query(models.PDIResponse).filter(
-        models.PDIResponse.session_id == session_id,
-        models.PDIResponse.item_no == item_no
-    ).first()
-    if existing:
-        existing.durum = durum
-        existing.ariza_tanimi = ariza_tanimi
-        existing.hata_nerede_item = hata_nerede_item
-        existing.olcum_ilk = olcum_ilk
-        existing.olcum_sonra = olcum_sonra
-        if item_label: existing.item_label = item_label
-        if alt_grup: existing.alt_grup = alt_grup
-        if kaydeden: existing.kaydeden = kaydeden
-    else:
-        existing = models.PDIResponse(
-            session_id=session_id,
-            item_no=item_no,
-            item_label=item_label,
-            alt_grup=alt_grup,
-            durum=durum,
-            ariza_tanimi=ariza_tanimi,
-            hata_nerede_item=hata_nerede_item,
-            olcum_ilk=olcum_ilk,
-            olcum_sonra=olcum_sonra,
-            kaydeden=kaydeden,
-        )
-        db.add(existing)
+    response_id = db.execute(
+        _response_upsert().returning(models.PDIResponse.__table__.c.id),
+        {
+            "session_id": session_id,
+            "item_no": item_no,
+            "item_label": item_label,
+            "alt_grup": alt_grup,
+            "durum": durum,
+            "ariza_tanimi": ariza_tanimi,
+            "hata_nerede_item": hata_nerede_item,
+            "olcum_ilk": olcum_ilk,
+            "olcum_sonra": olcum_sonra,
+            "kaydeden": kaydeden,
+        },
+    ).scalar_one()
     db.commit()
-    db.refresh(existing)
-    return {"id": existing.id}
+    return {"id": response_id}
 
 
 @router.post("/sessions/{session_id}/responses/{item_no}/photo")
@@ -334,26 +361,54 @@ def upload_response_photo(
     photo: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    safe_item = item_no.replace(".", "_")
-    ext = os.path.splitext(photo.filename)[1] or ".jpg"
-    filename = f"session_{session_id}_item_{safe_item}_{datetime.now().strftime('%H%M%S')}{ext}"
-    filepath = os.path.join(PHOTO_DIR, filename)
-    with open(filepath, "wb") as f:
-        shutil.copyfileobj(photo.file, f)
-
-    existing = db.query(models.PDIResponse).filter(
-        models.PDIResponse.session_id == session_id,
-        models.PDIResponse.item_no == item_no
-    ).first()
-    if existing:
-        existing.fotograf_yolu = filepath
-    else:
-        existing = models.PDIResponse(
-            session_id=session_id, item_no=item_no, fotograf_yolu=filepath
-        )
-        db.add(existing)
+    filepath = photos.save_upload(db, photo)
+
+    stmt = sqlite_insert(models.PDIResponse).values(
+        session_id=session_id, item_no=item_no, fotograf_yolu=filepath
+    )
+    response_id = db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.PDIResponse.session_id, models.PDIResponse.item_no],
+        set_={"fotograf_yolu": stmt.excluded.fotograf_yolu},
+    ).returning(models.PDIResponse.id)).scalar_one()
+    photos.link(db, "pdi_responses", response_id, filepath)
+    db.commit()
+    urls = photos.photo_urls(db, filepath)
+    return {"fotograf_yolu": urls["photo_url"], **urls}
+
+
+# ─── Bulk save (whole form in one request) ────────────────────────────────────
+
+@router.post("/sessions/{session_id}/bulk")
+def save_bulk(session_id: int, payload: schemas.FormBulkSave, db: Session = Depends(get_db)):
+    """
+    Checklist responses, dynamic responses and new pins of a session in one
+    transaction. Responses are upserted per (session_id, item_no) and dynamic
+    responses per (session_id, dynamic_item_id) with one executemany each.
+    """
+    result = {"responses": {}, "dynamic_responses": {}, "pin_ids": []}
+
+    if payload.responses:
+        db.execute(_response_upsert(), [{"session_id": session_id, **i.model_dump()} for i in payload.responses])
+        result["responses"] = dict(db.query(models.PDIResponse.item_no, models.PDIResponse.id).filter(
+            models.PDIResponse.session_id == session_id,
+            models.PDIResponse.item_no.in_({i.item_no for i in payload.responses})
+        ).all())
+
+    if payload.dynamic_responses:
+        db.execute(_dynamic_response_upsert(), [{"session_id": session_id, **i.model_dump()} for i in payload.dynamic_responses])
+        result["dynamic_responses"] = dict(db.query(models.PDIDynamicResponse.dynamic_item_id, models.PDIDynamicResponse.id).filter(
+            models.PDIDynamicResponse.session_id == session_id,
+            models.PDIDynamicResponse.dynamic_item_id.in_({i.dynamic_item_id for i in payload.dynamic_responses})
+        ).all())
+
+    if payload.pins:
+        pins = [models.PDIVehiclePin(session_id=session_id, **p.model_dump()) for p in payload.pins]
+        db.add_all(pins)
+        db.flush()
+        result["pin_ids"] = [p.id for p in pins]
+
     db.commit()
-    return {"fotograf_yolu": f"/static/photos/form/{filename}"}
+    return result
 
 
 # ─── Vehicle Pins ─────────────────────────────────────────────────────────────
@@ -390,14 +445,12 @@ def upload_pin_photo(
     pin = db.query(models.PDIVehiclePin).filter(models.PDIVehiclePin.id == pin_id).first()
     if not pin:
         raise HTTPException(status_code=404, detail="Pin bulunamadı.")
-    ext = os.path.splitext(photo.filename)[1] or ".jpg"
-    filename = f"pin_{pin_id}_{datetime.now().strftime('%H%M%S')}{ext}"
-    filepath = os.path.join(PHOTO_DIR, filename)
-    with open(filepath, "wb") as f:
-        shutil.copyfileobj(photo.file, f)
+    filepath = photos.save_upload(db, photo)
     pin.fotograf_yolu = filepath
+    photos.link(db, "pdi_vehicle_pins", pin_id, filepath)
     db.commit()
-    return {"fotograf_yolu": f"/static/photos/form/{filename}"}
+    urls = photos.photo_urls(db, filepath)
+    return {"fotograf_yolu": urls["photo_url"], **urls}
 
 
 @router.put("/sessions/{session_id}/pins/{pin_id}")
@@ -419,11 +472,8 @@ def update_pin(
 @router.delete("/sessions/{session_id}/pins/{pin_id}")
 def delete_pin(session_id: int, pin_id: int, db: Session = Depends(get_db)):
     pin = db.query(models.PDIVehiclePin).filter(models.PDIVehiclePin.id == pin_id).first()
-    if pin and pin.fotograf_yolu and os.path.exists(pin.fotograf_yolu):
-        try:
-            os.remove(pin.fotograf_yolu)
-        except Exception:
-            pass
+    # Dosya başka satırlarla paylaşılıyor olabilir; sahipsiz kalırsa `photos.py gc` siler
+    photos.link(db, "pdi_vehicle_pins", pin_id, None)
     db.query(models.PDIVehiclePin).filter(models.PDIVehiclePin.id == pin_id).delete()
     db.commit()
     return {"message": "Pin silindi."}
@@ -506,24 +556,17 @@ def save_dynamic_response(
     aciklama: str = Form(None),
     db: Session = Depends(get_db)
 ):
-    existing = db.query(models.PDIDynamicResponse).filter(
-        models.PDIDynamicResponse.session_id == session_id,
-        models.PDIDynamicResponse.dynamic_item_id == dynamic_item_id
-    ).first()
-    if existing:
-        existing.kontrol_edildi = kontrol_edildi
-        existing.aciklama = aciklama
-    else:
-        existing = models.PDIDynamicResponse(
-            session_id=session_id,
-            dynamic_item_id=dynamic_item_id,
-            kontrol_edildi=kontrol_edildi,
-            aciklama=aciklama,
-        )
-        db.add(existing)
+    dr_id = db.execute(
+        _dynamic_response_upsert().returning(models.PDIDynamicResponse.__table__.c.id),
+        {
+            "session_id": session_id,
+            "dynamic_item_id": dynamic_item_id,
+            "kontrol_edildi": kontrol_edildi,
+            "aciklama": aciklama,
+        },
+    ).scalar_one()
     db.commit()
-    db.refresh(existing)
-    return {"id": existing.id}
+    return {"id": dr_id}
 
 
 @router.post("/sessions/{session_id}/dynamic-responses/{dr_id}/photo")
@@ -536,11 +579,9 @@ def upload_dynamic_photo(
     dr = db.query(models.PDIDynamicResponse).filter(models.PDIDynamicResponse.id == dr_id).first()
     if not dr:
         raise HTTPException(status_code=404, detail="Bulunamadı.")
-    ext = os.path.splitext(photo.filename)[1] or ".jpg"
-    filename = f"dyn_{dr_id}_{datetime.now().strftime('%H%M%S')}{ext}"
-    filepath = os.path.join(PHOTO_DIR, filename)
-    with open(filepath, "wb") as f:
-        shutil.copyfileobj(photo.file, f)
+    filepath = photos.save_upload(db, photo)
     dr.fotograf_yolu = filepath
+    photos.link(db, "pdi_dynamic_responses", dr_id, filepath)
     db.commit()
-    return {"fotograf_yolu": f"/static/photos/form/{filename}"}
+    urls = photos.photo_urls(db, filepath)
+    return {"fotograf_yolu": urls["photo_url"], **urls}
@@ -0,0 +1,33 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from database import get_db
+import jobs
+import models
+
+router = APIRouter()
+
+
+@router.get("/")
+def list_jobs(limit: int = 50, db: Session = Depends(get_db)):
+    rows = db.query(models.BackgroundJob).order_by(models.BackgroundJob.id.desc()).limit(limit).all()
+    return [jobs.to_dict(j) for j in rows]
+
+
+@router.get("/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="İş bulunamadı.")
+    return jobs.to_dict(job)
+
+
+@router.get("/{job_id}/download")
+def download_job_result(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="İş bulunamadı.")
+    if job.status != "done" or not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=404, detail="İndirilebilir sonuç yok.")
+    return FileResponse(job.result_path, filename=job.result_name or os.path.basename(job.result_path))
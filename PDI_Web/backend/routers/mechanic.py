@@ -1,17 +1,12 @@
-import os
-import shutil
-from datetime import datetime
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy.orm import Session
-from database import get_db, DB_DIR
+from database import get_db
 import models
+import photos
 import schemas
 
 router = APIRouter()
 
-PHOTO_DIR = os.path.join(DB_DIR, "..", "backend", "static", "photos")
-os.makedirs(PHOTO_DIR, exist_ok=True)
-
 @router.post("/kayit", response_model=schemas.MechanicResponse)
 def create_pdi_kayit(
     is_emri_no: str = Form(None),
@@ -31,16 +26,7 @@ def create_pdi_kayit(
         
     photo_path = None
     if photo:
-        ext = os.path.splitext(photo.filename)[1]
-        if not ext:
-            ext = ".jpg" # varsayılan uzantı
-        filename = f"{sasi_no}_{datetime.now().strftime('%Y%H%M%S')}{ext}"
-        filepath = os.path.join(PHOTO_DIR, filename)
-        
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(photo.file, buffer)
-            
-        photo_path = filepath
+        photo_path = photos.save_upload(db, photo)
         
     db_kayit = models.PDIKayit(
         is_emri_no=is_emri_no,
@@ -55,6 +41,8 @@ def create_pdi_kayit(
         kullanici="Usta (Mobil)" # default user for mechanic
     )
     db.add(db_kayit)
+    db.flush()
+    photos.link(db, "pdi_kayitlari", db_kayit.id, photo_path)
     db.commit()
     db.refresh(db_kayit)
     
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import case, func
 from typing import List, Optional
 from database import get_db
+import dates
+import manual_data
 import models
+import rollup
+import report_cache
 import calendar
 from datetime import datetime
 from urllib.parse import quote
@@ -29,38 +33,34 @@ def top_error_context_key(year: int, month: int, hata_adi: str) -> str:
     safe_name = quote((hata_adi or "").strip(), safe="")
     return f"{year}-{month:02d}_{safe_name}"
 
-def get_monthly_stats(db: Session, arac_tipleri: List[str], month: int, year: int):
-    stats = []
-    for i in range(12):
+def month_window(month: int, year: int, count: int = 12):
+    """(year, month) pairs of the trailing window ending at month/year, oldest first."""
+    periods = []
+    for i in range(count):
         m = month - i
         y = year
         while m <= 0:
             m += 12
             y -= 1
-        
-        # SQLite substring logic compatible with both dd-mm-yyyy and yyyy-mm-dd
-        # (substr(tarih_saat,4,2) = ? AND substr(tarih_saat,7,4) = ?) OR
-        # (substr(tarih_saat,6,2) = ? AND substr(tarih_saat,1,4) = ?)
-        m_str = f"{m:02d}"
-        y_str = str(y)
-        
-        query = db.query(
-            func.count(func.distinct(models.PDIKayit.sasi_no)).label("arac"),
-            func.count(models.PDIKayit.id).label("hata")
-        ).filter(models.PDIKayit.arac_tipi.in_(arac_tipleri))
-        
-        # Date filtering
-        query = query.filter(or_(
-            (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-            (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-        ))
-        
-        res = query.first()
-        arac = int(res.arac) if res and res.arac else 0
-        hata = int(res.hata) if res and res.hata else 0
+        periods.insert(0, (y, m))
+    return periods
+
+# Vehicle-type groups of the monthly error-rate report: report_type (also the
+# report_manual_data key of its overrides) -> arac_tipi values. Other groups can
+# be requested through /reports/group/{report_type}?arac_tipi=...
+VEHICLE_GROUPS = {
+    "trv_tou": ["Tourismo", "Travego"],
+    "conecto": ["Conecto"],
+}
+
+def get_monthly_stats(totals: dict, month: int, year: int):
+    """12-month trend ending at month/year from {(year, month): (vehicles, errors)}."""
+    stats = []
+    for y, m in month_window(month, year):
+        arac, hata = totals.get((y, m), (0, 0))
         rate = float(hata / arac) if arac > 0 else 0.0
         
-        stats.insert(0, {
+        stats.append({
             "month": TURKISH_MONTHS[m][:3],
             "month_full": TURKISH_MONTHS[m],
             "year": y,
@@ -72,13 +72,54 @@ def get_monthly_stats(db: Session, arac_tipleri: List[str], month: int, year: in
     return stats
 
 @router.get("/trv-tou")
-def get_trv_tou_report(month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
-    types = ["Tourismo", "Travego"]
-    monthly_stats = get_monthly_stats(db, types, month, year)
+def get_trv_tou_report(request: Request, month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
+    return report_cache.cached_response(
+        request, ("trv-tou", month, year), report_cache.year_periods(year - 1, year),
+        lambda: build_group_report(db, "trv_tou", VEHICLE_GROUPS["trv_tou"], month, year),
+    )
+
+@router.get("/conecto")
+def get_conecto_report(request: Request, month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
+    return report_cache.cached_response(
+        request, ("conecto", month, year), report_cache.year_periods(year - 1, year),
+        lambda: build_group_report(db, "conecto", VEHICLE_GROUPS["conecto"], month, year),
+    )
 
-    # Manual overrides - apply to monthly_stats first
-    overrides = db.query(models.ReportManualData).filter(models.ReportManualData.report_type == "trv_tou").all()
-    override_dict = {f"{o.context_key}_{o.data_key}": o.data_value for o in overrides}
+@router.get("/group/{report_type}")
+def get_group_report(
+    request: Request,
+    report_type: str,
+    month: int = Query(...),
+    year: int = Query(...),
+    arac_tipi: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Aylık hata oranı raporu, herhangi bir araç grubu için. Tanımlı gruplar
+    (VEHICLE_GROUPS) için arac_tipi verilmesi gerekmez; yeni bir grup için
+    arac_tipi listesi verilir, manuel veriler report_type altında tutulur.
+    """
+    types = sorted(set(arac_tipi)) if arac_tipi else VEHICLE_GROUPS.get(report_type)
+    if not types:
+        raise HTTPException(status_code=404, detail="Tanımsız araç grubu; arac_tipi parametresi veriniz.")
+    return report_cache.cached_response(
+        request, ("group", report_type, tuple(types), month, year), report_cache.year_periods(year - 1, year),
+        lambda: build_group_report(db, report_type, types, month, year),
+    )
+
+def build_group_report(db: Session, report_type: str, types: List[str], month: int, year: int):
+    """
+    Trend, last-12 and calendar-year figures of one vehicle group. The trailing
+    12 months always fall inside the previous and the current year, so one
+    read of those 24 months (rollup.monthly_totals) serves every figure.
+    """
+    totals = rollup.monthly_totals(db, (year - 1, 1), (year, 12), types)
+    monthly_stats = get_monthly_stats(totals, month, year)
+
+    # Manual overrides of the same 24 months - apply to monthly_stats first
+    override_dict = manual_data.overrides(
+        db, report_type, [manual_data.month_key(y, m) for y in (year - 1, year) for m in range(1, 13)]
+    )
     
     for stat in monthly_stats:
         ctx_key = f"{stat['year']}-{stat['month_num']:02d}"
@@ -96,7 +137,7 @@ def get_trv_tou_report(month: int = Query(...), year: int = Query(...), db: Sess
     total_e = int(sum(s["errors"] for s in monthly_stats))
     avg_12 = float(total_e / total_v) if total_v > 0 else 0.0
 
-    # Helper function for year-wide calculation including overrides
+    # Year-wide totals including overrides, from the same monthly counts
     def get_year_stats(target_year: int):
         total_vehicles = 0
         total_errors = 0
@@ -110,18 +151,7 @@ def get_trv_tou_report(month: int = Query(...), year: int = Query(...), db: Sess
                 v = int(ov_v)
                 e = int(ov_e) if ov_e is not None else 0
             else:
-                res = db.query(
-                    func.count(func.distinct(models.PDIKayit.sasi_no)).label("arac"),
-                    func.count(models.PDIKayit.id).label("hata")
-                ).filter(
-                    models.PDIKayit.arac_tipi.in_(types),
-                    or_(
-                        (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == str(target_year)),
-                        (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == str(target_year))
-                    )
-                ).first()
-                v = int(res.arac) if res and res.arac else 0
-                e = int(res.hata) if res and res.hata else 0
+                v, e = totals.get((target_year, m), (0, 0))
             
             total_vehicles += v
             total_errors += e
@@ -176,133 +206,41 @@ def get_trv_tou_report(month: int = Query(...), year: int = Query(...), db: Sess
         }
     }
 
-@router.get("/conecto")
-def get_conecto_report(month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
-    types = ["Conecto"]
-    monthly_stats = get_monthly_stats(db, types, month, year)
+@router.get("/top-errors")
+def get_top_errors_report(request: Request, month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
+    prev = (year, month - 1) if month > 1 else (year - 1, 12)
+    return report_cache.cached_response(
+        request, ("top-errors", month, year), {prev, (year, month)},
+        lambda: build_top_errors_report(db, month, year),
+    )
 
-    # Manual overrides - apply to monthly_stats first
-    overrides = db.query(models.ReportManualData).filter(models.ReportManualData.report_type == "conecto").all()
-    override_dict = {f"{o.context_key}_{o.data_key}": o.data_value for o in overrides}
+def build_top_errors_report(db: Session, month: int, year: int):
+    top_hatalar = db.query(models.TopHata).filter(models.TopHata.aktif == 1).all()
+    results: List[dict] = []
     
-    for stat in monthly_stats:
-        ctx_key = f"{stat['year']}-{stat['month_num']:02d}"
-        ov_v = override_dict.get(f"{ctx_key}_vehicle_count")
-        ov_e = override_dict.get(f"{ctx_key}_error_count")
-        if ov_v is not None:
-            v = int(ov_v)
-            e = int(ov_e) if ov_e is not None else stat["errors"]
-            stat["vehicles"] = v
-            stat["errors"] = e
-            stat["rate"] = float(e / v) if v > 0 else 0.0
-
-    # Summary stats (computed after overrides)
-    total_v = int(sum(s["vehicles"] for s in monthly_stats))
-    total_e = int(sum(s["errors"] for s in monthly_stats))
-    avg_12 = float(total_e / total_v) if total_v > 0 else 0.0
-
-    # Helper function for year-wide calculation including overrides
-    def get_year_stats(target_year: int):
-        total_vehicles = 0
-        total_errors = 0
-        for m in range(1, 13):
-            m_str = f"{m:02d}"
-            ctx_key = f"{target_year}-{m_str}"
-            ov_v = override_dict.get(f"{ctx_key}_vehicle_count")
-            ov_e = override_dict.get(f"{ctx_key}_error_count")
-            
-            if ov_v is not None:
-                v = int(ov_v)
-                e = int(ov_e) if ov_e is not None else 0
-            else:
-                res = db.query(
-                    func.count(func.distinct(models.PDIKayit.sasi_no)).label("arac"),
-                    func.count(models.PDIKayit.id).label("hata")
-                ).filter(
-                    models.PDIKayit.arac_tipi.in_(types),
-                    or_(
-                        (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == str(target_year)),
-                        (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == str(target_year))
-                    )
-                ).first()
-                v = int(res.arac) if res and res.arac else 0
-                e = int(res.hata) if res and res.hata else 0
-            
-            total_vehicles += v
-            total_errors += e
-        
-        rate = float(total_errors / total_vehicles) if total_vehicles > 0 else 0.0
-        return total_vehicles, total_errors, rate
-
-    prev_v, prev_e, prev_rate = get_year_stats(year - 1)
-    curr_v, curr_e, curr_rate = get_year_stats(year)
-
-    # Get report note for current selected month
-    report_note = override_dict.get(f"{year}-{month:02d}_report_note", "")
-    ctx_key = f"{year}-{month:02d}"
-    prev_v = parse_int(override_dict.get(f"{ctx_key}_prev_year_cnt"), prev_v)
-    prev_e = parse_int(override_dict.get(f"{ctx_key}_prev_year_err"), prev_e)
-    total_v = parse_int(override_dict.get(f"{ctx_key}_last_12_cnt"), total_v)
-    total_e = parse_int(override_dict.get(f"{ctx_key}_last_12_err"), total_e)
-    curr_v = parse_int(override_dict.get(f"{ctx_key}_curr_year_cnt"), curr_v)
-    curr_e = parse_int(override_dict.get(f"{ctx_key}_curr_year_err"), curr_e)
+    prev_month = month - 1 if month > 1 else 12
+    prev_year = year if month > 1 else year - 1
 
-    prev_rate = float(prev_e / prev_v) if prev_v > 0 else 0.0
-    avg_12 = float(total_e / total_v) if total_v > 0 else 0.0
-    curr_rate = float(curr_e / curr_v) if curr_v > 0 else 0.0
-    prev_rate_override = override_dict.get(f"{year}-{month:02d}_prev_year_rate")
-    avg_12_override = override_dict.get(f"{year}-{month:02d}_avg_12_month")
-    curr_rate_override = override_dict.get(f"{year}-{month:02d}_current_year_rate")
-    prev_rate = float(prev_rate_override) if prev_rate_override not in [None, ""] else prev_rate
-    avg_12 = float(avg_12_override) if avg_12_override not in [None, ""] else avg_12
-    curr_rate = float(curr_rate_override) if curr_rate_override not in [None, ""] else curr_rate
+    # One grouped read for both periods: (month, arac_tipi, top_hata) buckets,
+    # where top_hata == ALL carries the distinct vehicle totals used for rates.
+    vehicle_totals = {}
+    hata_counts = {}
+    for r in rollup.query_rollup(db, (prev_year, prev_month), (year, month), ["Travego", "Tourismo"], top_hata=None):
+        key = (r.year, r.month, r.arac_tipi)
+        if r.top_hata == rollup.ALL:
+            vehicle_totals[key] = r.vehicle_count
+        else:
+            hata_counts[key + (r.top_hata,)] = r.error_count
 
-    return {
-        "monthly_trend": monthly_stats,
-        "summary": {
-            "current_month_vehicles": monthly_stats[-1]["vehicles"] if monthly_stats else 0,
-            "current_month_errors": monthly_stats[-1]["errors"] if monthly_stats else 0,
-            "current_month_rate": monthly_stats[-1]["rate"] if monthly_stats else 0.0,
-            "avg_12_month": avg_12,
-            "prev_year": year - 1,
-            "prev_year_rate": prev_rate,
-            "prev_year_cnt": prev_v,
-            "prev_year_err": prev_e,
-            "last_12_cnt": total_v,
-            "last_12_err": total_e,
-            "current_year": year,
-            "current_year_rate": curr_rate,
-            "curr_year_cnt": curr_v,
-            "curr_year_err": curr_e,
-            "report_note": report_note
-        }
-    }
+    trv_total = vehicle_totals.get((year, month, "Travego"), 0)
+    tou_total = vehicle_totals.get((year, month, "Tourismo"), 0)
 
-@router.get("/top-errors")
-def get_top_errors_report(month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
-    top_hatalar = db.query(models.TopHata).filter(models.TopHata.aktif == 1).all()
-    results: List[dict] = []
-    
-    m_str = f"{month:02d}"
-    y_str = str(year)
-    
-    # Total vehicle counts for rates
-    def get_totals(arac_tipi):
-        raw = db.query(func.count(func.distinct(models.PDIKayit.sasi_no))).filter(
-            models.PDIKayit.arac_tipi == arac_tipi,
-            or_(
-                (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-                (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-            )
-        ).scalar()
-        return int(raw) if raw else 0
-
-    trv_total = get_totals("Travego")
-    tou_total = get_totals("Tourismo")
-
-    # Apply top5 vehicle total overrides
-    top5_overrides = db.query(models.ReportManualData).filter(models.ReportManualData.report_type == "top5").all()
-    top5_override_dict = {f"{o.context_key}_{o.data_key}": o.data_value for o in top5_overrides}
+    # Apply top5 vehicle total overrides (both months, per month and per top error)
+    top5_override_dict = manual_data.overrides(db, "top5", [
+        key
+        for y, m in ((year, month), (prev_year, prev_month))
+        for key in [manual_data.month_key(y, m)] + [top_error_context_key(y, m, h.hata_adi) for h in top_hatalar]
+    ])
     ctx_key = f"{year}-{month:02d}"
     if f"{ctx_key}_trv_total" in top5_override_dict:
         trv_total = parse_int(top5_override_dict[f"{ctx_key}_trv_total"])
@@ -311,43 +249,15 @@ def get_top_errors_report(month: int = Query(...), year: int = Query(...), db: S
 
     genel_total = trv_total + tou_total
 
-    prev_month = month - 1 if month > 1 else 12
-    prev_year = year if month > 1 else year - 1
-    prev_m_str = f"{prev_month:02d}"
-    prev_y_str = str(prev_year)
-
-    def get_totals_for_period(arac_tipi: str, m_str: str, y_str: str):
-        raw = db.query(func.count(func.distinct(models.PDIKayit.sasi_no))).filter(
-            models.PDIKayit.arac_tipi == arac_tipi,
-            or_(
-                (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-                (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-            )
-        ).scalar()
-        return int(raw) if raw else 0
-
-    prev_trv_total = get_totals_for_period("Travego", prev_m_str, prev_y_str)
-    prev_tou_total = get_totals_for_period("Tourismo", prev_m_str, prev_y_str)
+    prev_trv_total = vehicle_totals.get((prev_year, prev_month, "Travego"), 0)
+    prev_tou_total = vehicle_totals.get((prev_year, prev_month, "Tourismo"), 0)
     prev_ctx_key = f"{prev_year}-{prev_month:02d}"
     prev_trv_total = parse_int(top5_override_dict.get(f"{prev_ctx_key}_trv_total"), prev_trv_total)
     prev_tou_total = parse_int(top5_override_dict.get(f"{prev_ctx_key}_tou_total"), prev_tou_total)
 
     for hata in top_hatalar:
-        def get_hata_count(arac_tipi=None):
-            q = db.query(func.count(models.PDIKayit.id)).filter(
-                models.PDIKayit.top_hata == hata.hata_adi,
-                or_(
-                    (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-                    (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-                )
-            )
-            if arac_tipi:
-                q = q.filter(models.PDIKayit.arac_tipi == arac_tipi)
-            res = q.scalar()
-            return int(res) if res else 0
-
-        trv_count = get_hata_count("Travego")
-        tou_count = get_hata_count("Tourismo")
+        trv_count = hata_counts.get((year, month, "Travego", hata.hata_adi), 0)
+        tou_count = hata_counts.get((year, month, "Tourismo", hata.hata_adi), 0)
 
         hata_ctx = top_error_context_key(year, month, hata.hata_adi)
         trv_override_key = f"{hata_ctx}_trv_error_count"
@@ -357,22 +267,8 @@ def get_top_errors_report(month: int = Query(...), year: int = Query(...), db: S
         if tou_override_key in top5_override_dict:
             tou_count = parse_int(top5_override_dict[tou_override_key])
 
-        prev_trv_count = db.query(func.count(models.PDIKayit.id)).filter(
-            models.PDIKayit.top_hata == hata.hata_adi,
-            models.PDIKayit.arac_tipi == "Travego",
-            or_(
-                (func.substr(models.PDIKayit.tarih_saat, 4, 2) == prev_m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == prev_y_str),
-                (func.substr(models.PDIKayit.tarih_saat, 6, 2) == prev_m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == prev_y_str)
-            )
-        ).scalar() or 0
-        prev_tou_count = db.query(func.count(models.PDIKayit.id)).filter(
-            models.PDIKayit.top_hata == hata.hata_adi,
-            models.PDIKayit.arac_tipi == "Tourismo",
-            or_(
-                (func.substr(models.PDIKayit.tarih_saat, 4, 2) == prev_m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == prev_y_str),
-                (func.substr(models.PDIKayit.tarih_saat, 6, 2) == prev_m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == prev_y_str)
-            )
-        ).scalar() or 0
+        prev_trv_count = hata_counts.get((prev_year, prev_month, "Travego", hata.hata_adi), 0)
+        prev_tou_count = hata_counts.get((prev_year, prev_month, "Tourismo", hata.hata_adi), 0)
 
         prev_hata_ctx = top_error_context_key(prev_year, prev_month, hata.hata_adi)
         prev_trv_count = parse_int(top5_override_dict.get(f"{prev_hata_ctx}_trv_error_count"), int(prev_trv_count))
@@ -422,62 +318,68 @@ def get_top_errors_report(month: int = Query(...), year: int = Query(...), db: S
         "totals": {"trv": trv_total, "tou": tou_total, "genel": genel_total}
     }
 
-@router.get("/error-trend")
-def get_error_trend(hata_adi: str = Query(...), month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
-    monthly_data = {"TRV": [], "TOU": []}
-    top5_overrides = db.query(models.ReportManualData).filter(
-        models.ReportManualData.report_type == "top5"
-    ).all()
-    top5_override_dict = {f"{o.context_key}_{o.data_key}": o.data_value for o in top5_overrides}
-    
-    for i in range(12):
-        m = month - i
-        y = year
-        while m <= 0:
-            m += 12
-            y -= 1
-        
-        m_str = f"{m:02d}"
-        y_str = str(y)
-        
-        def get_stats(arac_tipi):
-            total = db.query(func.count(func.distinct(models.PDIKayit.sasi_no))).filter(
-                models.PDIKayit.arac_tipi == arac_tipi,
-                or_(
-                    (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-                    (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-                )
-            ).scalar() or 0
-            
-            hata = db.query(func.count(models.PDIKayit.id)).filter(
-                models.PDIKayit.arac_tipi == arac_tipi,
-                models.PDIKayit.top_hata == hata_adi,
-                or_(
-                    (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-                    (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-                )
-            ).scalar() or 0
-
-            ctx_key = f"{y}-{m:02d}"
-            if arac_tipi == "Travego":
-                total = parse_int(top5_override_dict.get(f"{ctx_key}_trv_total"), int(total))
-                hata = parse_int(
-                    top5_override_dict.get(f"{top_error_context_key(y, m, hata_adi)}_trv_error_count"),
-                    int(hata)
-                )
-            else:
-                total = parse_int(top5_override_dict.get(f"{ctx_key}_tou_total"), int(total))
-                hata = parse_int(
-                    top5_override_dict.get(f"{top_error_context_key(y, m, hata_adi)}_tou_error_count"),
-                    int(hata)
-                )
+def build_error_trends(db: Session, hata_adlari: List[str], month: int, year: int):
+    """12-month TRV/TOU series per top error, from one grouped rollup read."""
+    periods = month_window(month, year)
+    top5_override_dict = manual_data.overrides(db, "top5", [
+        key
+        for y, m in periods
+        for key in [manual_data.month_key(y, m)] + [top_error_context_key(y, m, h) for h in hata_adlari]
+    ])
+    rows = rollup.query_rollup(
+        db, periods[0], periods[-1], ["Travego", "Tourismo"], top_hata=[rollup.ALL] + list(hata_adlari)
+    )
+    totals = {(r.year, r.month, r.arac_tipi): r.vehicle_count for r in rows if r.top_hata == rollup.ALL}
+    counts = {(r.year, r.month, r.arac_tipi, r.top_hata): r.error_count for r in rows if r.top_hata != rollup.ALL}
+
+    trends = {}
+    for hata_adi in hata_adlari:
+        monthly_data = {"TRV": [], "TOU": []}
+        for y, m in periods:
+            def get_stats(arac_tipi):
+                total = totals.get((y, m, arac_tipi), 0)
+                hata = counts.get((y, m, arac_tipi, hata_adi), 0)
+
+                ctx_key = f"{y}-{m:02d}"
+                if arac_tipi == "Travego":
+                    total = parse_int(top5_override_dict.get(f"{ctx_key}_trv_total"), int(total))
+                    hata = parse_int(
+                        top5_override_dict.get(f"{top_error_context_key(y, m, hata_adi)}_trv_error_count"),
+                        int(hata)
+                    )
+                else:
+                    total = parse_int(top5_override_dict.get(f"{ctx_key}_tou_total"), int(total))
+                    hata = parse_int(
+                        top5_override_dict.get(f"{top_error_context_key(y, m, hata_adi)}_tou_error_count"),
+                        int(hata)
+                    )
 
-            return {"ay": TURKISH_MONTHS[m][:3], "arac": int(total), "hata": int(hata), "oran": float(hata / total) if total > 0 else 0.0}
+                return {"ay": TURKISH_MONTHS[m][:3], "arac": int(total), "hata": int(hata), "oran": float(hata / total) if total > 0 else 0.0}
 
-        monthly_data["TRV"].insert(0, get_stats("Travego"))
-        monthly_data["TOU"].insert(0, get_stats("Tourismo"))
-        
-    return monthly_data
+            monthly_data["TRV"].append(get_stats("Travego"))
+            monthly_data["TOU"].append(get_stats("Tourismo"))
+        trends[hata_adi] = monthly_data
+    return trends
+
+@router.get("/error-trend")
+def get_error_trend(hata_adi: str = Query(...), month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
+    return build_error_trends(db, [hata_adi], month, year)[hata_adi]
+
+@router.get("/error-trend/batch")
+def get_error_trend_batch(
+    month: int = Query(...),
+    year: int = Query(...),
+    hata_adi: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Birden fazla top hata için 12 aylık TRV/TOU trendi, tek istekte.
+    hata_adi verilmezse tüm aktif top hatalar döner.
+    """
+    if not hata_adi:
+        hata_adi = [h.hata_adi for h in db.query(models.TopHata).filter(models.TopHata.aktif == 1).all()]
+    hata_adlari = list(dict.fromkeys(hata_adi))
+    return {"month": month, "year": year, "trends": build_error_trends(db, hata_adlari, month, year)}
 
 @router.get("/conecto-top3")
 def get_conecto_top3(month: int = Query(None), year: int = Query(None), mode: str = Query("mtd"), db: Session = Depends(get_db)):
@@ -485,26 +387,18 @@ def get_conecto_top3(month: int = Query(None), year: int = Query(None), mode: st
     Conecto top hata analizi.
     mode=mtd → sadece seçili ay (varsayılan)
     mode=ytd → yılın başından seçili aya kadar kümülatif
-    tarih_saat formatı: DD-MM-YYYY HH:MM
+    Tarih filtresi pdi_date (YYYY-MM-DD) üzerinden yapılır.
     """
-    from sqlalchemy import cast, Integer as SAInteger
-
     date_filter = []
     if month and year:
-        y_str = str(year)
-        m_str = f"{month:02d}"
         if mode == "ytd":
-            # Yıl eşleşmeli VE ay <= seçili ay
-            date_filter = [
-                func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str,
-                cast(func.substr(models.PDIKayit.tarih_saat, 4, 2), SAInteger) <= month,
-            ]
+            # Yılın başından seçili ayın sonuna kadar
+            start = dates.year_bounds(year)[0]
+            end = dates.month_bounds(year, month)[1]
+            date_filter = [models.PDIKayit.pdi_date >= start, models.PDIKayit.pdi_date < end]
         else:
             # MTD: sadece tam ay eşleşmesi
-            date_filter = [
-                func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str,
-                func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str,
-            ]
+            date_filter = [dates.in_month(models.PDIKayit.pdi_date, year, month)]
 
     base = db.query(models.PDIKayit).filter(models.PDIKayit.arac_tipi == 'Conecto')
     if date_filter:
@@ -535,106 +429,106 @@ def get_conecto_top3(month: int = Query(None), year: int = Query(None), mode: st
 
 @router.get("/imalat")
 def get_imalat_report(month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
-    m_str = f"{month:02d}"
-    y_str = str(year)
-
     records = db.query(models.PDIKayit).filter(
         models.PDIKayit.hata_nerede == "İmalat",
-        or_(
-            (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-            (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-        )
+        dates.in_month(models.PDIKayit.pdi_date, year, month)
     ).order_by(models.PDIKayit.id.asc()).all()
 
     unique_vehicles = len(set(r.sasi_no for r in records if r.sasi_no))
     error_count = len(records)
     
     # Manual overrides
-    overrides = db.query(models.ReportManualData).filter(
-        models.ReportManualData.report_type == "imalat",
-        models.ReportManualData.context_key == f"{year}-{month:02d}"
-    ).all()
-    override_dict = {o.data_key: o.data_value for o in overrides}
-    
-    if "vehicle_count" in override_dict and override_dict["vehicle_count"].strip():
-        unique_vehicles = int(override_dict["vehicle_count"])
-    if "error_count" in override_dict and override_dict["error_count"].strip():
-        error_count = int(override_dict["error_count"])
+    ctx_key = manual_data.month_key(year, month)
+    override_dict = manual_data.overrides(db, "imalat", [ctx_key])
+    ov_v = override_dict.get(f"{ctx_key}_vehicle_count")
+    ov_e = override_dict.get(f"{ctx_key}_error_count")
+
+    if ov_v is not None and ov_v.strip():
+        unique_vehicles = int(ov_v)
+    if ov_e is not None and ov_e.strip():
+        error_count = int(ov_e)
 
     record_list = [{"sasi_no": r.sasi_no, "bb_no": r.bb_no, "tarih_saat": r.tarih_saat, "tespitler": r.hata_konumu or r.tespitler or ""} for r in records]
 
     return {"summary": {"count": unique_vehicles, "error_count": error_count}, "records": record_list}
 
 @router.get("/imalat-oranlar")
-def get_imalat_oranlar(year1: int = Query(...), year2: int = Query(...), db: Session = Depends(get_db)):
-    # Manual overrides: vehicle_count = imalat'a gönderilen araç sayısı (pay)
-    imalat_overrides = db.query(models.ReportManualData).filter(
-        models.ReportManualData.report_type == "imalat"
-    ).all()
-    imalat_override_dict = {f"{o.context_key}_{o.data_key}": o.data_value for o in imalat_overrides}
+def get_imalat_oranlar(
+    request: Request,
+    year1: Optional[int] = Query(None),
+    year2: Optional[int] = Query(None),
+    years: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    İmalat'a gönderilen araçların toplam PDI araçlarına oranı (%), ay ay.
+    İki yıl year1/year2 ile, daha fazla yıl years=2024&years=2025&... ile istenir.
+    """
+    years = list(dict.fromkeys(years or [y for y in (year1, year2) if y is not None]))
+    if not years:
+        raise HTTPException(status_code=400, detail="year1/year2 veya years parametresi veriniz.")
+    return report_cache.cached_response(
+        request, ("imalat-oranlar", tuple(years)), report_cache.year_periods(*years),
+        lambda: build_imalat_oranlar(db, years),
+    )
+
+def imalat_monthly_counts(db: Session, start, end) -> dict:
+    """
+    {(year, month): (distinct vehicles, distinct vehicles with an İmalat
+    finding)} for the months start..end. One grouped read, so that both counts
+    come from the same records bucketed by the same pdi_date.
+    """
+    K = models.PDIKayit
+    lo, hi = dates.period_bounds(start, end)
+    ym = func.substr(K.pdi_date, 1, 7)
+    imalat = func.count(func.distinct(case((K.hata_nerede == "İmalat", K.sasi_no))))
+    q = db.query(ym, func.count(func.distinct(K.sasi_no)), imalat).filter(
+        K.pdi_date >= lo, K.pdi_date < hi
+    ).group_by(ym)
+    return {(int(k[0:4]), int(k[5:7])): (total, n) for k, total, n in q.all()}
+
+def build_imalat_oranlar(db: Session, years: List[int]):
+    """
+    One grouped read over all requested years gives both the total vehicles
+    (no overrides) and the İmalat vehicles (the numerator, which a manual
+    vehicle_count override replaces).
+    """
+    counts = imalat_monthly_counts(db, (min(years), 1), (max(years), 12))
+    imalat_override_dict = manual_data.overrides(
+        db, "imalat", [manual_data.month_key(yr, m) for yr in years for m in range(1, 13)]
+    )
 
     month_names = ["", "OCA", "ŞUB", "MAR", "NİS", "MAY", "HAZ", "TEM", "AĞU", "EYL", "EKİ", "KAS", "ARA"]
     result = []
     for m in range(1, 13):
-        m_str = f"{m:02d}"
         row = {"month": month_names[m]}
-        for yr in [year1, year2]:
-            y_str = str(yr)
-            ctx_key = f"{yr}-{m_str}"
-
-            # Toplam araç sayısı (tüm PDI kayıtları, override yok)
-            total = db.query(func.count(func.distinct(models.PDIKayit.sasi_no))).filter(
-                or_(
-                    (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-                    (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-                )
-            ).scalar() or 0
-
-            # İmalat araç sayısı — override varsa onu kullan
-            ov_imalat = imalat_override_dict.get(f"{ctx_key}_vehicle_count")
+        for yr in years:
+            total, imalat = counts.get((yr, m), (0, 0))
+            ov_imalat = imalat_override_dict.get(f"{manual_data.month_key(yr, m)}_vehicle_count")
             if ov_imalat is not None and str(ov_imalat).strip():
                 imalat = parse_int(ov_imalat)
-            else:
-                imalat = db.query(func.count(func.distinct(models.PDIKayit.sasi_no))).filter(
-                    models.PDIKayit.hata_nerede == "İmalat",
-                    or_(
-                        (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
-                        (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
-                    )
-                ).scalar() or 0
-
-            pct = round((imalat / total * 100), 1) if total > 0 else None
-            row[f"year{yr}"] = pct
+            row[f"year{yr}"] = round((imalat / total * 100), 1) if total > 0 else None
         result.append(row)
-    return {"data": result, "year1": year1, "year2": year2}
+    return {"data": result, "year1": years[0], "year2": years[-1], "years": years}
 
 @router.get("/imalat-top-hata")
 def get_imalat_top_hata(month: int = Query(...), year: int = Query(...), db: Session = Depends(get_db)):
-    y_str = str(year)
-    ytd_records = db.query(models.PDIKayit).filter(
-        models.PDIKayit.hata_nerede == "İmalat",
-        or_(
-            func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str,
-            func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str
-        )
-    ).all()
-
-    def extract_month(tarih):
-        if tarih and len(tarih) >= 7:
-            if len(tarih) > 4 and tarih[2] == '-':
-                try: return int(tarih[3:5])
-                except: pass
-            elif len(tarih) > 6 and tarih[4] == '-':
-                try: return int(tarih[5:7])
-                except: pass
-        return 0
-
-    filtered = [r for r in ytd_records if extract_month(r.tarih_saat) <= month]
-    unique_vehicles = len(set(r.sasi_no for r in filtered if r.sasi_no))
-    total_errors = len(filtered)
-
-    from collections import Counter
-    hata_counts = Counter(r.top_hata for r in filtered if r.top_hata)
-    results = [{"hata_adi": h, "count": c, "oran": round(c / total_errors * 100, 1) if total_errors > 0 else 0} for h, c in hata_counts.most_common()]
+    """Yılbaşından seçilen ayın sonuna kadar İmalat hataları, top hata başına sayı (yalnızca SQL sayımları)."""
+    K = models.PDIKayit
+    lo, hi = dates.period_bounds((year, 1), (year, month))
+    ytd = (K.hata_nerede == "İmalat", K.pdi_date >= lo, K.pdi_date < hi)
+
+    # Most frequent first; ties keep the order of first occurrence
+    counts = db.query(K.top_hata, func.count(K.id)).filter(*ytd)\
+        .group_by(K.top_hata).order_by(func.count(K.id).desc(), func.min(K.id)).all()
+    unique_vehicles = db.query(func.count(func.distinct(K.sasi_no))).filter(*ytd).scalar() or 0
+    total_errors = sum(c for _, c in counts)
+
+    results = [{"hata_adi": h, "count": c, "oran": round(c / total_errors * 100, 1) if total_errors > 0 else 0} for h, c in counts if h]
 
     return {"results": results, "unique_vehicles": unique_vehicles, "total_errors": total_errors}
+
+@router.get("/cache-stats")
+def get_cache_stats():
+    """Report cache hit/miss counters."""
+    return report_cache.cache.stats()
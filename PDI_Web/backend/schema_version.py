@@ -0,0 +1,99 @@
+"""
+Versioned schema steps, recorded in the schema_version table.
+
+Each component that owns steps (the web backend, 'web'; the desktop app,
+'desktop') keeps its own version row, so both can work on the same database
+file. A step runs once, in its own transaction, together with the version bump.
+When the schema is up to date, applying is a single read of schema_version.
+
+Only the standard library is used so that the desktop app can import this
+module as well: steps get whatever connection begin() yields, a SQLAlchemy
+Connection on the web side or a sqlite3 connection on the desktop, and
+execute() below runs SQL on either.
+"""
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+TABLE = "schema_version"
+
+
+def execute(conn, sql: str, params=()):
+    """Run SQL on a SQLAlchemy Connection or a sqlite3 connection."""
+    run = getattr(conn, "exec_driver_sql", None)
+    return run(sql, tuple(params)) if run else conn.execute(sql, tuple(params))
+
+
+def current(conn, component: str):
+    """Recorded version of component, None if it has never been recorded."""
+    if execute(conn, "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)).fetchone() is None:
+        return None
+    row = execute(conn, f"SELECT version FROM {TABLE} WHERE component = ?", (component,)).fetchone()
+    return row[0] if row else None
+
+
+def _record(conn, component: str, version: int):
+    execute(conn, f"CREATE TABLE IF NOT EXISTS {TABLE} (component TEXT PRIMARY KEY, version INTEGER NOT NULL, applied_at TEXT)")
+    execute(
+        conn,
+        f"INSERT INTO {TABLE} (component, version, applied_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(component) DO UPDATE SET version = excluded.version, applied_at = excluded.applied_at",
+        (component, version, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+    )
+
+
+def apply(begin, component: str, steps, legacy_version=None):
+    """
+    Run the (version, step) pairs newer than component's recorded version, in
+    order. begin() must return a context manager yielding a connection inside
+    a transaction that commits on a clean exit and rolls back on error.
+    legacy_version(conn) gives the starting version of a database that predates
+    schema_version (e.g. the old PRAGMA user_version). Returns the versions run.
+    """
+    with begin() as conn:
+        version = current(conn, component)
+        if version is None:
+            version = legacy_version(conn) if legacy_version else 0
+            if version:
+                _record(conn, component, version)
+    applied = []
+    for step_version, step in steps:
+        if step_version <= version:
+            continue
+        with begin() as conn:
+            step(conn)
+            _record(conn, component, step_version)
+        applied.append(step_version)
+    return applied
+
+
+def engine_begin(engine):
+    """
+    begin() for apply() on a SQLAlchemy engine. The sqlite3 driver only opens
+    a transaction before DML, so BEGIN is issued explicitly to make DDL in a
+    step roll back with it.
+    """
+    @contextmanager
+    def begin():
+        with engine.begin() as conn:
+            conn.exec_driver_sql("BEGIN")
+            yield conn
+    return begin
+
+
+def sqlite_begin(path: str):
+    """begin() for apply() on a database file through the sqlite3 module."""
+    @contextmanager
+    def begin():
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+    return begin
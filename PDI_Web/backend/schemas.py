@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 
 class MechanicCreate(BaseModel):
     is_emri_no: Optional[str] = None
@@ -37,7 +37,13 @@ class PDIKayitUpdate(PDIKayitBase):
     hata_tanimi: Optional[str] = None
     musteri_sikayeti: Optional[str] = None
 
-class PDIKayitDetail(PDIKayitBase):
+class PhotoUrls(BaseModel):
+    """Served URLs of fotograf_yolu (photos.urls_for); thumb/preview fall back to the original."""
+    photo_url: Optional[str] = None
+    thumb_url: Optional[str] = None
+    preview_url: Optional[str] = None
+
+class PDIKayitDetail(PDIKayitBase, PhotoUrls):
     id: int
     hata_konumu: Optional[str] = None
     grup_no: Optional[str] = None
@@ -62,6 +68,9 @@ class ManualDataUpdate(BaseModel):
     data_key: str
     data_value: str
 
+class ManualDataBatch(BaseModel):
+    items: List[ManualDataUpdate] = []
+
 class LookUpSchema(BaseModel):
     id: int
     name: str
@@ -94,12 +103,46 @@ class ManuelCozulenSchema(ManuelCozulenCreate):
     class Config:
         from_attributes = True
 
+class VehicleSuggestion(BaseModel):
+    sasi_no: str
+    bb_no: Optional[str] = None
+    arac_tipi: Optional[str] = None
+    kayit_sayisi: int
+    son_tarih: Optional[str] = None     # YYYY-MM-DD
+
 class PDIDetayCreate(BaseModel):
     aciklama: str
 
-class PDIDetaySchema(PDIDetayCreate):
+class PDIDetaySchema(PDIDetayCreate, PhotoUrls):
     id: int
     pdi_id: int
     fotograf_yolu: Optional[str] = None
     class Config:
         from_attributes = True
+
+class FormResponseItem(BaseModel):
+    item_no: str
+    item_label: Optional[str] = None
+    alt_grup: Optional[str] = None
+    durum: Optional[str] = None
+    ariza_tanimi: Optional[str] = None
+    hata_nerede_item: Optional[str] = None
+    olcum_ilk: Optional[str] = None
+    olcum_sonra: Optional[str] = None
+    kaydeden: Optional[str] = None
+
+class FormDynamicResponseItem(BaseModel):
+    dynamic_item_id: int
+    kontrol_edildi: int = 0
+    aciklama: Optional[str] = None
+
+class FormPinItem(BaseModel):
+    view: str
+    x_percent: str
+    y_percent: str
+    aciklama: Optional[str] = None
+
+class FormBulkSave(BaseModel):
+    responses: List[FormResponseItem] = []
+    dynamic_responses: List[FormDynamicResponseItem] = []
+    pins: List[FormPinItem] = []
@@ -0,0 +1,256 @@
+"""
+Full-text search over PDI findings (pdi_search, SQLite FTS5) and substring
+lookup of chassis / BB numbers (vehicle_search, FTS5 trigram).
+
+One row per pdi_kayitlari record (rowid = record id) with its tespitler,
+hata_konumu, hata_tanimi and, for records fed from a form session, the
+checklist ariza_tanimi. The unicode61 tokenizer folds case and strips
+diacritics (ç ğ ö ş ü â î û, İ), and the one Turkish letter it keeps, dotless
+ı, is mapped to i before indexing. Queries get the same treatment, so 'kirik'
+finds 'KIRIK' and 'Kırık'.
+
+Every writer shares the database, including the desktop app, whose SQLite may
+be built without FTS5 or the trigram tokenizer. A trigger that touched an
+index would make each of its writes fail with "no such module: fts5", so the
+triggers only queue the ids of changed records in the plain
+pdi_search_pending table; the web backend re-indexes them before it searches
+(sync_pending()).
+
+vehicle_search holds sasi_no and bb_no per record with the trigram tokenizer,
+so any part of a number of 3+ characters is an index lookup instead of a
+LIKE '%..%' scan; shorter input falls back to a prefix match.
+
+Minimum SQLite of the web backend: FTS5 for pdi_search (in CPython's bundled
+SQLite) and 3.34 for vehicle_search's trigram tokenizer. An index the
+backend's SQLite cannot build is not created and its searches fall back to
+LIKE. Other writers need neither.
+
+Usage: python search.py   (rebuilds the indexes)
+"""
+import re
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import column, literal_column, select, table
+from database import engine
+import models
+
+TABLE = "pdi_search"
+COLUMNS = ("tespitler", "hata_konumu", "hata_tanimi", "ariza_tanimi")
+
+VEHICLE_TABLE = "vehicle_search"
+VEHICLE_COLUMNS = ("sasi_no", "bb_no")
+TRIGRAM_MIN = 3     # trigram MATCH needs at least one full trigram
+
+# For joins from the ORM: pdi_search.rowid / pdi_search.rank
+fts = table(TABLE, column("rowid"), column("rank"))
+vehicle_fts = table(VEHICLE_TABLE, column("rowid"))
+
+# Index tables present in the database, filled by detect() at startup
+ENABLED = set()
+
+
+def _norm(expr: str) -> str:
+    return f"replace({expr}, 'ı', 'i')"
+
+
+def _ariza(rec: str) -> str:
+    return (
+        "(SELECT r.ariza_tanimi FROM pdi_responses r "
+        f"WHERE r.session_id = {rec}.pdi_session_id AND r.item_no = {rec}.grup_no)"
+    )
+
+
+def _values(rec: str) -> str:
+    return ", ".join([f"{rec}.id"] + [_norm(f"{rec}.{c}") for c in COLUMNS[:3]] + [_norm(_ariza(rec))])
+
+
+def _insert_row(rec: str) -> str:
+    return f"INSERT INTO {TABLE}(rowid, {', '.join(COLUMNS)}) VALUES ({_values(rec)});"
+
+
+PENDING = models.PDISearchPending.__tablename__
+
+# Record columns the indexes are built from
+INDEXED_COLUMNS = ("tespitler", "hata_konumu", "hata_tanimi", "pdi_session_id", "grup_no", "sasi_no", "bb_no")
+
+
+def _queue(rec: str) -> str:
+    return f"INSERT OR IGNORE INTO {PENDING}(id) VALUES ({rec}.id);"
+
+
+def _queue_response(rec: str) -> str:
+    return (
+        f"INSERT OR IGNORE INTO {PENDING}(id) "
+        f"SELECT id FROM pdi_kayitlari WHERE pdi_session_id = {rec}.session_id AND grup_no = {rec}.item_no;"
+    )
+
+
+TRIGGERS = {
+    "trg_search_pending_ai": f"AFTER INSERT ON pdi_kayitlari BEGIN {_queue('NEW')} END",
+    "trg_search_pending_au": (
+        f"AFTER UPDATE OF {', '.join(INDEXED_COLUMNS)} ON pdi_kayitlari BEGIN {_queue('NEW')} END"
+    ),
+    "trg_search_pending_ad": f"AFTER DELETE ON pdi_kayitlari BEGIN {_queue('OLD')} END",
+    "trg_search_pending_resp_ai": f"AFTER INSERT ON pdi_responses BEGIN {_queue_response('NEW')} END",
+    "trg_search_pending_resp_au": f"AFTER UPDATE OF ariza_tanimi ON pdi_responses BEGIN {_queue_response('NEW')} END",
+    "trg_search_pending_resp_ad": f"AFTER DELETE ON pdi_responses BEGIN {_queue_response('OLD')} END",
+}
+
+# Triggers of earlier versions that wrote to the index table directly
+OLD_TRIGGERS = (
+    "trg_pdi_search_ai", "trg_pdi_search_au", "trg_pdi_search_ad",
+    "trg_pdi_search_resp_ai", "trg_pdi_search_resp_au", "trg_pdi_search_resp_ad",
+    "trg_vehicle_search_ai", "trg_vehicle_search_au", "trg_vehicle_search_ad",
+)
+
+
+def available(conn, tokenize: str = None) -> bool:
+    """FTS5 (and the given tokenizer) is compiled into this SQLite (it is in the CPython builds)."""
+    options = f", tokenize = '{tokenize}'" if tokenize else ""
+    try:
+        conn.exec_driver_sql(f"CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x{options})")
+        conn.exec_driver_sql("DROP TABLE temp._fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def exists(conn, name: str = TABLE) -> bool:
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).first() is not None
+
+
+def detect(bind):
+    """Record which index tables this database has (after migrations)."""
+    with bind.connect() as conn:
+        ENABLED.clear()
+        ENABLED.update(name for name in (TABLE, VEHICLE_TABLE) if exists(conn, name))
+
+
+def create_triggers(conn):
+    """Pending-record triggers (idempotent); the table comes from models.PDISearchPending."""
+    models.PDISearchPending.__table__.create(conn, checkfirst=True)
+    for name in OLD_TRIGGERS:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    for name, body in TRIGGERS.items():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+
+
+def create(conn):
+    """Index table and triggers (idempotent)."""
+    conn.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        f"{', '.join(COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    create_triggers(conn)
+
+
+def rebuild(conn):
+    """Re-index every record."""
+    conn.exec_driver_sql(f"DELETE FROM {TABLE}")
+    conn.exec_driver_sql(
+        f"INSERT INTO {TABLE}(rowid, {', '.join(COLUMNS)}) SELECT {_values('k')} FROM pdi_kayitlari k"
+    )
+
+
+def _refresh_pending(conn):
+    """Re-index the queued records (deleted ones just leave the index) and clear the queue."""
+    queued = f"(SELECT id FROM {PENDING})"
+    if exists(conn, TABLE):
+        conn.exec_driver_sql(f"DELETE FROM {TABLE} WHERE rowid IN {queued}")
+        conn.exec_driver_sql(
+            f"INSERT INTO {TABLE}(rowid, {', '.join(COLUMNS)}) "
+            f"SELECT {_values('k')} FROM pdi_kayitlari k WHERE k.id IN {queued}"
+        )
+    if exists(conn, VEHICLE_TABLE):
+        conn.exec_driver_sql(f"DELETE FROM {VEHICLE_TABLE} WHERE rowid IN {queued}")
+        conn.exec_driver_sql(
+            f"INSERT INTO {VEHICLE_TABLE}(rowid, {', '.join(VEHICLE_COLUMNS)}) "
+            f"SELECT id, {', '.join(VEHICLE_COLUMNS)} FROM pdi_kayitlari WHERE id IN {queued}"
+        )
+    conn.exec_driver_sql(f"DELETE FROM {PENDING}")
+
+
+def sync_pending(bind):
+    """
+    Bring the indexes up to date with the records queued by the triggers;
+    a single read of an empty queue otherwise. Called before every search.
+    """
+    pending = models.PDISearchPending.__table__
+    with bind.connect() as conn:
+        if conn.execute(pending.select().limit(1)).first() is None:
+            return
+    with bind.begin() as conn:
+        # IMMEDIATE: no writer can queue a record between re-indexing and clearing the queue
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        _refresh_pending(conn)
+
+
+def create_vehicle_index(conn):
+    """Trigram table and triggers (idempotent)."""
+    conn.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {VEHICLE_TABLE} USING fts5("
+        f"{', '.join(VEHICLE_COLUMNS)}, tokenize = 'trigram case_sensitive 0')"
+    )
+    create_triggers(conn)
+
+
+def rebuild_vehicle_index(conn):
+    conn.exec_driver_sql(f"DELETE FROM {VEHICLE_TABLE}")
+    conn.exec_driver_sql(
+        f"INSERT INTO {VEHICLE_TABLE}(rowid, {', '.join(VEHICLE_COLUMNS)}) "
+        f"SELECT id, {', '.join(VEHICLE_COLUMNS)} FROM pdi_kayitlari"
+    )
+
+
+def match_expression(q: str):
+    """
+    FTS5 query for free user input: every word must occur, as a prefix
+    ('kır' matches 'kırık'). None when q has no searchable word.
+    """
+    words = re.findall(r"\w+", (q or "").replace("ı", "i"))
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def match(expression: str, name: str = TABLE):
+    """WHERE clause for a join with `fts` / `vehicle_fts`."""
+    return literal_column(name).op("MATCH")(expression)
+
+
+def vehicle_expression(q: str, columns=VEHICLE_COLUMNS):
+    """
+    Trigram query for 'q occurs anywhere in one of columns', or None when q is
+    too short for the index (caller falls back to a prefix match).
+    """
+    q = (q or "").strip()
+    if len(q) < TRIGRAM_MIN:
+        return None
+    phrase = '"' + q.replace('"', '""') + '"'
+    return f"{{{' '.join(columns)}}} : {phrase}"
+
+
+def vehicle_ids(q: str, columns=VEHICLE_COLUMNS):
+    """Subquery of record ids whose sasi_no / bb_no contain q (None: not usable)."""
+    expression = vehicle_expression(q, columns)
+    if expression is None or VEHICLE_TABLE not in ENABLED:
+        return None
+    sync_pending(engine)
+    return select(vehicle_fts.c.rowid).where(match(expression, VEHICLE_TABLE))
+
+
+if __name__ == "__main__":
+    from database import engine
+    with engine.begin() as conn:
+        create(conn)
+        rebuild(conn)
+        print(conn.exec_driver_sql(f"SELECT count(*) FROM {TABLE}").scalar(), "kayıt indekslendi.")
+        if available(conn, "trigram"):
+            create_vehicle_index(conn)
+            rebuild_vehicle_index(conn)
+            print(conn.exec_driver_sql(f"SELECT count(*) FROM {VEHICLE_TABLE}").scalar(), "şasi/BB no indekslendi.")
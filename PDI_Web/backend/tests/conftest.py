@@ -0,0 +1,47 @@
+"""
+Tests run against a copy of the bundled database (database/pdi_veritabani.db),
+never the file itself: PDI_DB_PATH is pointed at the copy before the backend
+modules are imported, then main is imported so the migrations, the search
+indexes and the rollup are set up exactly as on a server start.
+
+Usage: python -m pytest -q tests   (from PDI_Web/backend)
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FIXTURE_DB = os.path.abspath(os.path.join(BACKEND_DIR, "..", "database", "pdi_veritabani.db"))
+
+_work = tempfile.mkdtemp(prefix="pdi_test_")
+_copy = os.path.join(_work, "pdi_veritabani.db")
+# backup() rather than a file copy, so a WAL left by a running server is included
+_src = sqlite3.connect(f"file:{FIXTURE_DB}?mode=ro", uri=True)
+_dst = sqlite3.connect(_copy)
+_src.backup(_dst)
+_src.close()
+_dst.close()
+os.environ["PDI_DB_PATH"] = _copy
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(__file__))
+
+import main  # noqa: E402,F401  (migrations + rollup on the copy)
+from database import SessionLocal, engine  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    engine.dispose()
+    shutil.rmtree(_work, ignore_errors=True)
@@ -0,0 +1,419 @@
+"""
+The report builders as they were before the monthly rollup: one query per
+month, matching tarih_saat with substr(). Kept unchanged (route decorators
+removed) as the reference for test_reports_legacy.py.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_
+from typing import List
+import models
+from urllib.parse import quote
+
+TURKISH_MONTHS = [
+    "", "Ocak", "Şubat", "Mart", "Nisan", "Mayıs", "Haziran",
+    "Temmuz", "Ağustos", "Eylül", "Ekim", "Kasım", "Aralık"
+]
+
+
+def parse_int(value, default: int = 0) -> int:
+    try:
+        if value is None or str(value).strip() == "":
+            return default
+        return int(float(value))
+    except (ValueError, TypeError):
+        return default
+
+
+def top_error_context_key(year: int, month: int, hata_adi: str) -> str:
+    safe_name = quote((hata_adi or "").strip(), safe="")
+    return f"{year}-{month:02d}_{safe_name}"
+
+def get_monthly_stats(db: Session, arac_tipleri: List[str], month: int, year: int):
+    stats = []
+    for i in range(12):
+        m = month - i
+        y = year
+        while m <= 0:
+            m += 12
+            y -= 1
+        
+        # SQLite substring logic compatible with both dd-mm-yyyy and yyyy-mm-dd
+        # (substr(tarih_saat,4,2) = ? AND substr(tarih_saat,7,4) = ?) OR
+        # (substr(tarih_saat,6,2) = ? AND substr(tarih_saat,1,4) = ?)
+        m_str = f"{m:02d}"
+        y_str = str(y)
+        
+        query = db.query(
+            func.count(func.distinct(models.PDIKayit.sasi_no)).label("arac"),
+            func.count(models.PDIKayit.id).label("hata")
+        ).filter(models.PDIKayit.arac_tipi.in_(arac_tipleri))
+        
+        # Date filtering
+        query = query.filter(or_(
+            (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
+            (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
+        ))
+        
+        res = query.first()
+        arac = int(res.arac) if res and res.arac else 0
+        hata = int(res.hata) if res and res.hata else 0
+        rate = float(hata / arac) if arac > 0 else 0.0
+        
+        stats.insert(0, {
+            "month": TURKISH_MONTHS[m][:3],
+            "month_full": TURKISH_MONTHS[m],
+            "year": y,
+            "month_num": m,
+            "vehicles": arac,
+            "errors": hata,
+            "rate": rate
+        })
+    return stats
+
+def get_trv_tou_report(db: Session, month: int, year: int):
+    types = ["Tourismo", "Travego"]
+    monthly_stats = get_monthly_stats(db, types, month, year)
+
+    # Manual overrides - apply to monthly_stats first
+    overrides = db.query(models.ReportManualData).filter(models.ReportManualData.report_type == "trv_tou").all()
+    override_dict = {f"{o.context_key}_{o.data_key}": o.data_value for o in overrides}
+    
+    for stat in monthly_stats:
+        ctx_key = f"{stat['year']}-{stat['month_num']:02d}"
+        ov_v = override_dict.get(f"{ctx_key}_vehicle_count")
+        ov_e = override_dict.get(f"{ctx_key}_error_count")
+        if ov_v is not None:
+            v = int(ov_v)
+            e = int(ov_e) if ov_e is not None else stat["errors"]
+            stat["vehicles"] = v
+            stat["errors"] = e
+            stat["rate"] = float(e / v) if v > 0 else 0.0
+
+    # Summary stats (computed after overrides)
+    total_v = int(sum(s["vehicles"] for s in monthly_stats))
+    total_e = int(sum(s["errors"] for s in monthly_stats))
+    avg_12 = float(total_e / total_v) if total_v > 0 else 0.0
+
+    # Helper function for year-wide calculation including overrides
+    def get_year_stats(target_year: int):
+        total_vehicles = 0
+        total_errors = 0
+        for m in range(1, 13):
+            m_str = f"{m:02d}"
+            ctx_key = f"{target_year}-{m_str}"
+            ov_v = override_dict.get(f"{ctx_key}_vehicle_count")
+            ov_e = override_dict.get(f"{ctx_key}_error_count")
+            
+            if ov_v is not None:
+                v = int(ov_v)
+                e = int(ov_e) if ov_e is not None else 0
+            else:
+                res = db.query(
+                    func.count(func.distinct(models.PDIKayit.sasi_no)).label("arac"),
+                    func.count(models.PDIKayit.id).label("hata")
+                ).filter(
+                    models.PDIKayit.arac_tipi.in_(types),
+                    or_(
+                        (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == str(target_year)),
+                        (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == str(target_year))
+                    )
+                ).first()
+                v = int(res.arac) if res and res.arac else 0
+                e = int(res.hata) if res and res.hata else 0
+            
+            total_vehicles += v
+            total_errors += e
+        
+        rate = float(total_errors / total_vehicles) if total_vehicles > 0 else 0.0
+        return total_vehicles, total_errors, rate
+
+    prev_v, prev_e, prev_rate = get_year_stats(year - 1)
+    curr_v, curr_e, curr_rate = get_year_stats(year)
+
+    # Get report note for current selected month
+    report_note = override_dict.get(f"{year}-{month:02d}_report_note", "")
+    ctx_key = f"{year}-{month:02d}"
+    prev_v = parse_int(override_dict.get(f"{ctx_key}_prev_year_cnt"), prev_v)
+    prev_e = parse_int(override_dict.get(f"{ctx_key}_prev_year_err"), prev_e)
+    total_v = parse_int(override_dict.get(f"{ctx_key}_last_12_cnt"), total_v)
+    total_e = parse_int(override_dict.get(f"{ctx_key}_last_12_err"), total_e)
+    curr_v = parse_int(override_dict.get(f"{ctx_key}_curr_year_cnt"), curr_v)
+    curr_e = parse_int(override_dict.get(f"{ctx_key}_curr_year_err"), curr_e)
+
+    prev_rate = float(prev_e / prev_v) if prev_v > 0 else 0.0
+    avg_12 = float(total_e / total_v) if total_v > 0 else 0.0
+    curr_rate = float(curr_e / curr_v) if curr_v > 0 else 0.0
+    prev_rate_override = override_dict.get(f"{year}-{month:02d}_prev_year_rate")
+    avg_12_override = override_dict.get(f"{year}-{month:02d}_avg_12_month")
+    curr_rate_override = override_dict.get(f"{year}-{month:02d}_current_year_rate")
+    prev_rate = float(prev_rate_override) if prev_rate_override not in [None, ""] else prev_rate
+    avg_12 = float(avg_12_override) if avg_12_override not in [None, ""] else avg_12
+    curr_rate = float(curr_rate_override) if curr_rate_override not in [None, ""] else curr_rate
+
+    return {
+        "monthly_trend": monthly_stats,
+        "summary": {
+            "current_month_vehicles": monthly_stats[-1]["vehicles"] if monthly_stats else 0,
+            "current_month_errors": monthly_stats[-1]["errors"] if monthly_stats else 0,
+            "current_month_rate": monthly_stats[-1]["rate"] if monthly_stats else 0.0,
+            "avg_12_month": avg_12,
+            
+            "prev_year": year - 1,
+            "prev_year_rate": prev_rate,
+            "prev_year_cnt": prev_v,
+            "prev_year_err": prev_e,
+            
+            "last_12_cnt": total_v,
+            "last_12_err": total_e,
+            
+            "current_year": year,
+            "current_year_rate": curr_rate,
+            "curr_year_cnt": curr_v,
+            "curr_year_err": curr_e,
+            "report_note": report_note
+        }
+    }
+
+def get_conecto_report(db: Session, month: int, year: int):
+    types = ["Conecto"]
+    monthly_stats = get_monthly_stats(db, types, month, year)
+
+    # Manual overrides - apply to monthly_stats first
+    overrides = db.query(models.ReportManualData).filter(models.ReportManualData.report_type == "conecto").all()
+    override_dict = {f"{o.context_key}_{o.data_key}": o.data_value for o in overrides}
+    
+    for stat in monthly_stats:
+        ctx_key = f"{stat['year']}-{stat['month_num']:02d}"
+        ov_v = override_dict.get(f"{ctx_key}_vehicle_count")
+        ov_e = override_dict.get(f"{ctx_key}_error_count")
+        if ov_v is not None:
+            v = int(ov_v)
+            e = int(ov_e) if ov_e is not None else stat["errors"]
+            stat["vehicles"] = v
+            stat["errors"] = e
+            stat["rate"] = float(e / v) if v > 0 else 0.0
+
+    # Summary stats (computed after overrides)
+    total_v = int(sum(s["vehicles"] for s in monthly_stats))
+    total_e = int(sum(s["errors"] for s in monthly_stats))
+    avg_12 = float(total_e / total_v) if total_v > 0 else 0.0
+
+    # Helper function for year-wide calculation including overrides
+    def get_year_stats(target_year: int):
+        total_vehicles = 0
+        total_errors = 0
+        for m in range(1, 13):
+            m_str = f"{m:02d}"
+            ctx_key = f"{target_year}-{m_str}"
+            ov_v = override_dict.get(f"{ctx_key}_vehicle_count")
+            ov_e = override_dict.get(f"{ctx_key}_error_count")
+            
+            if ov_v is not None:
+                v = int(ov_v)
+                e = int(ov_e) if ov_e is not None else 0
+            else:
+                res = db.query(
+                    func.count(func.distinct(models.PDIKayit.sasi_no)).label("arac"),
+                    func.count(models.PDIKayit.id).label("hata")
+                ).filter(
+                    models.PDIKayit.arac_tipi.in_(types),
+                    or_(
+                        (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == str(target_year)),
+                        (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == str(target_year))
+                    )
+                ).first()
+                v = int(res.arac) if res and res.arac else 0
+                e = int(res.hata) if res and res.hata else 0
+            
+            total_vehicles += v
+            total_errors += e
+        
+        rate = float(total_errors / total_vehicles) if total_vehicles > 0 else 0.0
+        return total_vehicles, total_errors, rate
+
+    prev_v, prev_e, prev_rate = get_year_stats(year - 1)
+    curr_v, curr_e, curr_rate = get_year_stats(year)
+
+    # Get report note for current selected month
+    report_note = override_dict.get(f"{year}-{month:02d}_report_note", "")
+    ctx_key = f"{year}-{month:02d}"
+    prev_v = parse_int(override_dict.get(f"{ctx_key}_prev_year_cnt"), prev_v)
+    prev_e = parse_int(override_dict.get(f"{ctx_key}_prev_year_err"), prev_e)
+    total_v = parse_int(override_dict.get(f"{ctx_key}_last_12_cnt"), total_v)
+    total_e = parse_int(override_dict.get(f"{ctx_key}_last_12_err"), total_e)
+    curr_v = parse_int(override_dict.get(f"{ctx_key}_curr_year_cnt"), curr_v)
+    curr_e = parse_int(override_dict.get(f"{ctx_key}_curr_year_err"), curr_e)
+
+    prev_rate = float(prev_e / prev_v) if prev_v > 0 else 0.0
+    avg_12 = float(total_e / total_v) if total_v > 0 else 0.0
+    curr_rate = float(curr_e / curr_v) if curr_v > 0 else 0.0
+    prev_rate_override = override_dict.get(f"{year}-{month:02d}_prev_year_rate")
+    avg_12_override = override_dict.get(f"{year}-{month:02d}_avg_12_month")
+    curr_rate_override = override_dict.get(f"{year}-{month:02d}_current_year_rate")
+    prev_rate = float(prev_rate_override) if prev_rate_override not in [None, ""] else prev_rate
+    avg_12 = float(avg_12_override) if avg_12_override not in [None, ""] else avg_12
+    curr_rate = float(curr_rate_override) if curr_rate_override not in [None, ""] else curr_rate
+
+    return {
+        "monthly_trend": monthly_stats,
+        "summary": {
+            "current_month_vehicles": monthly_stats[-1]["vehicles"] if monthly_stats else 0,
+            "current_month_errors": monthly_stats[-1]["errors"] if monthly_stats else 0,
+            "current_month_rate": monthly_stats[-1]["rate"] if monthly_stats else 0.0,
+            "avg_12_month": avg_12,
+            "prev_year": year - 1,
+            "prev_year_rate": prev_rate,
+            "prev_year_cnt": prev_v,
+            "prev_year_err": prev_e,
+            "last_12_cnt": total_v,
+            "last_12_err": total_e,
+            "current_year": year,
+            "current_year_rate": curr_rate,
+            "curr_year_cnt": curr_v,
+            "curr_year_err": curr_e,
+            "report_note": report_note
+        }
+    }
+
+def get_top_errors_report(db: Session, month: int, year: int):
+    top_hatalar = db.query(models.TopHata).filter(models.TopHata.aktif == 1).all()
+    results: List[dict] = []
+    
+    m_str = f"{month:02d}"
+    y_str = str(year)
+    
+    # Total vehicle counts for rates
+    def get_totals(arac_tipi):
+        raw = db.query(func.count(func.distinct(models.PDIKayit.sasi_no))).filter(
+            models.PDIKayit.arac_tipi == arac_tipi,
+            or_(
+                (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
+                (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
+            )
+        ).scalar()
+        return int(raw) if raw else 0
+
+    trv_total = get_totals("Travego")
+    tou_total = get_totals("Tourismo")
+
+    # Apply top5 vehicle total overrides
+    top5_overrides = db.query(models.ReportManualData).filter(models.ReportManualData.report_type == "top5").all()
+    top5_override_dict = {f"{o.context_key}_{o.data_key}": o.data_value for o in top5_overrides}
+    ctx_key = f"{year}-{month:02d}"
+    if f"{ctx_key}_trv_total" in top5_override_dict:
+        trv_total = parse_int(top5_override_dict[f"{ctx_key}_trv_total"])
+    if f"{ctx_key}_tou_total" in top5_override_dict:
+        tou_total = parse_int(top5_override_dict[f"{ctx_key}_tou_total"])
+
+    genel_total = trv_total + tou_total
+
+    prev_month = month - 1 if month > 1 else 12
+    prev_year = year if month > 1 else year - 1
+    prev_m_str = f"{prev_month:02d}"
+    prev_y_str = str(prev_year)
+
+    def get_totals_for_period(arac_tipi: str, m_str: str, y_str: str):
+        raw = db.query(func.count(func.distinct(models.PDIKayit.sasi_no))).filter(
+            models.PDIKayit.arac_tipi == arac_tipi,
+            or_(
+                (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
+                (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
+            )
+        ).scalar()
+        return int(raw) if raw else 0
+
+    prev_trv_total = get_totals_for_period("Travego", prev_m_str, prev_y_str)
+    prev_tou_total = get_totals_for_period("Tourismo", prev_m_str, prev_y_str)
+    prev_ctx_key = f"{prev_year}-{prev_month:02d}"
+    prev_trv_total = parse_int(top5_override_dict.get(f"{prev_ctx_key}_trv_total"), prev_trv_total)
+    prev_tou_total = parse_int(top5_override_dict.get(f"{prev_ctx_key}_tou_total"), prev_tou_total)
+
+    for hata in top_hatalar:
+        def get_hata_count(arac_tipi=None):
+            q = db.query(func.count(models.PDIKayit.id)).filter(
+                models.PDIKayit.top_hata == hata.hata_adi,
+                or_(
+                    (func.substr(models.PDIKayit.tarih_saat, 4, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == y_str),
+                    (func.substr(models.PDIKayit.tarih_saat, 6, 2) == m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == y_str)
+                )
+            )
+            if arac_tipi:
+                q = q.filter(models.PDIKayit.arac_tipi == arac_tipi)
+            res = q.scalar()
+            return int(res) if res else 0
+
+        trv_count = get_hata_count("Travego")
+        tou_count = get_hata_count("Tourismo")
+
+        hata_ctx = top_error_context_key(year, month, hata.hata_adi)
+        trv_override_key = f"{hata_ctx}_trv_error_count"
+        tou_override_key = f"{hata_ctx}_tou_error_count"
+        if trv_override_key in top5_override_dict:
+            trv_count = parse_int(top5_override_dict[trv_override_key])
+        if tou_override_key in top5_override_dict:
+            tou_count = parse_int(top5_override_dict[tou_override_key])
+
+        prev_trv_count = db.query(func.count(models.PDIKayit.id)).filter(
+            models.PDIKayit.top_hata == hata.hata_adi,
+            models.PDIKayit.arac_tipi == "Travego",
+            or_(
+                (func.substr(models.PDIKayit.tarih_saat, 4, 2) == prev_m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == prev_y_str),
+                (func.substr(models.PDIKayit.tarih_saat, 6, 2) == prev_m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == prev_y_str)
+            )
+        ).scalar() or 0
+        prev_tou_count = db.query(func.count(models.PDIKayit.id)).filter(
+            models.PDIKayit.top_hata == hata.hata_adi,
+            models.PDIKayit.arac_tipi == "Tourismo",
+            or_(
+                (func.substr(models.PDIKayit.tarih_saat, 4, 2) == prev_m_str) & (func.substr(models.PDIKayit.tarih_saat, 7, 4) == prev_y_str),
+                (func.substr(models.PDIKayit.tarih_saat, 6, 2) == prev_m_str) & (func.substr(models.PDIKayit.tarih_saat, 1, 4) == prev_y_str)
+            )
+        ).scalar() or 0
+
+        prev_hata_ctx = top_error_context_key(prev_year, prev_month, hata.hata_adi)
+        prev_trv_count = parse_int(top5_override_dict.get(f"{prev_hata_ctx}_trv_error_count"), int(prev_trv_count))
+        prev_tou_count = parse_int(top5_override_dict.get(f"{prev_hata_ctx}_tou_error_count"), int(prev_tou_count))
+
+        prev_genel_count = prev_trv_count + prev_tou_count
+        prev_genel_total = prev_trv_total + prev_tou_total
+        prev_avg_rate = (prev_genel_count / prev_genel_total * 100) if prev_genel_total > 0 else 0
+
+        genel_count = trv_count + tou_count
+        avg_rate = (genel_count / genel_total * 100) if genel_total > 0 else 0
+        change_pct = 0.0
+        if prev_avg_rate > 0:
+            change_pct = ((avg_rate - prev_avg_rate) / prev_avg_rate) * 100
+        elif avg_rate > 0:
+            change_pct = 100.0
+
+        if change_pct > 25:
+            trend_status = "Dikkat"
+            trend_color = "red"
+        elif change_pct > 0:
+            trend_status = "Artış"
+            trend_color = "orange"
+        else:
+            trend_status = "Düşüş"
+            trend_color = "green"
+        
+        results.append({
+            "hata_adi": hata.hata_adi,
+            "trv_count": trv_count,
+            "tou_count": tou_count,
+            "genel_count": genel_count,
+            "trv_rate": (trv_count / trv_total * 100) if trv_total > 0 else 0,
+            "tou_rate": (tou_count / tou_total * 100) if tou_total > 0 else 0,
+            "avg_rate": avg_rate,
+            "prev_avg_rate": prev_avg_rate,
+            "change_pct": change_pct,
+            "trend_status": trend_status,
+            "trend_color": trend_color
+        })
+        
+    sorted_results = sorted(results, key=lambda x: x["genel_count"], reverse=True)[:10]
+
+    return {
+        "results": sorted_results,
+        "overrides": top5_override_dict,
+        "totals": {"trv": trv_total, "tou": tou_total, "genel": genel_total}
+    }
@@ -0,0 +1,127 @@
+"""
+Vehicle dimension table (vehicles).
+
+One row per (sasi_no, arac_tipi, pdi_date) that has at least one pdi_kayitlari
+record, with the number of such records. Distinct vehicle counts for a period
+or a type are then indexed reads of this table instead of
+COUNT(DISTINCT sasi_no) over every finding.
+
+The table is kept by triggers on pdi_kayitlari, so every writer is covered:
+single edits, bulk import/delete, completed form sessions (which feed their
+findings, or a "no finding" summary row, into pdi_kayitlari) and the desktop
+app. Like the rollup, missing values are stored as '' so that they take part in
+the unique key. Records without a chassis number are not vehicles and are left
+out. pdi_date is filled by the ORM or by the dates.py triggers; where it is
+still NULL (a trigger that has not run yet) the date is derived from tarih_saat
+the same way. Updates that leave the key unchanged, like those triggers
+filling in pdi_date, do not touch the table.
+
+Usage: python vehicles.py   (rebuilds the table)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import func
+import dates
+import models
+
+TABLE = models.Vehicle.__tablename__
+KEY = "sasi_no, arac_tipi, pdi_date"
+
+
+def date_key(rec: str) -> str:
+    """SQL date of a pdi_kayitlari row (NEW / OLD / alias), '' when it has none."""
+    return f"coalesce({rec}.pdi_date, {dates.sql_iso_date(f'{rec}.tarih_saat')}, '')"
+
+
+def _key_values(rec: str) -> str:
+    return f"{rec}.sasi_no, coalesce({rec}.arac_tipi, ''), {date_key(rec)}"
+
+
+def _add(rec: str) -> str:
+    return (
+        f"INSERT INTO {TABLE}({KEY}, kayit_sayisi) VALUES ({_key_values(rec)}, 1) "
+        f"ON CONFLICT({KEY}) DO UPDATE SET kayit_sayisi = kayit_sayisi + 1;"
+    )
+
+
+def _remove(rec: str) -> str:
+    match = f"({KEY}) = ({_key_values(rec)})"
+    return (
+        f"UPDATE {TABLE} SET kayit_sayisi = kayit_sayisi - 1 WHERE {match}; "
+        f"DELETE FROM {TABLE} WHERE {match} AND kayit_sayisi <= 0;"
+    )
+
+
+_KEY_CHANGED = f"({_key_values('OLD')}) IS NOT ({_key_values('NEW')})"
+
+TRIGGERS = {
+    "trg_vehicles_ai": f"AFTER INSERT ON pdi_kayitlari WHEN NEW.sasi_no IS NOT NULL BEGIN {_add('NEW')} END",
+    "trg_vehicles_ad": f"AFTER DELETE ON pdi_kayitlari WHEN OLD.sasi_no IS NOT NULL BEGIN {_remove('OLD')} END",
+    "trg_vehicles_au_old": (
+        "AFTER UPDATE OF sasi_no, arac_tipi, pdi_date, tarih_saat ON pdi_kayitlari "
+        f"WHEN OLD.sasi_no IS NOT NULL AND {_KEY_CHANGED} BEGIN {_remove('OLD')} END"
+    ),
+    "trg_vehicles_au_new": (
+        "AFTER UPDATE OF sasi_no, arac_tipi, pdi_date, tarih_saat ON pdi_kayitlari "
+        f"WHEN NEW.sasi_no IS NOT NULL AND {_KEY_CHANGED} BEGIN {_add('NEW')} END"
+    ),
+}
+
+
+def create(conn):
+    """Triggers (idempotent); the table itself comes from models.Vehicle."""
+    models.Vehicle.__table__.create(conn, checkfirst=True)
+    for name, body in TRIGGERS.items():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+
+
+def rebuild(conn):
+    """Recompute the whole table from pdi_kayitlari."""
+    conn.exec_driver_sql(f"DELETE FROM {TABLE}")
+    conn.exec_driver_sql(
+        f"INSERT INTO {TABLE}({KEY}, kayit_sayisi) "
+        f"SELECT {_key_values('k')}, COUNT(*) FROM pdi_kayitlari k "
+        f"WHERE k.sasi_no IS NOT NULL GROUP BY 1, 2, 3"
+    )
+
+
+def _by_type(q, arac_tipleri):
+    if arac_tipleri is not None:
+        q = q.filter(models.Vehicle.arac_tipi.in_(arac_tipleri))
+    return q
+
+
+def total(db, arac_tipleri=None) -> int:
+    """Distinct vehicles over all time."""
+    return _by_type(db.query(func.count(func.distinct(models.Vehicle.sasi_no))), arac_tipleri).scalar() or 0
+
+
+def by_type(db) -> dict:
+    """{arac_tipi: distinct vehicles} ('' : tip yok)."""
+    V = models.Vehicle
+    return dict(db.query(V.arac_tipi, func.count(func.distinct(V.sasi_no))).group_by(V.arac_tipi).all())
+
+
+def monthly_counts(db, start, end, arac_tipleri=None) -> dict:
+    """
+    {(year, month): distinct vehicles} for the months start..end (inclusive),
+    counted across the given vehicle types (a chassis is counted once a month
+    even if it was recorded under two types or on several days).
+    """
+    V = models.Vehicle
+    lo, hi = dates.period_bounds(start, end)
+    ym = func.substr(V.pdi_date, 1, 7)
+    q = _by_type(db.query(ym, func.count(func.distinct(V.sasi_no))), arac_tipleri)\
+        .filter(V.pdi_date >= lo, V.pdi_date < hi).group_by(ym)
+    return {(int(k[0:4]), int(k[5:7])): n for k, n in q.all()}
+
+
+if __name__ == "__main__":
+    from database import engine
+    with engine.begin() as conn:
+        create(conn)
+        rebuild(conn)
+        print(conn.exec_driver_sql(f"SELECT count(*) FROM {TABLE}").scalar(), "araç satırı oluşturuldu.")
@@ -11,6 +11,8 @@ export interface VehiclePin {
     y_percent: string;
     aciklama: string;
     fotograf_yolu?: string;
+    photo_url?: string;
+    thumb_url?: string;
     photoFile?: File;
 }
 
@@ -303,7 +305,8 @@ export default function VehicleDiagram({ pins, onChange, readonly = false }: Pro
                                         )}
                                         {pin.fotograf_yolu && (
                                             <img
-                                                src={`http://${window.location.hostname}:8000/static/photos/form/${pin.fotograf_yolu.split('/').pop()}`}
+                                                src={`http://${window.location.hostname}:8000${pin.thumb_url || pin.photo_url || `/static/photos/form/${pin.fotograf_yolu.split('/').pop()}`}`}
+                                                loading="lazy"
                                                 alt="pin photo"
                                                 style={{ width: '100%', borderRadius: '4px', marginBottom: '6px' }}
                                             />
@@ -138,14 +138,14 @@ const ConectoReports: React.FC = () => {
 
             const contextKey = `${editData.year}-${editData.month.padStart(2, '0')}`;
 
-            for (const p of payload) {
-                await axios.post(`${API_BASE_URL}/admin/manual-data`, {
+            await axios.post(`${API_BASE_URL}/admin/manual-data/batch`, {
+                items: payload.map(p => ({
                     report_type: 'conecto',
                     context_key: contextKey,
                     data_key: p.key,
                     data_value: p.val
-                });
-            }
+                }))
+            });
 
             setShowEditModal(false);
             fetchReportData();
@@ -17,6 +17,7 @@ const API_BASE_URL = `http://${window.location.hostname}:8000/api`;
 const ExcelImport: React.FC = () => {
     const [file, setFile] = useState<File | null>(null);
     const [loading, setLoading] = useState(false);
+    const [progress, setProgress] = useState<{ percent: number; message?: string } | null>(null);
     const [result, setResult] = useState<{ success: boolean; message: string; details?: any } | null>(null);
 
     const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
@@ -35,15 +36,29 @@ const ExcelImport: React.FC = () => {
         formData.append('file', file);
 
         try {
-            const res = await axios.post(`${API_BASE_URL}/admin/import-excel`, formData, {
+            // Aktarım arka planda iş olarak çalışır; durum /jobs/{id} ile izlenir
+            const res = await axios.post(`${API_BASE_URL}/admin/kayitlar/import/job`, formData, {
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
-            setResult({
-                success: true,
-                message: `${res.data.count} adet kayıt başarıyla yüklendi!`,
-                details: res.data.errors
-            });
-            setFile(null);
+            const jobId = res.data.job_id;
+            let job: any;
+            do {
+                await new Promise(r => setTimeout(r, 1000));
+                job = (await axios.get(`${API_BASE_URL}/jobs/${jobId}`)).data;
+                setProgress({ percent: job.progress, message: job.message });
+            } while (job.status === 'queued' || job.status === 'running');
+
+            if (job.status === 'done') {
+                const data = job.result;
+                setResult({
+                    success: true,
+                    message: `${data.message} (${data.rows} satır, ${Math.round(data.rows_per_second ?? 0)} satır/sn)`,
+                    details: data.timings_ms
+                });
+                setFile(null);
+            } else {
+                setResult({ success: false, message: job.message || "Dosya yüklenirken bir hata oluştu." });
+            }
         } catch (err: any) {
             setResult({
                 success: false,
@@ -51,6 +66,7 @@ const ExcelImport: React.FC = () => {
             });
         } finally {
             setLoading(false);
+            setProgress(null);
         }
     };
 
@@ -108,7 +124,7 @@ const ExcelImport: React.FC = () => {
                             {loading ? (
                                 <>
                                     <Loader2 className="animate-spin" size={24} />
-                                    İŞLENİYOR...
+                                    İŞLENİYOR{progress ? ` %${progress.percent}` : '...'}
                                 </>
                             ) : (
                                 <>AKTIRIMI BAŞLAT</>
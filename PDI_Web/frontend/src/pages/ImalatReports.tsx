@@ -80,11 +80,11 @@ const ImalatReports: React.FC = () => {
     const handleSaveManual = async () => {
         try {
             const ctxKey = `${editData.year}-${String(editData.month).padStart(2, '0')}`;
-            await axios.post(`${ADMIN_API}/manual-data`, {
-                report_type: 'imalat', context_key: ctxKey, data_key: 'vehicle_count', data_value: editData.vehicle_count
-            });
-            await axios.post(`${ADMIN_API}/manual-data`, {
-                report_type: 'imalat', context_key: ctxKey, data_key: 'error_count', data_value: editData.error_count
+            await axios.post(`${ADMIN_API}/manual-data/batch`, {
+                items: [
+                    { report_type: 'imalat', context_key: ctxKey, data_key: 'vehicle_count', data_value: editData.vehicle_count },
+                    { report_type: 'imalat', context_key: ctxKey, data_key: 'error_count', data_value: editData.error_count }
+                ]
             });
             setShowEditModal(false);
             fetchOzet();
@@ -222,6 +222,41 @@ export default function PDIFormPage() {
     }
 
     // ── Section save ──────────────────────────────────────────────────────────
+    // ── Bölümün doldurulmuş maddeleri → toplu kayıt satırları ─────────────────
+    function sectionResponseItems(section: FormSection) {
+        const usta = sectionUsta[section.no]?.trim() || '';
+        return section.subSections.flatMap(ss => ss.items)
+            .filter(item => responses[item.no]?.durum)
+            .map(item => {
+                const resp = responses[item.no];
+                return {
+                    item_no: item.no,
+                    item_label: item.label,
+                    alt_grup: section.altGrup,
+                    durum: resp.durum,
+                    ariza_tanimi: resp.ariza_tanimi || null,
+                    hata_nerede_item: resp.hata_nerede_item || null,
+                    olcum_ilk: resp.olcum_ilk || null,
+                    olcum_sonra: resp.olcum_sonra || null,
+                    kaydeden: usta || null,
+                };
+            });
+    }
+
+    async function uploadResponsePhotos(sid: number, sections: FormSection[]) {
+        for (const section of sections) {
+            for (const ss of section.subSections) {
+                for (const item of ss.items) {
+                    const resp = responses[item.no];
+                    if (!resp?.durum || !resp.photoFile) continue;
+                    const pfd = new FormData();
+                    pfd.append('photo', resp.photoFile);
+                    await axios.post(`${API}/sessions/${sid}/responses/${item.no}/photo`, pfd);
+                }
+            }
+        }
+    }
+
     async function saveSectionResponses(section: FormSection) {
         setSectionSaving(section.no);
         const usta = sectionUsta[section.no]?.trim() || '';
@@ -237,28 +272,10 @@ export default function PDIFormPage() {
             if (pdiPersonel) headerFd.append('pdi_personel', pdiPersonel);
             await axios.put(`${API}/sessions/${sid}`, headerFd);
 
-            for (const ss of section.subSections) {
-                for (const item of ss.items) {
-                    const resp = responses[item.no];
-                    if (!resp?.durum) continue;
-                    const fd = new FormData();
-                    fd.append('item_no', item.no);
-                    fd.append('item_label', item.label);
-                    fd.append('alt_grup', section.altGrup);
-                    fd.append('durum', resp.durum);
-                    if (resp.ariza_tanimi) fd.append('ariza_tanimi', resp.ariza_tanimi);
-                    if (resp.hata_nerede_item) fd.append('hata_nerede_item', resp.hata_nerede_item);
-                    if (resp.olcum_ilk) fd.append('olcum_ilk', resp.olcum_ilk);
-                    if (resp.olcum_sonra) fd.append('olcum_sonra', resp.olcum_sonra);
-                    if (usta) fd.append('kaydeden', usta);
-                    await axios.post(`${API}/sessions/${sid}/responses`, fd);
-                    if (resp.photoFile) {
-                        const pfd = new FormData();
-                        pfd.append('photo', resp.photoFile);
-                        await axios.post(`${API}/sessions/${sid}/responses/${item.no}/photo`, pfd);
-                    }
-                }
-            }
+            await axios.post(`${API}/sessions/${sid}/bulk`, {
+                responses: sectionResponseItems(section),
+            });
+            await uploadResponsePhotos(sid, [section]);
 
             setSectionSavedBy(prev => ({
                 ...prev,
@@ -286,55 +303,31 @@ export default function PDIFormPage() {
         if (genelAciklamalar) headerFd.append('genel_aciklamalar', genelAciklamalar);
         await axios.put(`${API}/sessions/${sid}`, headerFd);
 
-        if (formData) {
-            for (const section of formData.sections) {
-                const usta = sectionUsta[section.no]?.trim() || '';
-                for (const ss of section.subSections) {
-                    for (const item of ss.items) {
-                        const resp = responses[item.no];
-                        if (!resp?.durum) continue;
-                        const fd = new FormData();
-                        fd.append('item_no', item.no);
-                        fd.append('item_label', item.label);
-                        fd.append('alt_grup', section.altGrup);
-                        fd.append('durum', resp.durum);
-                        if (resp.ariza_tanimi) fd.append('ariza_tanimi', resp.ariza_tanimi);
-                        if (resp.hata_nerede_item) fd.append('hata_nerede_item', resp.hata_nerede_item);
-                        if (resp.olcum_ilk) fd.append('olcum_ilk', resp.olcum_ilk);
-                        if (resp.olcum_sonra) fd.append('olcum_sonra', resp.olcum_sonra);
-                        if (usta) fd.append('kaydeden', usta);
-                        await axios.post(`${API}/sessions/${sid}/responses`, fd);
-                        if (resp.photoFile) {
-                            const pfd = new FormData();
-                            pfd.append('photo', resp.photoFile);
-                            await axios.post(`${API}/sessions/${sid}/responses/${item.no}/photo`, pfd);
-                        }
-                    }
-                }
-            }
-        }
-
-        for (const pin of pins) {
-            if (pin.id) continue;
-            const fd = new FormData();
-            fd.append('view', pin.view);
-            fd.append('x_percent', pin.x_percent);
-            fd.append('y_percent', pin.y_percent);
-            if (pin.aciklama) fd.append('aciklama', pin.aciklama);
-            const pinRes = await axios.post(`${API}/sessions/${sid}/pins`, fd);
-            if (pin.photoFile) {
-                const pfd = new FormData();
-                pfd.append('photo', pin.photoFile);
-                await axios.post(`${API}/sessions/${sid}/pins/${pinRes.data.id}/photo`, pfd);
-            }
-        }
+        // Cevaplar, dinamik cevaplar ve yeni pinler tek istek / tek transaction
+        const sections = formData?.sections ?? [];
+        const newPins = pins.filter(pin => !pin.id);
+        const bulkRes = await axios.post(`${API}/sessions/${sid}/bulk`, {
+            responses: sections.flatMap(sectionResponseItems),
+            dynamic_responses: Object.entries(dynamicResponses).map(([idStr, dr]) => ({
+                dynamic_item_id: Number(idStr),
+                kontrol_edildi: dr.kontrol_edildi ? 1 : 0,
+                aciklama: dr.aciklama || null,
+            })),
+            pins: newPins.map(pin => ({
+                view: pin.view,
+                x_percent: pin.x_percent,
+                y_percent: pin.y_percent,
+                aciklama: pin.aciklama || null,
+            })),
+        });
 
-        for (const [idStr, dr] of Object.entries(dynamicResponses)) {
-            const fd = new FormData();
-            fd.append('dynamic_item_id', idStr);
-            fd.append('kontrol_edildi', dr.kontrol_edildi ? '1' : '0');
-            if (dr.aciklama) fd.append('aciklama', dr.aciklama);
-            await axios.post(`${API}/sessions/${sid}/dynamic-responses`, fd);
+        await uploadResponsePhotos(sid, sections);
+        const pinIds: number[] = bulkRes.data.pin_ids;
+        for (const [i, pin] of newPins.entries()) {
+            if (!pin.photoFile) continue;
+            const pfd = new FormData();
+            pfd.append('photo', pin.photoFile);
+            await axios.post(`${API}/sessions/${sid}/pins/${pinIds[i]}/photo`, pfd);
         }
 
         return sid;
@@ -47,6 +47,7 @@ interface SessionDetail {
         y_percent: string;
         aciklama?: string;
         fotograf_yolu?: string;
+        thumb_url?: string;
     }>;
     dynamic_responses: Array<{
         dynamic_item_id: number;
@@ -248,6 +249,14 @@ export default function PDISessionList() {
                                             <div key={pin.id} style={{ display: 'flex', gap: '8px', padding: '8px 10px', background: '#f9fafb', borderRadius: '6px', marginBottom: '4px' }}>
                                                 <span style={{ fontSize: '0.72rem', fontWeight: 700, color: '#00677f', minWidth: '30px' }}>{pin.view.toUpperCase()}</span>
                                                 <span style={{ fontSize: '0.78rem', color: '#374151' }}>{pin.aciklama || `(${pin.x_percent}%, ${pin.y_percent}%)`}</span>
+                                                {pin.thumb_url && (
+                                                    <img
+                                                        src={`http://${host}:8000${pin.thumb_url}`}
+                                                        alt="pin"
+                                                        loading="lazy"
+                                                        style={{ width: '40px', height: '40px', objectFit: 'cover', borderRadius: '4px', marginLeft: 'auto' }}
+                                                    />
+                                                )}
                                             </div>
                                         ))}
                                     </div>
@@ -3,6 +3,7 @@ import axios from 'axios';
 
 const host = window.location.hostname;
 const ADMIN_API = `http://${host}:8000/api/admin`;
+const JOBS_API = `http://${host}:8000/api/jobs`;
 
 const months = [
     { label: 'TÜMÜ', value: '' },
@@ -14,13 +15,22 @@ const months = [
 
 const years = ['TÜMÜ', '2024', '2025', '2026'];
 
+const PAGE_SIZE = 500;
+
 const RecordList: React.FC = () => {
     const [records, setRecords] = useState<any[]>([]);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
+    // Keyset sayfalama: bir sonraki sayfa için son kaydın id'si (X-Next-Cursor)
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [total, setTotal] = useState<number | null>(null);
+    const [activeParams, setActiveParams] = useState<any>({});
+    const [exporting, setExporting] = useState(false);
     const [selectedRecord, setSelectedRecord] = useState<any>(null);
 
     // Filters
     const [sasiNo, setSasiNo] = useState('');
+    const [arama, setArama] = useState('');
     const [aracTipi, setAracTipi] = useState('');
     const [altGrup, setAltGrup] = useState('');
     const [ay, setAy] = useState('');
@@ -57,30 +67,68 @@ const RecordList: React.FC = () => {
         const f = filters || {};
         const params: any = {};
         if (f.sasiNo) params.sasi_no = f.sasiNo;
+        if (f.arama) params.q = f.arama;
         if (f.aracTipi) params.arac_tipi = f.aracTipi;
         if (f.altGrup) params.alt_grup = f.altGrup;
         if (f.ay) params.ay = f.ay;
         if (f.yil) params.yil = f.yil;
         if (f.hataNerede) params.hata_nerede = f.hataNerede;
-        axios.get(`${ADMIN_API}/kayitlar`, { params })
-            .then(res => setRecords(res.data))
+        setActiveParams(params);
+        axios.get(`${ADMIN_API}/kayitlar`, { params: { ...params, fields: 'list', with_total: 1, limit: PAGE_SIZE } })
+            .then(res => {
+                setRecords(res.data);
+                setNextCursor(res.headers['x-next-cursor'] || null);
+                setTotal(res.headers['x-total-count'] ? Number(res.headers['x-total-count']) : null);
+            })
             .catch(console.error)
             .finally(() => setLoading(false));
     };
 
+    const fetchMore = () => {
+        if (!nextCursor) return;
+        setLoadingMore(true);
+        axios.get(`${ADMIN_API}/kayitlar`, { params: { ...activeParams, fields: 'list', limit: PAGE_SIZE, before_id: nextCursor } })
+            .then(res => {
+                setRecords(prev => [...prev, ...res.data]);
+                setNextCursor(res.headers['x-next-cursor'] || null);
+            })
+            .catch(console.error)
+            .finally(() => setLoadingMore(false));
+    };
+
     const handleFilter = () => {
-        fetchRecords({ sasiNo, aracTipi, altGrup, ay, yil, hataNerede });
+        fetchRecords({ sasiNo, arama, aracTipi, altGrup, ay, yil, hataNerede });
     };
 
-    const handleExcel = () => {
+    const handleExport = async (format: 'xlsx' | 'csv') => {
         const params = new URLSearchParams();
+        if (format === 'csv') params.set('format', 'csv');
         if (sasiNo) params.set('sasi_no', sasiNo);
         if (aracTipi) params.set('arac_tipi', aracTipi);
         if (altGrup) params.set('alt_grup', altGrup);
         if (ay) params.set('ay', ay);
         if (yil) params.set('yil', yil);
         if (hataNerede) params.set('hata_nerede', hataNerede);
-        window.open(`${ADMIN_API}/kayitlar/export?${params.toString()}`, '_blank');
+        // Dosya arka plan işinde üretilir, hazır olunca indirilir
+        setExporting(true);
+        try {
+            const res = await axios.post(`${ADMIN_API}/kayitlar/export/job?${params.toString()}`);
+            let job: any;
+            do {
+                await new Promise(r => setTimeout(r, 1000));
+                job = (await axios.get(`${JOBS_API}/${res.data.job_id}`)).data;
+            } while (job.status === 'queued' || job.status === 'running');
+            if (job.status === 'done') {
+                // attachment yanıtı: sayfadan çıkmadan indirilir (await sonrası window.open engellenebilir)
+                window.location.href = `${JOBS_API}/${job.id}/download`;
+            } else {
+                alert(job.message || 'Dışa aktarma başarısız.');
+            }
+        } catch (err) {
+            console.error(err);
+        } finally {
+            setExporting(false);
+        }
     };
 
     const handleDonemSil = async () => {
@@ -88,20 +136,23 @@ const RecordList: React.FC = () => {
             alert('Dönem silmek için ay ve yıl seçiniz.');
             return;
         }
-        if (!window.confirm(`${ay}/${yil} dönemindeki tüm kayıtlar silinecek. Emin misiniz?`)) return;
-        // Delete all filtered records
         const params: any = { ay, yil };
         if (aracTipi) params.arac_tipi = aracTipi;
-        const res = await axios.get(`${ADMIN_API}/kayitlar`, { params: { ...params, limit: 9999 } });
-        for (const r of res.data) {
-            await axios.delete(`${ADMIN_API}/kayit/${r.id}`);
-        }
-        fetchRecords({ sasiNo, aracTipi, altGrup, ay, yil, hataNerede });
+        // Önce kaç kaydın silineceğini sor (dry run), sonra sunucuda tek işlemde sil
+        const preview = await axios.delete(`${ADMIN_API}/kayitlar`, { params: { ...params, dry_run: 1 } });
+        if (!window.confirm(`${ay}/${yil} dönemindeki ${preview.data.deleted} kayıt silinecek. Emin misiniz?`)) return;
+        const res = await axios.delete(`${ADMIN_API}/kayitlar`, { params });
+        alert(res.data.message);
+        fetchRecords({ sasiNo, arama, aracTipi, altGrup, ay, yil, hataNerede });
     };
 
     const handleEdit = async (record: any) => {
-        setEditingRecord({ ...record });
-        const res = await axios.get(`${ADMIN_API}/kayit/${record.id}/detaylar`);
+        // Liste yalnızca tablo kolonlarını taşır; düzenleme için kaydın tamamı alınır
+        const [full, res] = await Promise.all([
+            axios.get(`${ADMIN_API}/kayit/${record.id}`),
+            axios.get(`${ADMIN_API}/kayit/${record.id}/detaylar`),
+        ]);
+        setEditingRecord({ ...full.data });
         setDetaylar(res.data);
         setIsEditOpen(true);
     };
@@ -132,7 +183,7 @@ const RecordList: React.FC = () => {
     const handleUpdate = async () => {
         await axios.put(`${ADMIN_API}/kayit/${editingRecord.id}`, editingRecord);
         setIsEditOpen(false);
-        fetchRecords({ sasiNo, aracTipi, altGrup, ay, yil, hataNerede });
+        fetchRecords({ sasiNo, arama, aracTipi, altGrup, ay, yil, hataNerede });
     };
 
     const inputStyle: React.CSSProperties = { padding: '6px 8px', border: '1px solid #ccc', borderRadius: '4px', fontSize: '0.85rem', height: '32px' };
@@ -146,6 +197,10 @@ const RecordList: React.FC = () => {
                     <div style={{ fontSize: '0.75rem', color: '#6b7280', marginBottom: '4px', fontWeight: 600 }}>Şasi No:</div>
                     <input value={sasiNo} onChange={e => setSasiNo(e.target.value)} style={{ ...inputStyle, width: '130px' }} placeholder="" aria-label="Şasi No" />
                 </div>
+                <div>
+                    <div style={{ fontSize: '0.75rem', color: '#6b7280', marginBottom: '4px', fontWeight: 600 }}>Tespit Ara:</div>
+                    <input value={arama} onChange={e => setArama(e.target.value)} onKeyDown={e => { if (e.key === 'Enter') handleFilter(); }} style={{ ...inputStyle, width: '180px' }} placeholder="örn. ayna çizik" aria-label="Tespit ara" />
+                </div>
                 <div>
                     <div style={{ fontSize: '0.75rem', color: '#6b7280', marginBottom: '4px', fontWeight: 600 }}>Araç Tipi:</div>
                     <select value={aracTipi} onChange={e => setAracTipi(e.target.value)} style={{ ...selectStyle, width: '120px' }} aria-label="Araç Tipi">
@@ -181,8 +236,11 @@ const RecordList: React.FC = () => {
                 <button onClick={handleFilter} style={{ padding: '6px 18px', backgroundColor: '#111827', color: '#fff', border: 'none', borderRadius: '4px', fontWeight: 700, cursor: 'pointer', height: '32px', fontSize: '0.85rem' }}>
                     FİLTRELE
                 </button>
-                <button onClick={handleExcel} style={{ padding: '6px 18px', backgroundColor: '#2563eb', color: '#fff', border: 'none', borderRadius: '4px', fontWeight: 700, cursor: 'pointer', height: '32px', fontSize: '0.85rem' }}>
-                    EXCEL İNDİR
+                <button onClick={() => handleExport('xlsx')} disabled={exporting} style={{ padding: '6px 18px', backgroundColor: '#2563eb', color: '#fff', border: 'none', borderRadius: '4px', fontWeight: 700, cursor: 'pointer', height: '32px', fontSize: '0.85rem' }}>
+                    {exporting ? 'HAZIRLANIYOR...' : 'EXCEL İNDİR'}
+                </button>
+                <button onClick={() => handleExport('csv')} disabled={exporting} style={{ padding: '6px 18px', backgroundColor: '#0f766e', color: '#fff', border: 'none', borderRadius: '4px', fontWeight: 700, cursor: 'pointer', height: '32px', fontSize: '0.85rem' }}>
+                    {exporting ? 'HAZIRLANIYOR...' : 'CSV İNDİR'}
                 </button>
                 <button onClick={handleDonemSil} style={{ padding: '6px 18px', backgroundColor: '#dc2626', color: '#fff', border: 'none', borderRadius: '4px', fontWeight: 700, cursor: 'pointer', height: '32px', fontSize: '0.85rem' }}>
                     DÖNEMİ SİL
@@ -235,7 +293,14 @@ const RecordList: React.FC = () => {
             {/* Status bar */}
             <div style={{ marginTop: '10px', padding: '6px 12px', backgroundColor: '#f9fafb', borderRadius: '4px', fontSize: '0.8rem', color: '#6b7280', display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
                 <span>{selectedRecord ? `Seçili: ID ${selectedRecord.id} — ${selectedRecord.sasi_no}` : 'Kayıt seçiniz...'}</span>
-                <span>{records.length} kayıt</span>
+                <span>
+                    {total !== null && total > records.length ? `${records.length} / ${total} kayıt` : `${records.length} kayıt`}
+                    {nextCursor && (
+                        <button onClick={fetchMore} disabled={loadingMore} style={{ marginLeft: '10px', padding: '2px 10px', backgroundColor: '#fff', border: '1px solid #d1d5db', borderRadius: '4px', cursor: loadingMore ? 'wait' : 'pointer', fontSize: '0.78rem' }}>
+                            {loadingMore ? 'Yükleniyor...' : 'Daha fazla yükle'}
+                        </button>
+                    )}
+                </span>
             </div>
 
             {/* Bottom Edit Button */}
@@ -336,9 +401,10 @@ const RecordList: React.FC = () => {
                                         <span style={{ flex: 1, fontSize: '0.85rem' }}>• {d.aciklama}</span>
                                         {d.fotograf_yolu ? (
                                             <button
-                                                onClick={() => window.open(`http://${host}:8000/static/photos/${d.fotograf_yolu}`, '_blank')}
+                                                onClick={() => window.open(`http://${host}:8000${d.preview_url || `/static/photos/${d.fotograf_yolu}`}`, '_blank')}
                                                 style={{ padding: '4px 10px', backgroundColor: '#16a34a', color: '#fff', border: 'none', borderRadius: '4px', cursor: 'pointer', fontSize: '0.75rem', fontWeight: 600 }}
                                             >
+                                                {d.thumb_url && <img src={`http://${host}:8000${d.thumb_url}`} alt="" loading="lazy" style={{ width: '24px', height: '24px', objectFit: 'cover', borderRadius: '3px', verticalAlign: 'middle', marginRight: '6px' }} />}
                                                 Fotoğraf Var
                                             </button>
                                         ) : (
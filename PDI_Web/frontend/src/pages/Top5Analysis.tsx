@@ -25,6 +25,7 @@ const Top5Analysis: React.FC = () => {
 
     const [selectedHata, setSelectedHata] = useState<string | null>(null);
     const [trendData, setTrendData] = useState<any>(null);
+    const [trendMap, setTrendMap] = useState<Record<string, any>>({});
     const [loadingTrend, setLoadingTrend] = useState(false);
 
     const [showEditModal, setShowEditModal] = useState(false);
@@ -50,14 +51,36 @@ const Top5Analysis: React.FC = () => {
         }
     };
 
-    const fetchTrend = async (hataName: string, m = month, y = year) => {
+    // Tüm aktif top hataların 12 aylık trendi tek istekte
+    const fetchTrends = async (m = month, y = year, hataAdlari?: string[]) => {
+        const res = await axios.get(`${API_BASE_URL}/reports/error-trend/batch`, {
+            params: { month: m, year: y, hata_adi: hataAdlari },
+            paramsSerializer: { indexes: null }
+        });
+        return (res.data?.trends || {}) as Record<string, any>;
+    };
+
+    const loadTrends = async () => {
+        try {
+            const trends = await fetchTrends();
+            setTrendMap(trends);
+            return trends;
+        } catch (err) {
+            console.error('Trend fetch error:', err);
+            return {};
+        }
+    };
+
+    const fetchTrend = async (hataName: string, m = month, y = year, map = trendMap) => {
         setSelectedHata(hataName);
+        if (m === month && y === year && map[hataName]) {
+            setTrendData(map[hataName]);
+            return;
+        }
         setLoadingTrend(true);
         try {
-            const res = await axios.get(`${API_BASE_URL}/reports/error-trend`, {
-                params: { hata_adi: hataName, month: m, year: y }
-            });
-            setTrendData(res.data);
+            const trends = await fetchTrends(m, y, [hataName]);
+            setTrendData(trends[hataName] || null);
         } catch (err) {
             console.error('Trend fetch error:', err);
         } finally {
@@ -83,11 +106,9 @@ const Top5Analysis: React.FC = () => {
 
     const fetchCurrentPeriodStats = async (hataName: string, m: number, y: number) => {
         try {
-            const trend = await axios.get(`${API_BASE_URL}/reports/error-trend`, {
-                params: { hata_adi: hataName, month: m, year: y }
-            });
-            const trvLast = trend.data?.TRV?.[trend.data.TRV.length - 1] || { arac: 0, hata: 0 };
-            const touLast = trend.data?.TOU?.[trend.data.TOU.length - 1] || { arac: 0, hata: 0 };
+            const trend = (await fetchTrends(m, y, [hataName]))[hataName];
+            const trvLast = trend?.TRV?.[trend.TRV.length - 1] || { arac: 0, hata: 0 };
+            const touLast = trend?.TOU?.[trend.TOU.length - 1] || { arac: 0, hata: 0 };
             return {
                 trv_total: String(trvLast.arac ?? 0),
                 tou_total: String(touLast.arac ?? 0),
@@ -145,24 +166,21 @@ const Top5Analysis: React.FC = () => {
             { context_key: errorCtx, data_key: 'tou_error_count', data_value: editData.tou_error_count }
         ];
 
-        for (const item of writes) {
-            await axios.post(`${API_BASE_URL}/admin/manual-data`, {
-                report_type: 'top5',
-                context_key: item.context_key,
-                data_key: item.data_key,
-                data_value: item.data_value
-            });
-        }
+        await axios.post(`${API_BASE_URL}/admin/manual-data/batch`, {
+            items: writes.map(item => ({ report_type: 'top5', ...item }))
+        });
 
         await fetchAllManualData();
         setShowEditModal(false);
         await fetchReport();
-        await fetchTrend(selectedHata, month, year);
+        const trends = await loadTrends();
+        await fetchTrend(selectedHata, month, year, trends);
     };
 
     useEffect(() => {
         fetchReport();
         fetchAllManualData();
+        loadTrends();
     }, [month, year]);
 
     if (loading && !data) return <div className="p-8 text-center text-slate-600 font-medium">Yükleniyor...</div>;
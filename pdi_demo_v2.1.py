@@ -4,8 +4,10 @@ import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
 import os
+import sys
 import base64
 import calendar
+import hashlib
 import shutil
 from collections import Counter
 from PIL import Image as PilImage, ImageTk
@@ -28,6 +30,13 @@ APP_DIR = r"F:\M_AB\10. KİŞİSEL KLASÖRLER\Deha\PDI-App"
 DB_NAME = os.path.join(APP_DIR, "pdi_veritabani.db")
 PHOTO_DIR = os.path.join(APP_DIR, "photos")
 
+# Şema sürüm adımları web backend ile ortak modülden (PDI_Web/backend/schema_version.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "PDI_Web", "backend"))
+try:
+    import schema_version
+except ImportError:
+    schema_version = None
+
 # Klasörleri kontrol et
 if not os.path.exists(APP_DIR):
     try: os.makedirs(APP_DIR)
@@ -36,6 +45,44 @@ if not os.path.exists(PHOTO_DIR):
     try: os.makedirs(PHOTO_DIR)
     except: pass
 
+def normalize_tarih(raw):
+    """
+    Tarihi DD-MM-YYYY biçimine getir (YYYY-MM-DD, D.M.YYYY, D/M/YYYY ... kabul edilir);
+    varsa saat kısmı korunur. Geçerli bir tarih değilse None.
+    """
+    s = str(raw).strip() if raw is not None else ""
+    date_part, _, time_part = s.partition(" ")
+    parts = date_part.replace("/", "-").replace(".", "-").split("-")
+    if len(parts) != 3: return None
+    d, m, y = (parts[2], parts[1], parts[0]) if len(parts[0]) == 4 else parts
+    if len(y) != 4: return None
+    new_dt = f"{d.zfill(2)}-{m.zfill(2)}-{y}"
+    try: datetime.strptime(new_dt, "%d-%m-%Y")
+    except ValueError: return None
+    return f"{new_dt} {time_part.strip()}" if time_part.strip() else new_dt
+
+def store_photo(src):
+    """
+    Fotoğrafı içerik adresli olarak PHOTO_DIR'a kopyala: dosya adı içeriğin
+    SHA-256 özeti (photos/ab/abcd....jpg). Aynı fotoğraf bir kez saklanır, önce
+    geçici dosyaya yazılıp yerine taşındığı için yarım dosya kalmaz.
+    """
+    h = hashlib.sha256()
+    with open(src, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    sha = h.hexdigest()
+    ext = os.path.splitext(src)[1].lower() or ".jpg"
+    if ext == ".jpeg": ext = ".jpg"
+    dest_dir = os.path.join(PHOTO_DIR, sha[:2])
+    os.makedirs(dest_dir, exist_ok=True)
+    dest = os.path.join(dest_dir, sha + ext)
+    if not os.path.exists(dest):
+        tmp = f"{dest}.{os.getpid()}.part"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    return dest
+
 # RENK PALETİ
 COLOR_SIDEBAR = "#111111"      
 COLOR_SIDEBAR_ACT = "#1f1f1f" 
@@ -268,10 +315,8 @@ def init_db():
         value_text TEXT,
         UNIQUE(category, value_text)
     )""")
-    cols = ["grup_no", "parca_tanimi", "hata_tanimi", "musteri_sikayeti", "musteri_beklentisi", "musteri_geri_bildirimi", "musteri_teyidi", "musteri_talebi", "musteri_adi", "musteri_soyadi", "musteri_iletisim", "musteri_adresi", "duzenleyen", "top_hata", "hata_nerede"]
-    for col in cols:
-        try: c.execute(f"ALTER TABLE pdi_kayitlari ADD COLUMN {col} TEXT")
-        except: pass
+    conn.commit()
+    run_desktop_migrations()
         
     # Başlangıç verilerini dropdown tablolarına ekle
     try:
@@ -287,46 +332,65 @@ def init_db():
     c.execute("SELECT * FROM users WHERE username='admin'")
     if not c.fetchone():
         c.execute("INSERT INTO users VALUES ('admin', 'admin123', 1, 'Sistem Yöneticisi')")
-    # Tarih Normalizasyonu (TÜM FORMATLAR -> DD-MM-YYYY)
-    all_rows = c.execute("SELECT id, tarih_saat FROM pdi_kayitlari").fetchall()
-    for row_id, raw_dt in all_rows:
-        if not raw_dt: continue
-        new_dt = raw_dt.strip().replace("/", "-").replace(".", "-")
-        parts = new_dt.split("-")
-        try:
-            if len(parts) == 3:
-                # YYYY-MM-DD -> DD-MM-YYYY
-                if len(parts[0]) == 4:
-                    new_dt = f"{parts[2].zfill(2)}-{parts[1].zfill(2)}-{parts[0]}"
-                # D-M-YYYY -> DD-MM-YYYY
-                else:
-                    new_dt = f"{parts[0].zfill(2)}-{parts[1].zfill(2)}-{parts[2]}"
-                if new_dt != raw_dt:
-                    c.execute("UPDATE pdi_kayitlari SET tarih_saat=? WHERE id=?", (new_dt, row_id))
-        except: pass
-        
-    # Typo Migration: Connecto -> Conecto
-    try:
-        c.execute("UPDATE pdi_kayitlari SET arac_tipi='Conecto' WHERE arac_tipi='Connecto'")
-    except: pass
-    
-    try:
-        c.execute("UPDATE report_manual_data SET context_key='conecto' WHERE context_key='connecto'")
-    except: pass
-    
-    # ===== PERFORMANS OPTİMİZASYONU: INDEX'LER =====
-    # Sık kullanılan sorgular için index oluştur
-    try:
-        c.execute("CREATE INDEX IF NOT EXISTS idx_tarih_saat ON pdi_kayitlari(tarih_saat)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_arac_tipi ON pdi_kayitlari(arac_tipi)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_top_hata ON pdi_kayitlari(top_hata)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_sasi_no ON pdi_kayitlari(sasi_no)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_imalat_tarih ON imalat_kayitlari(tarih)")
-    except: pass
-    # ================================================
     
     conn.commit(); conn.close()
 
+# ------------------------------------------------------
+# ŞEMA SÜRÜM ADIMLARI (masaüstü)
+# Her adım bir kez, kendi transaction'ında çalışır; uygulanan sürüm schema_version
+# tablosunda 'desktop' satırında tutulur (web backend 'web' satırını kullanır).
+# ------------------------------------------------------
+def _d001_kayit_kolonlari(conn):
+    """Sonradan eklenen pdi_kayitlari kolonları"""
+    mevcut = {row[1] for row in conn.execute("PRAGMA table_info(pdi_kayitlari)")}
+    cols = ["grup_no", "parca_tanimi", "hata_tanimi", "musteri_sikayeti", "musteri_beklentisi", "musteri_geri_bildirimi", "musteri_teyidi", "musteri_talebi", "musteri_adi", "musteri_soyadi", "musteri_iletisim", "musteri_adresi", "duzenleyen", "top_hata", "hata_nerede"]
+    for col in cols:
+        if col not in mevcut:
+            conn.execute(f"ALTER TABLE pdi_kayitlari ADD COLUMN {col} TEXT")
+
+def _d002_conecto_yazimi(conn):
+    """Typo Migration: Connecto -> Conecto"""
+    conn.execute("UPDATE pdi_kayitlari SET arac_tipi='Conecto' WHERE arac_tipi='Connecto'")
+    conn.execute("UPDATE report_manual_data SET context_key='conecto' WHERE context_key='connecto'")
+
+def _d003_indexler(conn):
+    """Sık kullanılan sorgular için index'ler"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tarih_saat ON pdi_kayitlari(tarih_saat)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_arac_tipi ON pdi_kayitlari(arac_tipi)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_top_hata ON pdi_kayitlari(top_hata)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sasi_no ON pdi_kayitlari(sasi_no)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_imalat_tarih ON imalat_kayitlari(tarih)")
+
+def _d004_tarih_normalizasyonu(conn):
+    """Tarih Normalizasyonu (TÜM FORMATLAR -> DD-MM-YYYY), bir kez ve toplu UPDATE ile.
+    Sonrasında kayıt ekranı ve Excel içe aktarma tarihi yazarken normalize eder."""
+    rows = conn.execute("SELECT id, tarih_saat FROM pdi_kayitlari WHERE tarih_saat IS NOT NULL "
+                        "AND tarih_saat NOT GLOB '[0-3][0-9]-[01][0-9]-[12][0-9][0-9][0-9]'").fetchall()
+    updates = []
+    for row_id, raw_dt in rows:
+        new_dt = normalize_tarih(raw_dt)
+        if new_dt and new_dt != raw_dt: updates.append((new_dt, row_id))
+    conn.executemany("UPDATE pdi_kayitlari SET tarih_saat=? WHERE id=?", updates)
+
+DESKTOP_MIGRATIONS = [
+    (1, _d001_kayit_kolonlari),
+    (2, _d002_conecto_yazimi),
+    (3, _d003_indexler),
+    (4, _d004_tarih_normalizasyonu),
+]
+
+def run_desktop_migrations():
+    """Yeni şema adımlarını uygula; şema güncelse tek bir sürüm okuması yapılır"""
+    if schema_version:
+        schema_version.apply(schema_version.sqlite_begin(DB_NAME), "desktop", DESKTOP_MIGRATIONS)
+        return
+    # Ortak modül bulunamadıysa (uygulama tek başına kopyalanmışsa) adımlar her açılışta
+    # çalışır; hepsi tekrar çalıştırılabilir
+    conn = sqlite3.connect(DB_NAME)
+    for _, step in DESKTOP_MIGRATIONS:
+        step(conn)
+    conn.commit(); conn.close()
+
 # ------------------------------------------------------
 # UYGULAMA SINIFI
 # ------------------------------------------------------
@@ -367,6 +431,18 @@ class PDIApp:
         if self._db_connection:
             self._db_connection.close()
             self._db_connection = None
+
+    def table_exists(self, conn, name):
+        """Web sunucusunun eklediği tablolar (ör. vehicle_search, vehicles) bu veritabanında var mı"""
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+    def sasi_filter_sql(self, conn, sasi):
+        """Şasi/BB no alt-dize filtresi (WHERE, parametreler).
+        Web sunucusunun kurduğu trigram indeksi (vehicle_search) varsa 3+ karakterde onu kullanır."""
+        if self.table_exists(conn, "vehicle_search") and len(sasi) >= 3:
+            return " WHERE id IN (SELECT rowid FROM vehicle_search WHERE vehicle_search MATCH ?)", ['{sasi_no bb_no} : "' + sasi.replace('"', '""') + '"']
+        like = f"%{sasi}%"
+        return " WHERE (sasi_no LIKE ? OR bb_no LIKE ?)", [like, like]
     
     def get_cached_data(self, cache_key):
         """Cache'den veri al (timeout kontrolü ile)"""
@@ -1151,17 +1227,37 @@ class PDIApp:
             return now.month, now.year
     
     # HELPER: Aylık veri hesaplama - OBTİMİZE EDİLMİŞ (PANDAS)
-    def calculate_monthly_data(self, arac_tipleri, month, year):
-        conn = self.get_db_connection()
-        
-        # Tüm veriyi bir kerede çek (arac_tipi filtresi ile)
+    def vehicle_counts(self, conn, arac_tipleri, year_from, year_to):
+        """Ay ve yıl başına (araç, hata) sayıları: {(yıl, ay): (araç, hata)}, {yıl: (araç, hata)}.
+        Web sunucusunun araç tablosu (vehicles) varsa gruplu SQL ile, yoksa tüm kayıtları okuyup pandas ile."""
         placeholders = ",".join(["?" for _ in arac_tipleri])
+        if self.table_exists(conn, "vehicles"):
+            # vehicles: (şasi, tip, tarih) başına bir satır ve o satıra düşen kayıt sayısı
+            where = f"WHERE arac_tipi IN ({placeholders}) AND pdi_date >= ? AND pdi_date < ?"
+            params = list(arac_tipleri) + [f"{year_from}-01-01", f"{year_to + 1}-01-01"]
+            by_month = {(int(ym[:4]), int(ym[5:7])): (v, e) for ym, v, e in conn.execute(
+                f"SELECT substr(pdi_date, 1, 7), COUNT(DISTINCT sasi_no), SUM(kayit_sayisi) FROM vehicles {where} GROUP BY 1", params)}
+            by_year = {int(y): (v, e) for y, v, e in conn.execute(
+                f"SELECT substr(pdi_date, 1, 4), COUNT(DISTINCT sasi_no), SUM(kayit_sayisi) FROM vehicles {where} GROUP BY 1", params)}
+            return by_month, by_year
+
+        # Tüm veriyi bir kerede çek (arac_tipi filtresi ile)
         query = f"SELECT sasi_no, arac_tipi, tarih_saat FROM pdi_kayitlari WHERE arac_tipi IN ({placeholders})"
         df = pd.read_sql_query(query, conn, params=arac_tipleri)
         
         # Tarih parse (DD-MM-YYYY formatında olduğu varsayılıyor)
         df['dt'] = pd.to_datetime(df['tarih_saat'], format='%d-%m-%Y', errors='coerce')
         df = df.dropna(subset=['dt'])
+        df = df[(df['dt'].dt.year >= year_from) & (df['dt'].dt.year <= year_to)]
+        by_month = {(int(y), int(m)): (g['sasi_no'].nunique(), len(g)) for (y, m), g in df.groupby([df['dt'].dt.year, df['dt'].dt.month])}
+        by_year = {int(y): (g['sasi_no'].nunique(), len(g)) for y, g in df.groupby(df['dt'].dt.year)}
+        return by_month, by_year
+
+    def calculate_monthly_data(self, arac_tipleri, month, year):
+        conn = self.get_db_connection()
+        
+        # 12 aylık pencere geçen yılın başından başlayabilir
+        by_month, by_year = self.vehicle_counts(conn, arac_tipleri, year - 1, year)
         
         monthly_stats = []
         for i in range(12):
@@ -1169,12 +1265,7 @@ class PDIApp:
             y = year
             while m <= 0: m += 12; y -= 1
             
-            # Pandas ile filtrele
-            mask = (df['dt'].dt.month == m) & (df['dt'].dt.year == y)
-            m_df = df[mask]
-            
-            arac_sayisi = m_df['sasi_no'].nunique()
-            hata_sayisi = len(m_df)
+            arac_sayisi, hata_sayisi = by_month.get((y, m), (0, 0))
             hata_orani = hata_sayisi / arac_sayisi if arac_sayisi > 0 else 0
             
             monthly_stats.insert(0, {
@@ -1193,17 +1284,11 @@ class PDIApp:
         avg_12 = total_errors / total_vehicles if total_vehicles > 0 else 0
         
         # Geçen yıl ortalaması
-        ly_mask = df['dt'].dt.year == (year - 1)
-        ly_df = df[ly_mask]
-        ly_vehicles = ly_df['sasi_no'].nunique()
-        ly_errors = len(ly_df)
+        ly_vehicles, ly_errors = by_year.get(year - 1, (0, 0))
         avg_last_year = ly_errors / ly_vehicles if ly_vehicles > 0 else 0
         
         # Mevcut yıl
-        cy_mask = df['dt'].dt.year == year
-        cy_df = df[cy_mask]
-        cy_vehicles = cy_df['sasi_no'].nunique()
-        cy_errors = len(cy_df)
+        cy_vehicles, cy_errors = by_year.get(year, (0, 0))
         avg_current_year = cy_errors / cy_vehicles if cy_vehicles > 0 else 0
         
         return {
@@ -2329,12 +2414,14 @@ class PDIApp:
         conn = self.get_db_connection()
         # Include hata_nerede in query
         query = "SELECT id, bb_no, sasi_no, arac_tipi, tarih_saat, alt_grup, hata_konumu, top_hata, kullanici, hata_nerede FROM pdi_kayitlari"
-        df = pd.read_sql_query(query, conn)
-        
-        # Filtreleme (PANDAS)
+        params = []
+        # Şasi/BB no filtresi SQL'de (indeksli), tüm tabloyu okumadan
         if sasi:
-            df = df[df['sasi_no'].str.contains(sasi, case=False, na=False) | df['bb_no'].str.contains(sasi, case=False, na=False)]
+            where, params = self.sasi_filter_sql(conn, sasi)
+            query += where
+        df = pd.read_sql_query(query, conn, params=params)
         
+        # Filtreleme (PANDAS)
         if tip != "Tümü":
             df = df[df['arac_tipi'] == tip]
             
@@ -2395,11 +2482,13 @@ class PDIApp:
         # OBTİMİZE EDİLMİŞ VE GÜVENLİ SİLME (Pandas ile ID'leri bulup siliyoruz)
         conn = self.get_db_connection()
         query = "SELECT id, bb_no, sasi_no, arac_tipi, tarih_saat, alt_grup FROM pdi_kayitlari"
-        df = pd.read_sql_query(query, conn)
+        params = []
+        if sasi:
+            where, params = self.sasi_filter_sql(conn, sasi)
+            query += where
+        df = pd.read_sql_query(query, conn, params=params)
         
         # Filtreleme (load_list_data ile aynı mantık)
-        if sasi:
-            df = df[df['sasi_no'].str.contains(sasi, case=False, na=False) | df['bb_no'].str.contains(sasi, case=False, na=False)]
         if tip != "Tümü":
             df = df[df['arac_tipi'] == tip]
         if alt != "Tümü":
@@ -2691,9 +2780,10 @@ class PDIApp:
             hata_nerede = cb_hata_nerede.get()
             h_konum = cb_hata_konumu.get()
             top_hata = cb_top_hata.get()
-            tarih_val = e_tarih.get()
+            tarih_val = normalize_tarih(e_tarih.get())
             
             if not sasi: messagebox.showwarning("Eksik", "Şasi No giriniz."); return
+            if not tarih_val: messagebox.showwarning("Hatalı Tarih", "Tarihi GG-AA-YYYY biçiminde giriniz."); return
             
             # Tespitleri string olarak birleştir (eski uyumluluk için)
             all_text = "\n".join([item["text"] for item in detail_items])
@@ -2703,18 +2793,16 @@ class PDIApp:
             for item in detail_items:
                 if item["photo"]: main_photo_path = item["photo"]; break
             
-            # Fotoğrafları kopyala ve path güncelle
+            # Fotoğrafları ortak klasöre kopyala (içerik adresli, aynı dosya tekrar kopyalanmaz) ve path güncelle
             for item in detail_items:
                 if item["photo"] and os.path.exists(item["photo"]):
                      if not item["photo"].startswith(PHOTO_DIR):
                          try:
-                             ext = os.path.splitext(item["photo"])[1]
-                             fname = f"{sasi}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.urandom(2).hex()}{ext}"
-                             dest = os.path.join(PHOTO_DIR, fname)
-                             shutil.copy2(item["photo"], dest)
-                             item["photo"] = dest
+                             dest = store_photo(item["photo"])
                              if main_photo_path == item["photo"]: main_photo_path = dest
-                         except: pass
+                             item["photo"] = dest
+                         except Exception as e:
+                             print(f"Fotoğraf kopyalama hatası: {e}")
 
             conn = sqlite3.connect(DB_NAME); c = conn.cursor()
             try:
@@ -2981,6 +3069,7 @@ BB No | Şasi No | Araç Tipi | İş Emri No | PDI Tarihi | Tespitler | Hata Kon
                 # İlk Geçiş: Kayıtları hazırla ve mükerrer kontrolü yap
                 to_import = []
                 duplicates_found = 0
+                invalid_dates = 0
                 
                 for idx, row in df.iterrows():
                     row_vals = row.values
@@ -3004,14 +3093,12 @@ BB No | Şasi No | Araç Tipi | İş Emri No | PDI Tarihi | Tespitler | Hata Kon
                             # Kullanıcının gönderdiği resimde "Şehir İçi" vs olabilir diye daha esnek yapalım.
                             pass
 
-                    # Tarih Normalizasyonu
-                    tarih = str(raw_date).split(" ")[0].replace("/", "-").replace(".", "-")
-                    try:
-                        parts = tarih.split("-")
-                        if len(parts) == 3:
-                            if len(parts[0]) == 4: tarih = f"{parts[2].zfill(2)}-{parts[1].zfill(2)}-{parts[0]}"
-                            else: tarih = f"{parts[0].zfill(2)}-{parts[1].zfill(2)}-{parts[2]}"
-                    except: pass
+                    # Tarih Normalizasyonu (saat kısmı atılır); okunamayan tarihli satır alınmaz
+                    tarih = normalize_tarih(str(raw_date).split(" ")[0])
+                    if not tarih:
+                        result_text.insert("end", f"❌ Satır {idx+2}: Tarih okunamadı ('{raw_date}'), satır atlandı.\n")
+                        invalid_dates += 1
+                        continue
                     
                     # Mevcut mu kontrolü
                     q = "SELECT id FROM pdi_kayitlari WHERE sasi_no=? AND is_emri_no=? AND tespitler=? AND tarih_saat=?"
@@ -3058,6 +3145,8 @@ BB No | Şasi No | Araç Tipi | İş Emri No | PDI Tarihi | Tespitler | Hata Kon
                 result_text.insert("end", f"\n✅ İşlem Tamamlandı!\n✅ Başarılı: {success_count}\n❌ Hatalı: {error_count}\n")
                 if duplicates_found > 0:
                     result_text.insert("end", f"ℹ️ {duplicates_found} kayıt güncellendi (üstüne yazıldı).\n")
+                if invalid_dates > 0:
+                    result_text.insert("end", f"⚠️ {invalid_dates} satır tarih okunamadığı için atlandı.\n")
                 messagebox.showinfo("Bitti", f"{success_count} kayıt sisteme işlendi.")
             except Exception as e:
                 messagebox.showerror("Hata", f"Excel hatası: {str(e)}")